@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra: đọc theo khối (chunksize) và đọc cả file cho cùng dữ liệu ngày/tuần
+
+File thử có các khối đầu chỉ chứa mã số (vd: "00000", "01234") và các khối sau chứa mã chữ ("A7"),
+đúng trường hợp pandas suy kiểu riêng từng khối làm "00000" thành 0.
+
+Chạy từ thư mục backend:
+    python benchmarks/chunked_ingestion_check.py --rows 20000 --chunksize 1000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.raw_cache_service import RawCacheService
+from services.demand_loader_service import DemandLoaderService
+from services.aggregation_service import AggregationService
+from services.data_service import DataService
+
+def make_raw_data(n_rows: int, chunksize: int, seed: int = 42) -> pd.DataFrame:
+    """Dữ liệu thô giả lập: nửa đầu chỉ có mã số có số 0 đứng đầu, nửa sau có thêm mã chữ"""
+    rng = np.random.default_rng(seed)
+    numeric_rows = max(n_rows // 2 // chunksize, 1) * chunksize
+    codes = [f"{i:05d}" for i in rng.integers(0, 50, numeric_rows)]
+    codes += [f"A{i}" if i % 2 else f"{i:05d}" for i in rng.integers(0, 50, n_rows - numeric_rows)]
+    return pd.DataFrame({
+        'DocDate': (pd.Timestamp('2023-01-01')
+                    + pd.to_timedelta(rng.integers(0, 365, n_rows), unit='D')).strftime('%Y-%m-%d'),
+        'BranchCode0': [f"{i:03d}" for i in rng.integers(0, 5, n_rows)],
+        'BranchName0': 'CN',
+        'CustomerCode': [f"{i:06d}" for i in rng.integers(0, 100, n_rows)],
+        'ItemCode': codes,
+        'ItemName': 'SP',
+        'Quantity': rng.integers(1, 20, n_rows),
+        'Unit': 'Viên'
+    })
+
+def weekly_demand(file_path: str, chunksize, cache_dir: str) -> pd.DataFrame:
+    """Chạy bước đọc + gộp của DataService với một cache Parquet riêng"""
+    service = DataService()
+    service.raw_cache = RawCacheService(cache_dir)
+    service.loader = DemandLoaderService(service.raw_cache)
+    df_grouped, _ = service._load_daily(file_path, chunksize)
+    weekly, _ = AggregationService.aggregate(df_grouped)
+    return weekly
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--chunksize', type=int, default=1000)
+    args = parser.parse_args()
+    
+    raw = make_raw_data(args.rows, args.chunksize)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'raw.csv')
+        xlsx_file = os.path.join(tmp_dir, 'raw.xlsx')
+        raw.to_csv(csv_file, index=False)
+        raw.to_excel(xlsx_file, index=False)
+        
+        for file_path in (csv_file, xlsx_file):
+            full = weekly_demand(file_path, None, os.path.join(tmp_dir, 'cache_full'))
+            chunked = weekly_demand(file_path, args.chunksize, os.path.join(tmp_dir, 'cache_chunked'))
+            identical = full.equals(chunked)
+            codes_kept = set(full['ItemCode'].astype(str)) <= set(raw['ItemCode'])
+            failed |= not (identical and codes_kept)
+            print(f"{os.path.basename(file_path):>10} identical={identical} codes_kept={codes_kept}")
+    
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: engine tạo features vector hóa trên cả panel so với create_features gốc (vòng lặp theo từng
+sản phẩm trên weekly_demand), và refresh một tuần mới bằng FeatureState so với dựng lại toàn bộ bảng features
+
+create_features gốc tính lag/rolling/trend theo các dòng có bán, engine tính theo tuần lịch (tuần không bán = 0),
+nên trên dữ liệu thưa hai bảng khác nhau (cột "dense match" kiểm tra trên panel bán liên tục mọi tuần,
+nơi hai cách hiểu trùng nhau)
+
+Chạy từ thư mục backend:
+    python benchmarks/feature_benchmark.py --products 1000 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.panel_service import DemandPanel
+from services.feature_service import FeatureService
+
+def make_panel(n_products: int, n_weeks: int, density: float = 0.45, seed: int = 42) -> DemandPanel:
+    """Tạo panel giả lập: mỗi sản phẩm bắt đầu bán ở một tuần ngẫu nhiên, các tuần còn lại bán với xác suất density"""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(1, 100, (n_products, n_weeks)).astype(np.float32)
+    start = rng.integers(0, n_weeks // 2, n_products)
+    values[(rng.random((n_products, n_weeks)) > density) | (np.arange(n_weeks) < start[:, None])] = 0
+    items = np.array([f"SKU{i:06d}" for i in range(n_products)], dtype=object)
+    return DemandPanel(values, items, np.datetime64('2022-01-03'))
+
+def baseline_create_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    XGBoostModel.create_features của phiên bản gốc (a104a47), chép nguyên phần tính toán (bỏ print/try)
+    Lag/rolling/trend tính trên các dòng có bán của từng sản phẩm (shift theo dòng), còn engine tính theo
+    tuần lịch (tuần không bán = 0) nên hai bảng chỉ trùng nhau khi sản phẩm bán liên tục mọi tuần
+    """
+    # Đảm bảo Week là datetime
+    df['Week'] = pd.to_datetime(df['Week'])
+    
+    # Sắp xếp theo ItemCode và Week
+    df = df.sort_values(['ItemCode', 'Week']).reset_index(drop=True)
+    
+    # Tạo features cho từng sản phẩm
+    features_list = []
+    
+    for item_code in df['ItemCode'].unique():
+        item_data = df[df['ItemCode'] == item_code].copy()
+
+        if len(item_data) < 10:  # Bỏ qua sản phẩm có ít dữ liệu
+            continue
+        
+        # Time-based features
+        item_data['week_of_year'] = item_data['Week'].dt.isocalendar().week
+        item_data['month'] = item_data['Week'].dt.month
+        item_data['quarter'] = item_data['Week'].dt.quarter
+        item_data['year'] = item_data['Week'].dt.year
+        
+        # Lag features
+        item_data['lag_1'] = item_data['TotalQuantity'].shift(1)
+        item_data['lag_2'] = item_data['TotalQuantity'].shift(2)
+        item_data['lag_3'] = item_data['TotalQuantity'].shift(3)
+        item_data['lag_4'] = item_data['TotalQuantity'].shift(4)
+        
+        # Rolling features
+        item_data['rolling_mean_4'] = item_data['TotalQuantity'].rolling(window=4).mean()
+        item_data['rolling_std_4'] = item_data['TotalQuantity'].rolling(window=4).std()
+        item_data['rolling_min_4'] = item_data['TotalQuantity'].rolling(window=4).min()
+        item_data['rolling_max_4'] = item_data['TotalQuantity'].rolling(window=4).max()
+        
+        # Trend features
+        item_data['trend'] = np.arange(len(item_data))
+        
+        # Seasonal features
+        item_data['sin_week'] = np.sin(2 * np.pi * item_data['week_of_year'] / 52)
+        item_data['cos_week'] = np.cos(2 * np.pi * item_data['week_of_year'] / 52)
+        item_data['sin_month'] = np.sin(2 * np.pi * item_data['month'] / 12)
+        item_data['cos_month'] = np.cos(2 * np.pi * item_data['month'] / 12)
+        
+        features_list.append(item_data)
+    
+    # Gộp tất cả features
+    if features_list:
+        df_features = pd.concat(features_list, ignore_index=True)
+        df_features = df_features.dropna().reset_index(drop=True)
+        return df_features
+    return None
+
+def same_features(baseline: pd.DataFrame, engine: pd.DataFrame) -> bool:
+    """Cùng dòng (ItemCode, Week) và cùng giá trị features (so sánh số, bỏ qua khác biệt dtype)"""
+    if len(baseline) != len(engine):
+        return False
+    return (
+        np.array_equal(baseline['ItemCode'].to_numpy(dtype=object), engine['ItemCode'].to_numpy(dtype=object))
+        and np.array_equal(baseline['Week'].to_numpy(), engine['Week'].to_numpy())
+        and np.allclose(baseline[FeatureService.FEATURE_COLS].to_numpy(dtype=np.float64),
+                        engine[FeatureService.FEATURE_COLS].to_numpy(dtype=np.float64))
+    )
+
+def refresh_rows(panel: DemandPanel) -> pd.DataFrame:
+    """Cách làm cũ khi có tuần mới: dựng lại toàn bộ bảng rồi lấy các dòng của tuần cuối"""
+    features = FeatureService.build(panel)
+    return features[features['Week'] == features['Week'].max()].reset_index(drop=True)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--weeks', type=int, default=104)
+    args = parser.parse_args()
+    
+    print(f"{'products':>10} {'base rows':>10} {'rows':>10} {'baseline s':>10} {'engine s':>10} {'speedup':>8} "
+          f"{'dense match':>11}")
+    for n_products in args.products:
+        panel = make_panel(n_products, args.weeks)
+        
+        baseline, baseline_seconds = timed(baseline_create_features, panel.to_weekly())
+        engine, engine_seconds = timed(FeatureService.build, panel)
+        
+        dense = make_panel(min(n_products, 1000), args.weeks, density=1.0)
+        dense_match = same_features(baseline_create_features(dense.to_weekly()), FeatureService.build(dense))
+        
+        print(f"{n_products:>10} {len(baseline):>10} {len(engine):>10} {baseline_seconds:>10.2f} "
+              f"{engine_seconds:>10.3f} {baseline_seconds / engine_seconds:>7.1f}x {str(dense_match):>11}")
+
+    print()
+    print(f"{'products':>10} {'rows':>10} {'rebuild s':>10} {'update s':>10} {'speedup':>8} {'matches':>9}")
+    for n_products in args.products:
+        panel = make_panel(n_products, args.weeks + 1)
+        history = DemandPanel(panel.values[:, :-1], panel.items, panel.weeks[0])
+        new_week = pd.Series(panel.values[:, -1], index=panel.items)
+        
+        rebuilt, rebuild_seconds = timed(refresh_rows, panel)
+        state = FeatureService.state(history)
+        updated, update_seconds = timed(state.update, new_week)
+        matches = (
+            updated[['ItemCode', 'Week']].equals(rebuilt[['ItemCode', 'Week']])
+            and np.allclose(updated[FeatureService.FEATURE_COLS], rebuilt[FeatureService.FEATURE_COLS])
+        )
+        
+        print(f"{n_products:>10} {len(updated):>10} {rebuild_seconds:>10.3f} {update_seconds:>10.4f} "
+              f"{rebuild_seconds / update_seconds:>7.1f}x {str(matches):>9}")
+
+if __name__ == "__main__":
+    main()
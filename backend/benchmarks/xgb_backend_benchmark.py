@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nhiều trial tham số XGBoost trên cùng một split - XGBRegressor.fit với DataFrame (chuyển đổi dữ
+liệu mỗi lần fit) so với XGBoostBackend (QuantileDMatrix tạo một lần, hist, dùng lại cho mọi trial)
+
+Chạy từ thư mục backend:
+    python benchmarks/xgb_backend_benchmark.py --products 2000 --trials 6
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.feature_service import FeatureService
+from ml_models.xgboost_backend import XGBoostBackend
+from feature_benchmark import make_panel
+
+def trial_params(n_trials: int):
+    """Các bộ tham số thử (learning rate và độ sâu khác nhau)"""
+    grid = [(rate, depth) for depth in (4, 6, 8) for rate in (0.05, 0.1, 0.3)]
+    return [{'n_estimators': 100, 'learning_rate': rate, 'max_depth': depth, 'random_state': 42}
+            for rate, depth in grid[:n_trials]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--weeks', type=int, default=104)
+    parser.add_argument('--trials', type=int, default=6)
+    parser.add_argument('--nthread', type=int, default=0)
+    args = parser.parse_args()
+    
+    features = FeatureService.build(make_panel(args.products, args.weeks))
+    train_size = int(len(features) * 0.7)
+    X = features[FeatureService.FEATURE_COLS]
+    y = features['TotalQuantity']
+    X_train, y_train, X_test = X.iloc[:train_size], y.iloc[:train_size], X.iloc[train_size:]
+    print(f"📊 {len(features)} rows, {len(FeatureService.FEATURE_COLS)} features, {args.trials} trials")
+    
+    print(f"{'trial':>6} {'sklearn s':>10} {'convert s':>10} {'fit s':>8} {'max |diff|':>11}")
+    backend = XGBoostBackend(nthread=args.nthread)
+    sklearn_total = backend_total = 0.0
+    for trial, params in enumerate(trial_params(args.trials)):
+        start = time.perf_counter()
+        model = xgb.XGBRegressor(**params, n_jobs=args.nthread or None)
+        model.fit(X_train, y_train)
+        sklearn_pred = model.predict(X_test)
+        sklearn_seconds = time.perf_counter() - start
+        
+        # Cùng key: chỉ trial đầu tiên phải chuyển đổi dữ liệu
+        split = backend.split(X_train, y_train, X_test, key='benchmark')
+        booster, timings = backend.fit(split, params)
+        backend_pred = backend.predict(booster, split)
+        convert_seconds = timings['conversion_seconds'] if trial == 0 else 0.0
+        
+        sklearn_total += sklearn_seconds
+        backend_total += convert_seconds + timings['fit_seconds']
+        print(f"{trial:>6} {sklearn_seconds:>10.3f} {convert_seconds:>10.3f} {timings['fit_seconds']:>8.3f} "
+              f"{np.abs(sklearn_pred - backend_pred).max():>11.2e}")
+    
+    print(f"{'total':>6} {sklearn_total:>10.3f} {backend_total:>19.3f} {sklearn_total / backend_total:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,14 @@ class Settings(BaseSettings):
     PROCESSED_DATA_PATH: str = "data/processed"
     EXTERNAL_DATA_PATH: str = "data/external"
     
+    # Ingestion Configuration
+    INGEST_CHUNK_SIZE: int = 100000  # Số dòng mỗi khối khi đọc file streaming (0 = đọc toàn bộ)
+    RAW_CACHE_PATH: str = "storage/cache/raw"  # Cache Parquet của file thô, khóa theo hash nội dung
+    INGEST_WORKERS: int = 2  # Số worker process xử lý dataset
+    INGEST_PROGRESS_PATH: str = "storage/jobs/ingestion"  # File tiến độ của các ingestion job
+    UPLOAD_BLOB_PATH: str = "storage/datasets/blobs"  # File upload lưu theo hash nội dung (file trùng chỉ lưu một bản)
+    FEATURE_STORE_PATH: str = "storage/features"  # Bảng features (Arrow IPC) theo hash dataset và phiên bản features
+    
     # Logging
     LOG_LEVEL: str = "INFO"
     API_LOG_FILE: str = "logs/api.log"
@@ -36,6 +44,13 @@ class Settings(BaseSettings):
     DEFAULT_TEST_RATIO: float = 0.3
     MIN_PRODUCTS_FOR_TRAINING: int = 5
     MIN_WEEKS_FOR_TRAINING: int = 8
+    TRAIN_WORKERS: int = 1  # Số process train song song theo sản phẩm (1 = tuần tự, <= 0 = mọi CPU)
+    TRAIN_MAX_CONCURRENT_JOBS: int = 2  # Số training job chạy đồng thời (mỗi job một worker process)
+    TRAIN_QUEUE_SIZE: int = 16  # Số training job được chờ thêm khi mọi worker đều bận (vượt quá trả về 429)
+    TRAIN_CHECKPOINT_PATH: str = "storage/jobs/training"  # Kết quả từng sản phẩm của training job (resume/cancel)
+    TRAIN_PROGRESS_INTERVAL_SECONDS: float = 1.0  # Chu kỳ kiểm tra tiến độ của stream SSE (chỉ gửi khi có thay đổi)
+    XGB_NTHREAD: int = 0  # Số thread mỗi lần fit XGBoost (0 = mặc định của XGBoost, dùng mọi CPU)
+    WARM_START_PATH: str = "storage/models/warm_start"  # Tham số Prophet đã fit theo sản phẩm (retrain warm start)
     
     class Config:
         case_sensitive = False
@@ -8,6 +8,9 @@ import numpy as np
 import os
 import traceback
 
+from services.raw_cache_service import RawCacheService
+from services.aggregation_service import AggregationService
+
 def debug_data_processing():
     """Debug quá trình xử lý dữ liệu"""
     
@@ -16,8 +19,11 @@ def debug_data_processing():
     try:
         print(f"📖 Reading file: {file_path}")
         
-        # Đọc file dữ liệu
-        df = pd.read_excel(file_path)
+        # Đọc file dữ liệu (qua cache Parquet, chỉ parse Excel ở lần chạy đầu)
+        raw_cache = RawCacheService()
+        cache_info = raw_cache.ensure_cached(file_path)
+        print(f"📊 Parse time: {cache_info['parse_seconds']}s - Reader: {cache_info['reader']} - Cache hit: {cache_info['cache_hit']}")
+        df = raw_cache.read_frame(file_path)
         print(f"✅ File read successfully. Shape: {df.shape}")
         print(f"📋 Columns: {list(df.columns)}")
         
@@ -100,7 +106,7 @@ def debug_data_processing():
         
         # Tạo dữ liệu theo tuần
         print(f"🔄 Creating weekly data...")
-        df_grouped['week_start'] = df_grouped['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+        df_grouped['week_start'] = AggregationService.week_start(df_grouped['DocDate'])
         
         weekly_demand = (
             df_grouped
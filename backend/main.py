@@ -7,6 +7,9 @@ from dotenv import load_dotenv
 
 # Import routers
 from routers import datasets, train, models, dashboard
+from services.ingestion_service import ingestion_service
+from services.training_executor_service import training_executor
+from services.catalog_service import catalog
 
 # Load environment variables
 load_dotenv()
@@ -35,6 +38,22 @@ app.include_router(train.router, prefix="/train", tags=["Training"])
 app.include_router(models.router, prefix="/models", tags=["Models"])
 app.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
 
+# Training/ingestion job còn dở từ lần chạy trước không còn worker xử lý: đánh dấu failed
+@app.on_event("startup")
+async def recover_catalog():
+    interrupted = catalog.fail_interrupted_jobs()
+    if interrupted:
+        print(f"🔄 Marked {interrupted} interrupted training jobs as failed")
+    interrupted = catalog.fail_interrupted_jobs(table="ingestion_jobs")
+    if interrupted:
+        print(f"🔄 Marked {interrupted} interrupted ingestion jobs as failed")
+
+# Dừng process pool ingestion và training khi tắt server
+@app.on_event("shutdown")
+async def shutdown_workers():
+    ingestion_service.shutdown()
+    training_executor.shutdown()
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -0,0 +1,313 @@
+"""
+Baseline Model Implementation
+Các phương pháp thống kê đơn giản (seasonal naive, trung bình trượt, SES, Holt damped, Croston) fit cho mọi sản phẩm
+cùng lúc bằng phép toán NumPy trên panel sản phẩm × tuần - mốc mà các model nặng hơn phải vượt qua
+"""
+
+import numpy as np
+import json
+import time
+import traceback
+
+from utils.helpers import generate_id, get_timestamp, ensure_dir
+from config.settings import settings
+from services.panel_service import panel_service
+
+class BaselineModel:
+    """
+    Baseline cho demand forecasting: mỗi sản phẩm lấy chuỗi tuần liên tục từ tuần bán đầu tiên đến tuần bán
+    cuối cùng (tuần không bán = 0), test là test_ratio tuần cuối, dự báo nhiều bước từ cuối tập train.
+    Mỗi sản phẩm chọn phương pháp có MAE nhỏ nhất trên đoạn validation cuối tập train rồi fit lại trên cả
+    tập train; metrics tính trên các tuần test có bán (giống các dòng weekly_demand của XGBoost/Prophet).
+    """
+    
+    METHODS = ('seasonal_naive', 'moving_average', 'ses', 'holt', 'croston')
+    
+    SEASON_LENGTH = 52  # Chu kỳ mùa vụ (tuần) của seasonal naive
+    WINDOW = 4  # Số tuần của trung bình trượt
+    ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9])  # Lưới alpha cho SES/Holt (chọn theo lỗi một bước)
+    BETAS = np.array([0.05, 0.1, 0.3])  # Lưới beta (trend) cho Holt
+    PHI = 0.9  # Hệ số tắt dần trend của Holt (tránh dự báo nhiều bước tăng/giảm tuyến tính mãi)
+    CROSTON_ALPHA = 0.1
+    
+    def __init__(self):
+        self.paths = {
+            'storage': 'storage',
+            'models': settings.MODEL_STORAGE_PATH,
+            'results': settings.RESULTS_STORAGE_PATH,
+            'plots': settings.PLOTS_STORAGE_PATH
+        }
+        
+        # Tạo thư mục nếu chưa có
+        for path in self.paths.values():
+            ensure_dir(path)
+    
+    @staticmethod
+    def align(values, first, last):
+        """
+        Chuỗi của từng sản phẩm dồn về đầu hàng: series[p, i] = values[p, first[p] + i] với i <= last - first,
+        các ô sau tuần bán cuối là NaN
+        """
+        lengths = last - first + 1
+        offsets = np.arange(int(lengths.max()))
+        columns = np.minimum(first[:, None] + offsets, values.shape[1] - 1)
+        series = np.take_along_axis(np.asarray(values, dtype=np.float64), columns, axis=1)
+        series[offsets >= lengths[:, None]] = np.nan
+        return series
+    
+    # ----- Các phương pháp: series [P, L] dồn đầu hàng, n_train [P] >= 2 -> dự báo [P, horizon] -----
+    
+    def seasonal_naive(self, series, n_train, horizon):
+        """Giá trị cùng tuần của mùa trước; sản phẩm chưa đủ một mùa dùng giá trị tuần cuối"""
+        season = self.SEASON_LENGTH
+        steps = np.arange(horizon) % season
+        index = n_train[:, None] - season + steps
+        has_season = n_train >= season
+        index = np.where(has_season[:, None], index, n_train[:, None] - 1)
+        return np.take_along_axis(series, index, axis=1)
+    
+    def moving_average(self, series, n_train, horizon):
+        """Trung bình WINDOW tuần cuối của tập train"""
+        cumulative = np.concatenate([np.zeros((len(series), 1)), np.cumsum(np.nan_to_num(series), axis=1)], axis=1)
+        start = np.maximum(n_train - self.WINDOW, 0)
+        rows = np.arange(len(series))
+        level = (cumulative[rows, n_train] - cumulative[rows, start]) / (n_train - start)
+        return np.repeat(level[:, None], horizon, axis=1)
+    
+    def ses(self, series, n_train, horizon):
+        """Simple exponential smoothing, alpha chọn trên lưới theo tổng bình phương lỗi dự báo một bước"""
+        alphas = self.ALPHAS[:, None]
+        level = np.repeat(series[None, :, 0], len(self.ALPHAS), axis=0)
+        sse = np.zeros_like(level)
+        for i in range(1, int(n_train.max())):
+            active = i < n_train
+            y = series[:, i]
+            error = np.where(active, y - level, 0.0)
+            sse += error ** 2
+            level = np.where(active, level + alphas * error, level)
+        best = sse.argmin(axis=0)
+        level = level[best, np.arange(len(series))]
+        return np.repeat(level[:, None], horizon, axis=1)
+    
+    def holt(self, series, n_train, horizon):
+        """Holt damped trend (level + trend tắt dần), (alpha, beta) chọn trên lưới theo lỗi dự báo một bước"""
+        phi = self.PHI
+        grid_alpha, grid_beta = [g.reshape(-1, 1) for g in np.meshgrid(self.ALPHAS, self.BETAS)]
+        level = np.repeat(series[None, :, 0], len(grid_alpha), axis=0)
+        trend = np.repeat((series[None, :, 1] - series[None, :, 0]), len(grid_alpha), axis=0)
+        sse = np.zeros_like(level)
+        for i in range(1, int(n_train.max())):
+            active = i < n_train
+            y = series[:, i]
+            forecast = level + phi * trend
+            error = np.where(active, y - forecast, 0.0)
+            sse += error ** 2
+            new_level = np.where(active, forecast + grid_alpha * error, level)
+            trend = np.where(active, grid_beta * (new_level - level) + (1 - grid_beta) * phi * trend, trend)
+            level = new_level
+        best = sse.argmin(axis=0)
+        rows = np.arange(len(series))
+        damping = np.cumsum(phi ** np.arange(1, horizon + 1))
+        return np.maximum(level[best, rows][:, None] + damping * trend[best, rows][:, None], 0)
+    
+    def croston(self, series, n_train, horizon):
+        """Croston cho chuỗi gián đoạn: làm trơn riêng lượng bán khi có bán và khoảng cách giữa các lần bán"""
+        alpha = self.CROSTON_ALPHA
+        size = series[:, 0].copy()
+        interval = np.ones(len(series))
+        since_last = np.zeros(len(series))
+        for i in range(1, int(n_train.max())):
+            active = i < n_train
+            y = series[:, i]
+            since_last = np.where(active, since_last + 1, since_last)
+            demand = active & (y > 0)
+            size = np.where(demand, size + alpha * (y - size), size)
+            interval = np.where(demand, interval + alpha * (since_last - interval), interval)
+            since_last = np.where(demand, 0, since_last)
+        return np.repeat((size / interval)[:, None], horizon, axis=1)
+    
+    def forecast_all(self, series, n_train, horizon, methods):
+        """Dự báo của từng phương pháp: {method: [P, horizon]}"""
+        return {method: getattr(self, method)(series, n_train, horizon) for method in methods}
+    
+    def forecast_selected(self, series, n_train, horizon, methods, validation_weeks):
+        """
+        Chọn phương pháp của từng sản phẩm theo MAE trên validation_weeks [P] tuần cuối tập train (chấm trên tuần
+        có bán) rồi fit lại trên cả tập train: (dự báo được chọn [P, horizon], chỉ số phương pháp [P],
+        dự báo của từng phương pháp)
+        """
+        steps = np.arange(horizon)
+        n_fit = np.maximum(n_train - validation_weeks, 2)
+        validation = self.forecast_all(series, n_fit, horizon, methods)
+        val_index = np.minimum(n_fit[:, None] + steps, series.shape[1] - 1)
+        val_actual = np.take_along_axis(series, val_index, axis=1)
+        val_mask = ((n_fit[:, None] + steps) < n_train[:, None]) & (val_actual > 0)
+        val_mae = np.stack([
+            np.where(val_mask, np.abs(val_actual - validation[method]), 0.0).sum(axis=1)
+            / np.maximum(val_mask.sum(axis=1), 1)
+            for method in methods
+        ])
+        selected = val_mae.argmin(axis=0)
+        
+        forecasts = self.forecast_all(series, n_train, horizon, methods)
+        best_forecast = np.stack([forecasts[method] for method in methods])[selected, np.arange(len(series))]
+        return best_forecast, selected, forecasts
+    
+    def backtest(self, panel, origins, horizon, methods=None):
+        """
+        Dự báo rolling-origin [sản phẩm, fold, horizon] (NaN: sản phẩm chưa đủ 2 tuần trước mốc): chuỗi của mọi
+        sản phẩm dồn hàng một lần (tới tuần cuối của panel), mỗi fold chọn phương pháp trên `horizon` tuần cuối
+        trước mốc rồi dự báo vector hóa như train_all_products
+        """
+        methods = list(methods or self.METHODS)
+        observed = panel.observed()
+        rows = np.flatnonzero(observed.any(axis=1))
+        first = observed[rows].argmax(axis=1)
+        forecasts = np.full((panel.num_products, len(origins), horizon), np.nan)
+        if len(rows) == 0:
+            return forecasts
+        
+        series = self.align(panel.values[rows], first, np.full(len(rows), panel.num_weeks - 1))
+        for fold, origin in enumerate(origins):
+            n_train = origin - first
+            eligible = n_train >= 2
+            if not eligible.any():
+                continue
+            best_forecast, _, _ = self.forecast_selected(series[eligible], n_train[eligible], horizon, methods,
+                                                         np.full(int(eligible.sum()), horizon))
+            forecasts[rows[eligible], fold] = best_forecast
+        return forecasts
+    
+    @staticmethod
+    def batch_metrics(actual, predicted, mask):
+        """
+        MAE/RMSE/MAPE/R2 của từng sản phẩm trên các ô mask (vector hóa, cùng công thức với _metrics của
+        XGBoost/Prophet); trả về dict các mảng [P] và số ô được đánh giá của mỗi sản phẩm
+        """
+        count = mask.sum(axis=1)
+        safe_count = np.maximum(count, 1)
+        actual = np.where(mask, actual, 0.0)
+        error = np.where(mask, actual - predicted, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mae = np.abs(error).sum(axis=1) / safe_count
+            rmse = np.sqrt((error ** 2).sum(axis=1) / safe_count)
+            mape = np.where(mask, np.abs(error / actual), 0.0).sum(axis=1) / safe_count * 100
+            mean = actual.sum(axis=1) / safe_count
+            total = np.where(mask, (actual - mean[:, None]) ** 2, 0.0).sum(axis=1)
+            residual = (error ** 2).sum(axis=1)
+            r2 = np.where(total > 0, 1 - residual / total, np.where(residual == 0, 1.0, 0.0))
+        r2 = np.where(count >= 2, r2, np.nan)
+        return {'mae': mae, 'rmse': rmse, 'mape': mape, 'r2': r2}, count
+    
+    def train_all_products(self, data_file, test_ratio=0.3, parameters=None):
+        """
+        Fit các baseline cho tất cả sản phẩm (parameters["methods"]: tập con của METHODS)
+        """
+        try:
+            print(f"🚀 Starting baseline training for all products...")
+            print(f"📖 Loading data from: {data_file}")
+            
+            methods = list((parameters or {}).get('methods') or self.METHODS)
+            unknown = set(methods) - set(self.METHODS)
+            if unknown:
+                raise ValueError(f"Unknown baseline methods: {sorted(unknown)} (supported: {list(self.METHODS)})")
+            
+            # Load panel sản phẩm × tuần (memory-map, mỗi sản phẩm là một hàng)
+            panel = panel_service.load(data_file)
+            print(f"✅ Data loaded. Panel shape: {panel.values.shape}")
+            train_start = time.perf_counter()
+            
+            observed = panel.observed()
+            has_sales = observed.any(axis=1)
+            first = observed.argmax(axis=1)
+            last = panel.num_weeks - 1 - observed[:, ::-1].argmax(axis=1)
+            lengths = np.where(has_sales, last - first + 1, 0)
+            n_train = (lengths * (1 - test_ratio)).astype(int)
+            
+            # Cần ít nhất 2 tuần train (Holt) và 1 tuần test
+            eligible = (n_train >= 2) & (lengths > n_train)
+            rows = np.flatnonzero(eligible)
+            if len(rows) == 0:
+                raise ValueError("No products with enough weeks for baseline training")
+            
+            series = self.align(panel.values[rows], first[rows], last[rows])
+            n_train, lengths = n_train[rows], lengths[rows]
+            horizon = int((lengths - n_train).max())
+            steps = np.arange(horizon)
+            
+            # Chọn phương pháp trên đoạn validation (các tuần cuối của tập train, dài bằng tập test) rồi fit lại
+            # trên cả tập train và dự báo các tuần test
+            best_forecast, selected, forecasts = self.forecast_selected(series, n_train, horizon, methods,
+                                                                        lengths - n_train)
+            test_index = np.minimum(n_train[:, None] + steps, series.shape[1] - 1)
+            test_actual = np.take_along_axis(series, test_index, axis=1)
+            test_mask = ((n_train[:, None] + steps) < lengths[:, None]) & (test_actual > 0)
+            
+            method_metrics = {}
+            for method in methods:
+                metrics, count = self.batch_metrics(test_actual, forecasts[method], test_mask)
+                method_metrics[method] = self._average_metrics(metrics, count > 0)
+            
+            metrics, count = self.batch_metrics(test_actual, best_forecast, test_mask)
+            train_seconds = time.perf_counter() - train_start
+            
+            # Kết quả theo sản phẩm (định dạng giống XGBoost/Prophet, kèm phương pháp được chọn)
+            results = {}
+            for i in np.flatnonzero(count > 0):
+                results[str(panel.items[rows[i]])] = {
+                    **{name: float(values[i]) for name, values in metrics.items()},
+                    'method': methods[selected[i]]
+                }
+            avg_metrics = self._average_metrics(metrics, count > 0)
+            
+            # Lưu kết quả
+            results_file = self._save_results(results, avg_metrics, 'Baseline')
+            
+            selected_counts = {method: int((selected[count > 0] == i).sum()) for i, method in enumerate(methods)}
+            print(f"✅ Baseline training completed in {train_seconds:.2f}s!")
+            print(f"📊 Trained {len(results)} products")
+            print(f"📊 Average metrics: {avg_metrics}")
+            print(f"📊 Selected methods: {selected_counts}")
+            
+            return {
+                'metrics': avg_metrics,
+                'results_file': results_file,
+                'total_products': len(results),
+                'methods': method_metrics,
+                'selected_methods': selected_counts,
+                'train_seconds': round(train_seconds, 3),
+                'panel': panel.describe()
+            }
+        
+        except Exception as e:
+            print(f"❌ Error in train_all_products: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            raise
+    
+    @staticmethod
+    def _average_metrics(metrics, evaluated):
+        """Trung bình metrics trên các sản phẩm được đánh giá (giống cách tính metrics tổng thể của các model khác)"""
+        if not evaluated.any():
+            return {}
+        return {name: np.mean(values[evaluated]) for name, values in metrics.items()}
+    
+    def _save_results(self, results, overall_metrics, model_name):
+        """Lưu kết quả training"""
+        try:
+            results_data = {
+                'model_name': model_name,
+                'overall_metrics': overall_metrics,
+                'product_results': results,
+                'created_at': get_timestamp()
+            }
+            
+            results_file = f"{self.paths['results']}/baseline_results_{generate_id()}.json"
+            
+            with open(results_file, 'w') as f:
+                json.dump(results_data, f, indent=2, default=str)
+            
+            return results_file
+        
+        except Exception as e:
+            print(f"❌ Error in _save_results: {str(e)}")
+            raise
@@ -0,0 +1,299 @@
+"""
+Prophet-lite Model Implementation
+Trend tuyến tính từng đoạn (changepoint) + mùa vụ năm (Fourier) như Prophet, nhưng dùng chung một design matrix
+trên lưới tuần và giải least squares có regularization cho mọi sản phẩm cùng lúc (linear algebra theo batch)
+"""
+
+import pandas as pd
+import numpy as np
+import time
+import json
+import traceback
+
+from utils.helpers import generate_id, get_timestamp, ensure_dir
+from config.settings import settings
+from services.panel_service import panel_service
+from ml_models.baseline_model import BaselineModel
+
+class ProphetLiteModel:
+    """
+    Prophet-lite cho demand forecasting
+    
+    Chia train/test và tính metrics giống ProphetModel (các tuần có bán của từng sản phẩm, test_ratio dòng cuối
+    là test). Mỗi sản phẩm giải (XᵀDX + Λ)β = XᵀDy với D là mặt nạ các tuần train và y chia theo max của tập
+    train (giống scale của Prophet); Λ phạt changepoint (thay prior Laplace của Prophet) và Fourier, changepoint
+    ngoài CHANGEPOINT_RANGE đầu tập train của sản phẩm bị phạt rất nặng (coi như không dùng). Mùa vụ cộng
+    (không multiplicative) để bài toán vẫn tuyến tính; không có mùa vụ tuần vì dữ liệu đã gộp theo tuần.
+    """
+    
+    N_CHANGEPOINTS = 25  # Số changepoint đặt đều trên lưới tuần (như mặc định của Prophet)
+    CHANGEPOINT_RANGE = 0.8  # Chỉ dùng changepoint trong 80% đầu khoảng train của từng sản phẩm
+    YEARLY_ORDER = 10  # Số cặp sin/cos của mùa vụ năm
+    YEAR_DAYS = 365.25
+    
+    CHANGEPOINT_PENALTY = 10.0
+    SEASONALITY_PENALTY = 10.0
+    TREND_PENALTY = 1e-6  # Chỉ để hệ ổn định khi sản phẩm có ít tuần train
+    EXCLUDED_PENALTY = 1e6
+    
+    BATCH_SIZE = 2048  # Số sản phẩm mỗi lần giải (bộ nhớ ma trận K×K theo batch)
+    
+    # Tham số nhận từ request và search space của tuning
+    TUNABLE_PARAMS = ('changepoint_penalty', 'seasonality_penalty')
+    
+    def __init__(self):
+        self.paths = {
+            'storage': 'storage',
+            'models': settings.MODEL_STORAGE_PATH,
+            'results': settings.RESULTS_STORAGE_PATH,
+            'plots': settings.PLOTS_STORAGE_PATH
+        }
+        
+        # Tạo thư mục nếu chưa có
+        for path in self.paths.values():
+            ensure_dir(path)
+    
+    def design(self, weeks, start, span, changepoints):
+        """
+        Design matrix [tuần, K]: intercept, t, (t - c)+ cho từng changepoint, sin/cos mùa vụ năm
+        t = (tuần - start) / span theo ngày (t > 1 với các tuần tương lai, trend kéo dài theo độ dốc cuối)
+        """
+        days = (np.asarray(weeks, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.float64)
+        t = days / span
+        columns = [np.ones_like(t), t, np.maximum(t[:, None] - changepoints[None, :], 0)]
+        angle = 2 * np.pi * np.arange(1, self.YEARLY_ORDER + 1)[None, :] * days[:, None] / self.YEAR_DAYS
+        columns += [np.sin(angle), np.cos(angle)]
+        return np.column_stack(columns)
+    
+    def penalties(self, changepoints, first_t, last_t, parameters):
+        """Hệ số phạt của từng sản phẩm [P, K] (changepoint ngoài khoảng được phép của sản phẩm bị loại)"""
+        changepoint_penalty = float(parameters.get('changepoint_penalty', self.CHANGEPOINT_PENALTY))
+        seasonality_penalty = float(parameters.get('seasonality_penalty', self.SEASONALITY_PENALTY))
+        allowed = ((changepoints[None, :] > first_t[:, None]) &
+                   (changepoints[None, :] <= (first_t + self.CHANGEPOINT_RANGE * (last_t - first_t))[:, None]))
+        trend = np.full((len(first_t), 2), self.TREND_PENALTY)
+        changepoint = np.where(allowed, changepoint_penalty, self.EXCLUDED_PENALTY)
+        seasonality = np.full((len(first_t), 2 * self.YEARLY_ORDER), seasonality_penalty)
+        return np.concatenate([trend, changepoint, seasonality], axis=1)
+    
+    def solve(self, X, values, mask, penalty):
+        """Hệ số β [P, K] của mọi sản phẩm: (XᵀDX + Λ)β = XᵀDy giải theo batch"""
+        K = X.shape[1]
+        outer = (X[:, :, None] * X[:, None, :]).reshape(len(X), K * K)
+        diagonal = np.arange(K)
+        coefficients = np.empty((len(values), K))
+        for start in range(0, len(values), self.BATCH_SIZE):
+            batch = slice(start, start + self.BATCH_SIZE)
+            weights = mask[batch].astype(np.float64)
+            gram = (weights @ outer).reshape(-1, K, K)
+            gram[:, diagonal, diagonal] += penalty[batch]
+            rhs = (weights * values[batch]) @ X
+            coefficients[batch] = np.linalg.solve(gram, rhs[:, :, None])[:, :, 0]
+        return coefficients
+    
+    def train_all_products(self, data_file, test_ratio=0.3, parameters=None):
+        """
+        Train Prophet-lite cho tất cả sản phẩm (kết quả cùng định dạng ProphetModel.train_all_products)
+        parameters["changepoint_penalty"], parameters["seasonality_penalty"]: hệ số phạt ridge
+        """
+        try:
+            print(f"🚀 Starting Prophet-lite training for all products...")
+            print(f"📖 Loading data from: {data_file}")
+            parameters = parameters or {}
+            
+            # Load panel sản phẩm × tuần (memory-map, mỗi sản phẩm là một hàng)
+            panel = panel_service.load(data_file)
+            print(f"✅ Data loaded. Panel shape: {panel.values.shape}")
+            train_start = time.perf_counter()
+            
+            fit = self.fit(panel, test_ratio, parameters)
+            rows, metrics = fit['rows'], fit['metrics']
+            if len(rows) == 0:
+                raise ValueError("No products with enough weeks for Prophet-lite training")
+            train_seconds = time.perf_counter() - train_start
+            
+            # Kết quả theo sản phẩm (định dạng giống ProphetModel)
+            results = {
+                str(panel.items[row]): {name: float(metric[i]) for name, metric in metrics.items()}
+                for i, row in enumerate(rows)
+            }
+            if results:
+                avg_metrics = {name: np.mean(metric) for name, metric in metrics.items()}
+            else:
+                avg_metrics = {}
+            
+            # Lưu hệ số để dự báo các tuần tiếp theo
+            model_file = self.save_model({
+                'items': panel.items[rows].astype(str),
+                'coefficients': fit['coefficients'],
+                'scale': fit['scale'],
+                'start_week': panel.weeks[0],
+                'span': fit['span'],
+                'changepoints': fit['changepoints'],
+                'last_week': panel.weeks[-1]
+            }, generate_id())
+            
+            # Lưu kết quả
+            results_file = self._save_results(results, avg_metrics, 'Prophet-lite')
+            
+            print(f"✅ Prophet-lite training completed in {train_seconds:.2f}s!")
+            print(f"📊 Trained {len(results)} products")
+            print(f"📊 Average metrics: {avg_metrics}")
+            
+            return {
+                'metrics': avg_metrics,
+                'results_file': results_file,
+                'model_file': model_file,
+                'total_products': len(results),
+                'failed_products': int(panel.observed().any(axis=1).sum() - len(results)),
+                'train_seconds': round(train_seconds, 3),
+                'panel': panel.describe()
+            }
+        
+        except Exception as e:
+            print(f"❌ Error in train_all_products: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            raise
+    
+    def fit(self, panel, test_ratio, parameters, rows=None, validation=False):
+        """
+        Chia train/test, giải hệ số và tính metrics trên tập test cho các hàng rows của panel (mặc định mọi sản
+        phẩm); trả về các hàng đủ dữ liệu (rows), metrics [P] của từng hàng và hệ số để lưu model
+        validation: metrics tính trên đoạn cuối tập train (dài bằng tập test), hệ số giải trên phần trước đó
+        """
+        rows = np.arange(panel.num_products) if rows is None else np.asarray(rows)
+        
+        # Chia train/test theo các tuần có bán như Prophet (cần ít nhất 2 tuần train)
+        observed = panel.observed()[rows]
+        counts = observed.sum(axis=1)
+        n_train = (counts * (1 - test_ratio)).astype(int)
+        if validation:
+            counts, n_train = n_train, 2 * n_train - counts
+        position = np.cumsum(observed, axis=1)
+        train_mask = observed & (position <= n_train[:, None])
+        test_mask = observed & ~train_mask & (position <= counts[:, None])
+        eligible = (n_train >= 2) & test_mask.any(axis=1)
+        rows, train_mask, test_mask = rows[eligible], train_mask[eligible], test_mask[eligible]
+        
+        fit = self.fit_masked(panel, rows, train_mask, parameters)
+        fit['metrics'], _ = BaselineModel.batch_metrics(fit['values'], fit['predictions'], test_mask)
+        return fit
+    
+    def fit_masked(self, panel, rows, train_mask, parameters):
+        """
+        Giải hệ số cho các hàng rows với tập train là các ô train_mask [P, tuần] (mỗi hàng cần ít nhất 2 ô có bán)
+        và dự đoán trên toàn bộ lưới tuần (dùng chung cho chia train/test theo tỉ lệ và các fold backtest)
+        """
+        # Design matrix chung trên lưới tuần
+        span = float(7 * max(panel.num_weeks - 1, 1))
+        changepoints = np.linspace(0, 1, self.N_CHANGEPOINTS + 2)[1:-1]
+        X = self.design(panel.weeks, panel.weeks[0], span, changepoints)
+        
+        # Scale theo max tập train của từng sản phẩm
+        values = np.asarray(panel.values[rows], dtype=np.float64)
+        scale = np.where(train_mask, values, 0).max(axis=1)
+        grid_t = np.arange(panel.num_weeks) / max(panel.num_weeks - 1, 1)
+        first_t = grid_t[train_mask.argmax(axis=1)]
+        last_t = grid_t[panel.num_weeks - 1 - train_mask[:, ::-1].argmax(axis=1)]
+        
+        penalty = self.penalties(changepoints, first_t, last_t, parameters or {})
+        coefficients = self.solve(X, values / scale[:, None], train_mask, penalty)
+        return {
+            'rows': rows,
+            'values': values,
+            'predictions': (coefficients @ X.T) * scale[:, None],
+            'coefficients': coefficients,
+            'scale': scale,
+            'span': span,
+            'changepoints': changepoints
+        }
+    
+    def backtest(self, panel, origins, horizon, parameters=None):
+        """
+        Dự báo rolling-origin [sản phẩm, fold, horizon] (NaN: sản phẩm có ít hơn 2 tuần bán trước mốc): mỗi fold
+        một lần giải batch với tập train là các tuần có bán trước mốc, dự báo lấy từ lưới tuần
+        """
+        observed = panel.observed()
+        grid = np.arange(panel.num_weeks)
+        forecasts = np.full((panel.num_products, len(origins), horizon), np.nan)
+        for fold, origin in enumerate(origins):
+            train_mask = observed & (grid < origin)
+            rows = np.flatnonzero(train_mask.sum(axis=1) >= 2)
+            if len(rows) == 0:
+                continue
+            fit = self.fit_masked(panel, rows, train_mask[rows], parameters)
+            forecasts[rows, fold] = fit['predictions'][:, origin:origin + horizon]
+        return forecasts
+    
+    def tune_products(self, data_file, test_ratio, configs, metric, validation, item_codes, checkpoint=None):
+        """
+        Đánh giá các cấu hình tuning (configs: {config_id: tham số}) cho một nhóm sản phẩm (xem TuningService):
+        mỗi cấu hình một lần fit theo batch cho cả nhóm (dừng trước cấu hình tiếp theo nếu job bị hủy), chấm trên
+        đoạn validation cuối tập train (validation) hoặc trên tập test; sản phẩm không đủ dữ liệu được ghi lỗi
+        """
+        panel = panel_service.load(data_file)
+        rows = np.array([panel.row(item_code) for item_code in item_codes])
+        scores = {item_code: {} for item_code in item_codes}
+        for config_id, params in configs.items():
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Tuning cancelled before config: {config_id}")
+                break
+            fit = self.fit(panel, test_ratio, params, rows, validation)
+            for row, value in zip(fit['rows'], fit['metrics'][metric]):
+                scores[str(panel.items[row])][config_id] = float(value)
+        return [(item_code, scores[item_code], None) if scores[item_code]
+                else (item_code, None, "Not enough weeks for Prophet-lite") for item_code in item_codes]
+    
+    def forecast(self, model_file, periods):
+        """Dự báo periods tuần sau tuần cuối của panel: DataFrame (ItemCode, ds, yhat) giống cột forecast của Prophet"""
+        model = self.load_model(model_file)
+        weeks = model['last_week'] + 7 * np.arange(1, periods + 1)
+        X = self.design(weeks, model['start_week'], float(model['span']), model['changepoints'])
+        yhat = (model['coefficients'] @ X.T) * model['scale'][:, None]
+        return pd.DataFrame({
+            'ItemCode': np.repeat(model['items'], periods),
+            'ds': np.tile(weeks.astype('datetime64[ns]'), len(model['items'])),
+            'yhat': yhat.ravel()
+        })
+    
+    def save_model(self, model, model_id):
+        """Lưu hệ số của mọi sản phẩm (một file .npz)"""
+        try:
+            model_file = f"{self.paths['models']}/prophet_lite_{model_id}.npz"
+            np.savez(model_file, **model)
+            return model_file
+        
+        except Exception as e:
+            print(f"❌ Error in save_model: {str(e)}")
+            raise
+    
+    def load_model(self, model_file):
+        """Load hệ số đã lưu"""
+        try:
+            with np.load(model_file) as data:
+                return {name: data[name] for name in data.files}
+        
+        except Exception as e:
+            print(f"❌ Error in load_model: {str(e)}")
+            raise
+    
+    def _save_results(self, results, overall_metrics, model_name):
+        """Lưu kết quả training"""
+        try:
+            results_data = {
+                'model_name': model_name,
+                'overall_metrics': overall_metrics,
+                'product_results': results,
+                'created_at': get_timestamp()
+            }
+            
+            results_file = f"{self.paths['results']}/prophet_lite_results_{generate_id()}.json"
+            
+            with open(results_file, 'w') as f:
+                json.dump(results_data, f, indent=2, default=str)
+            
+            return results_file
+        
+        except Exception as e:
+            print(f"❌ Error in _save_results: {str(e)}")
+            raise
@@ -10,12 +10,17 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import re
 import json
+import time
 from datetime import datetime
 import traceback
 
 from utils.helpers import generate_id, get_timestamp, ensure_dir
 from config.settings import settings
+from services.panel_service import panel_service
+from services.parallel_training_service import parallel_training
+from services.warm_start_service import warm_start_store
 
 class ProphetModel:
     """Prophet Model cho demand forecasting"""
@@ -32,8 +37,31 @@ class ProphetModel:
         for path in self.paths.values():
             ensure_dir(path)
     
-    def evaluate_prophet(self, df_prod, test_ratio=0.3, plot=True):
-        """Đánh giá Prophet model cho một sản phẩm"""
+    # Cấu hình Prophet dùng cho mọi sản phẩm
+    PROPHET_PARAMS = {
+        'yearly_seasonality': True,
+        'weekly_seasonality': True,
+        'daily_seasonality': False,
+        'seasonality_mode': 'multiplicative'
+    }
+    
+    # Tham số Prophet nhận từ request (ghi đè PROPHET_PARAMS) và search space của tuning
+    TUNABLE_PARAMS = ('seasonality_mode', 'changepoint_prior_scale', 'seasonality_prior_scale', 'changepoint_range')
+    
+    # Tham số Stan lưu lại sau mỗi lần fit để lần retrain sau bắt đầu tối ưu từ đó
+    WARM_START_PARAMS = ('k', 'm', 'delta', 'beta', 'sigma_obs')
+    
+    # Dòng log của optimizer cmdstan: "Iteration  12." (Newton) hoặc "     199       298.139 ..." (LBFGS)
+    ITERATION_LOG = re.compile(r'^(?:Iteration\s+(\d+)\.|\s+(\d+)\s+-?\d)', re.M)
+    
+    def evaluate_prophet(self, df_prod, test_ratio=0.3, plot=True, warm_start=None, prophet_params=None,
+                         train_size=None):
+        """
+        Đánh giá Prophet model cho một sản phẩm
+        warm_start: tham số đã lưu của lần fit trước (xem _warm_params), dùng làm giá trị khởi tạo cho Stan
+        prophet_params: cấu hình Prophet (mặc định PROPHET_PARAMS, xem model_params)
+        train_size: số tuần train (mặc định theo test_ratio)
+        """
         try:
             print(f"🔄 Evaluating Prophet for product...")
             
@@ -48,19 +76,22 @@ class ProphetModel:
             prophet_data.columns = ['ds', 'y']
             
             # Chia train/test
-            train_size = int(len(prophet_data) * (1 - test_ratio))
+            if train_size is None:
+                train_size = int(len(prophet_data) * (1 - test_ratio))
             train_data = prophet_data.iloc[:train_size]
             test_data = prophet_data.iloc[train_size:]
             
-            # Train Prophet model
-            model = Prophet(
-                yearly_seasonality=True,
-                weekly_seasonality=True,
-                daily_seasonality=False,
-                seasonality_mode='multiplicative'
-            )
+            # Train Prophet model (warm start: khởi tạo từ tham số lần fit trước đã quy đổi theo dữ liệu mới)
+            prophet_params = prophet_params or self.PROPHET_PARAMS
+            model = Prophet(**prophet_params)
             
-            model.fit(train_data)
+            init = self._warm_init(warm_start, train_data, prophet_params) if warm_start else None
+            fit_start = time.perf_counter()
+            if init is not None:
+                model.fit(train_data, init=init)
+            else:
+                model.fit(train_data)
+            fit_seconds = time.perf_counter() - fit_start
             
             # Make predictions
             future = model.make_future_dataframe(periods=len(test_data))
@@ -92,7 +123,13 @@ class ProphetModel:
                 'metrics': metrics,
                 'plot_file': plot_file,
                 'model': model,
-                'forecast': forecast
+                'forecast': forecast,
+                'warm_start': self._warm_params(model),
+                'fit_stats': {
+                    'iterations': self._optimizer_iterations(model),
+                    'fit_seconds': fit_seconds,
+                    'warm_started': init is not None
+                }
             }
             
         except Exception as e:
@@ -100,34 +137,113 @@ class ProphetModel:
             print(f"📋 Traceback: {traceback.format_exc()}")
             raise
     
-    def train_all_products(self, data_file, test_ratio=0.3):
-        """Train Prophet cho tất cả sản phẩm"""
+    def _warm_params(self, model):
+        """Tham số đã fit (trong không gian đã chuẩn hóa của Prophet) kèm t_scale/y_scale để quy đổi lần sau"""
+        params = getattr(model, 'params', None)
+        if not params or any(name not in params for name in self.WARM_START_PARAMS):
+            return None
+        return {
+            **{name: np.asarray(params[name]).reshape(-1).tolist() for name in self.WARM_START_PARAMS},
+            't_scale': model.t_scale.total_seconds(),
+            'y_scale': float(model.y_scale)
+        }
+    
+    @classmethod
+    def model_params(cls, parameters):
+        """Cấu hình Prophet: PROPHET_PARAMS ghi đè bởi các khóa TUNABLE_PARAMS trong parameters của request"""
+        return {**cls.PROPHET_PARAMS,
+                **{name: value for name, value in (parameters or {}).items() if name in cls.TUNABLE_PARAMS}}
+    
+    def _warm_init(self, warm_start, train_data, prophet_params):
+        """
+        Giá trị khởi tạo Stan từ tham số lần trước: Prophet chuẩn hóa t theo độ dài lịch sử và y theo max|y|
+        nên slope (k, delta) nhân tỉ lệ thời gian, các tham số theo đơn vị y nhân tỉ lệ scale y
+        """
+        t_scale = (train_data['ds'].max() - train_data['ds'].min()).total_seconds()
+        y_scale = float(np.abs(train_data['y']).max())
+        if t_scale <= 0 or y_scale <= 0 or warm_start['t_scale'] <= 0 or warm_start['y_scale'] <= 0:
+            return None
+        
+        y_ratio = warm_start['y_scale'] / y_scale
+        slope_ratio = t_scale / warm_start['t_scale'] * y_ratio
+        beta_ratio = 1.0 if prophet_params['seasonality_mode'] == 'multiplicative' else y_ratio
+        return {
+            'k': warm_start['k'][0] * slope_ratio,
+            'm': warm_start['m'][0] * y_ratio,
+            'delta': np.asarray(warm_start['delta']) * slope_ratio,
+            'beta': np.asarray(warm_start['beta']) * beta_ratio,
+            'sigma_obs': warm_start['sigma_obs'][0] * y_ratio
+        }
+    
+    def _optimizer_iterations(self, model):
+        """Số vòng lặp của optimizer Stan trong lần fit vừa rồi (đọc từ log cmdstan, None nếu không có)"""
+        try:
+            with open(model.stan_fit.runset.stdout_files[0]) as f:
+                matches = self.ITERATION_LOG.findall(f.read())
+        except Exception:
+            return None
+        iterations = [int(newton or lbfgs) for newton, lbfgs in matches]
+        return max(iterations) if iterations else None
+    
+    @staticmethod
+    def _fit_summary(overall_metrics):
+        """Số vòng lặp/thời gian fit trung bình; có fit cold để so sánh thì kèm mức giảm nhờ warm start"""
+        if not overall_metrics:
+            return {}
+        
+        def mean(values):
+            values = [v for v in values if v is not None]
+            return float(np.mean(values)) if values else None
+        
+        summary = {
+            'products': len(overall_metrics),
+            'warm_started': sum(1 for m in overall_metrics if m.get('warm_started')),
+            'mean_iterations': mean(m.get('iterations') for m in overall_metrics),
+            'mean_fit_seconds': mean(m.get('fit_seconds') for m in overall_metrics)
+        }
+        
+        compared = [m for m in overall_metrics if m.get('cold_iterations') is not None and m.get('iterations')]
+        if compared:
+            warm_iterations = mean(m['iterations'] for m in compared)
+            cold_iterations = mean(m['cold_iterations'] for m in compared)
+            warm_seconds = mean(m['fit_seconds'] for m in compared)
+            cold_seconds = mean(m['cold_fit_seconds'] for m in compared)
+            summary['comparison'] = {
+                'products': len(compared),
+                'warm_mean_iterations': warm_iterations,
+                'cold_mean_iterations': cold_iterations,
+                'warm_mean_fit_seconds': warm_seconds,
+                'cold_mean_fit_seconds': cold_seconds,
+                'iteration_reduction': 1 - warm_iterations / cold_iterations if cold_iterations else None,
+                'time_reduction': 1 - warm_seconds / cold_seconds if cold_seconds else None
+            }
+        return summary
+    
+    def train_all_products(self, data_file, test_ratio=0.3, parameters=None, checkpoint=None):
+        """
+        Train Prophet cho tất cả sản phẩm (Prophet không dùng spec features)
+        parameters["workers"]: số worker process, parameters["warm_start"]: True/"compare" khi retrain,
+        các khóa TUNABLE_PARAMS (vd: seasonality_mode - kết quả tuning): cấu hình Prophet
+        checkpoint: TrainingCheckpoint của job (ghi từng sản phẩm, resume và hủy giữa chừng)
+        """
         try:
             print(f"🚀 Starting Prophet training for all products...")
             print(f"📖 Loading data from: {data_file}")
             
-            # Load data
-            df = pd.read_csv(data_file)
-            print(f"✅ Data loaded. Shape: {df.shape}")
-            
-            # Train cho từng sản phẩm
-            results = {}
-            overall_metrics = []
-            
-            for item_code in df['ItemCode'].unique():
-                try:
-                    print(f"🔄 Training for product: {item_code}")
-                    
-                    item_data = df[df['ItemCode'] == item_code].copy()
-                    result = self.evaluate_prophet(item_data, test_ratio, plot=False)
-                    
-                    if result:
-                        results[item_code] = result['metrics']
-                        overall_metrics.append(result['metrics'])
-                        
-                except Exception as e:
-                    print(f"❌ Error training for {item_code}: {str(e)}")
-                    continue
+            # Load panel sản phẩm × tuần (memory-map, mỗi sản phẩm là một hàng)
+            panel = panel_service.load(data_file)
+            print(f"✅ Data loaded. Panel shape: {panel.values.shape}")
+            
+            # Train cho từng sản phẩm (tuần tự hoặc chia nhóm cho các worker process, parameters["workers"])
+            workers = parallel_training.resolve_workers((parameters or {}).get('workers'))
+            warm_start = (parameters or {}).get('warm_start', False)
+            prophet_params = self.model_params(parameters)
+            item_codes = [str(item) for item in panel.items]
+            product_results = parallel_training.run(
+                self.train_products, item_codes, data_file, test_ratio, warm_start, prophet_params,
+                workers=workers, checkpoint=checkpoint
+            )
+            results, overall_metrics, errors = parallel_training.merge(product_results)
             
             # Tính metrics tổng thể
             if overall_metrics:
@@ -150,7 +266,15 @@ class ProphetModel:
             return {
                 'metrics': avg_metrics,
                 'results_file': results_file,
-                'total_products': len(results)
+                'total_products': len(results),
+                'failed_products': len(errors),
+                'workers': workers,
+                'fit_stats': self._fit_summary(overall_metrics),
+                'parameters': prophet_params,
+                'panel': panel.describe(),
+                # Cờ hủy đặt sau khi sản phẩm cuối đã xong thì job vẫn là hoàn tất
+                'cancelled': len(item_codes) > len(product_results),
+                'pending_products': len(item_codes) - len(product_results)
             }
             
         except Exception as e:
@@ -158,6 +282,132 @@ class ProphetModel:
             print(f"📋 Traceback: {traceback.format_exc()}")
             raise
     
+    def train_products(self, data_file, test_ratio, warm_start, prophet_params, item_codes, checkpoint=None):
+        """
+        Train Prophet cho một nhóm sản phẩm (chạy trong process hiện tại hoặc worker process)
+        Mỗi process tự memory-map panel; lỗi của một sản phẩm không dừng cả nhóm
+        
+        Tham số đã fit của từng sản phẩm luôn được lưu vào warm_start_store. warm_start=True: khởi tạo từ
+        tham số đã lưu (nếu có); "compare": thêm một lần fit cold để đo mức giảm số vòng lặp và thời gian.
+        Có checkpoint: ghi kết quả từng sản phẩm ngay khi xong, dừng trước sản phẩm tiếp theo nếu job bị hủy.
+        """
+        panel = panel_service.load(data_file)
+        namespace = warm_start_store.namespace('prophet', prophet_params)
+        product_results = []
+        
+        for item_code in item_codes:
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Training cancelled before product: {item_code}")
+                break
+            try:
+                print(f"🔄 Training for product: {item_code}")
+                
+                # Prophet chỉ nhận các tuần có bán (như weekly_demand), tuần trống để Prophet tự nội suy
+                item_data = self._product_data(panel, item_code)
+                previous = warm_start_store.get(namespace, item_code) if warm_start else None
+                result = self.evaluate_prophet(item_data, test_ratio, plot=False, warm_start=previous,
+                                               prophet_params=prophet_params)
+                if not result:
+                    product_results.append((item_code, None, None))
+                    continue
+                
+                metrics = {**result['metrics'], **result['fit_stats']}
+                if warm_start == 'compare' and result['fit_stats']['warm_started']:
+                    cold = self.evaluate_prophet(item_data, test_ratio, plot=False, prophet_params=prophet_params)
+                    metrics['cold_iterations'] = cold['fit_stats']['iterations']
+                    metrics['cold_fit_seconds'] = cold['fit_stats']['fit_seconds']
+                
+                if result['warm_start']:
+                    warm_start_store.put(namespace, item_code, result['warm_start'])
+                product_results.append((item_code, metrics, None))
+                
+            except Exception as e:
+                print(f"❌ Error training for {item_code}: {str(e)}")
+                product_results.append((item_code, None, str(e)))
+            
+            if checkpoint is not None:
+                checkpoint.record(product_results[-1])
+        
+        return product_results
+    
+    def tune_products(self, data_file, test_ratio, configs, metric, validation, item_codes, checkpoint=None):
+        """
+        Đánh giá các cấu hình tuning (configs: {config_id: tham số}) cho một nhóm sản phẩm (xem TuningService)
+        validation: fit trên phần đầu tập train và chấm trên đoạn cuối tập train dài bằng tập test; False: chấm
+        trên tập test như train_all_products. Trả về ProductResult với metrics là {config_id: giá trị metric} (dừng trước sản phẩm tiếp theo nếu job
+        bị hủy); không đọc/ghi warm_start_store
+        """
+        panel = panel_service.load(data_file)
+        product_results = []
+        
+        for item_code in item_codes:
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Tuning cancelled before product: {item_code}")
+                break
+            try:
+                item_data = self._product_data(panel, item_code)
+                train_size = int(len(item_data) * (1 - test_ratio))
+                if validation:
+                    item_data, train_size = item_data.iloc[:train_size], 2 * train_size - len(item_data)
+                    if train_size < 2:
+                        raise ValueError("Not enough weeks for a validation split")
+                scores = {}
+                for config_id, params in configs.items():
+                    result = self.evaluate_prophet(item_data, test_ratio, plot=False,
+                                                   prophet_params=self.model_params(params), train_size=train_size)
+                    scores[config_id] = result['metrics'][metric]
+                product_results.append((item_code, scores, None))
+                
+            except Exception as e:
+                print(f"❌ Error tuning for {item_code}: {str(e)}")
+                product_results.append((item_code, None, str(e)))
+        
+        return product_results
+    
+    def backtest_products(self, data_file, origins, horizon, prophet_params, item_codes, checkpoint=None):
+        """
+        Dự báo rolling-origin cho một nhóm sản phẩm (xem BacktestService): mỗi fold fit Prophet trên các tuần có
+        bán trước mốc (cần ít nhất 2 tuần) và dự báo `horizon` tuần từ mốc; không đọc/ghi warm_start_store.
+        Trả về ProductResult với metrics là {'forecasts': [fold][h]} (NaN nếu không đủ dữ liệu)
+        """
+        panel = panel_service.load(data_file)
+        product_results = []
+        
+        for item_code in item_codes:
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Backtest cancelled before product: {item_code}")
+                break
+            try:
+                print(f"🔄 Backtesting product: {item_code}")
+                item_data = self._product_data(panel, item_code)
+                item_data.columns = ['ds', 'y']
+                
+                forecasts = np.full((len(origins), horizon), np.nan)
+                for fold, origin in enumerate(origins):
+                    train_data = item_data[item_data['ds'] < panel.weeks[origin]]
+                    if len(train_data) < 2:
+                        continue
+                    model = Prophet(**prophet_params)
+                    model.fit(train_data)
+                    future = pd.DataFrame({'ds': panel.weeks[origin:origin + horizon].astype('datetime64[ns]')})
+                    forecasts[fold] = model.predict(future)['yhat'].to_numpy()
+                product_results.append((item_code, {'forecasts': forecasts.tolist()}, None))
+                
+            except Exception as e:
+                print(f"❌ Error backtesting {item_code}: {str(e)}")
+                product_results.append((item_code, None, str(e)))
+        
+        return product_results
+    
+    @staticmethod
+    def _product_data(panel, item_code):
+        """Các tuần có bán của sản phẩm (Prophet tự nội suy tuần trống) dạng bảng Week/TotalQuantity"""
+        row = panel.row(item_code)
+        if row is None:
+            raise ValueError(f"Product {item_code} not found in dataset")
+        weeks, quantities = panel.observed_series(row)
+        return pd.DataFrame({'Week': weeks.astype('datetime64[ns]'), 'TotalQuantity': quantities})
+    
     def predict_single(self, model, future_dates):
         """Predict cho một sản phẩm"""
         try:
@@ -0,0 +1,137 @@
+"""
+XGBoost Backend - Train bằng API native của XGBoost: ma trận QuantileDMatrix tạo một lần cho mỗi split
+rồi dùng lại cho nhiều lần fit (trial tuning, fold backtest), thuật toán hist và số thread cố định
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from config.settings import settings
+
+class XGBoostSplit:
+    """
+    Ma trận train/test đã chuyển đổi của một split: dtrain là QuantileDMatrix (đã chia bin theo max_bin),
+    dtest dùng chung bin của dtrain. conversion_seconds là thời gian chuyển pandas/numpy sang ma trận XGBoost.
+    """
+    
+    def __init__(self, dtrain: xgb.QuantileDMatrix, dtest: Optional[xgb.QuantileDMatrix],
+                 feature_names: List[str], max_bin: int, conversion_seconds: float):
+        self.dtrain = dtrain
+        self.dtest = dtest
+        self.feature_names = feature_names
+        self.max_bin = max_bin
+        self.conversion_seconds = conversion_seconds
+
+class XGBoostBackend:
+    """
+    Tạo XGBoostSplit (có cache theo key để các trial/fold dùng lại) và fit booster trên split đó
+    
+    Tham số theo kiểu XGBRegressor (n_estimators, learning_rate, max_depth, ...) được đổi sang tham số
+    native; max_bin cố định theo split vì bin đã được tính khi tạo QuantileDMatrix.
+    """
+    
+    # Giống XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=6, random_state=42) đang dùng
+    DEFAULT_PARAMS = {
+        'objective': 'reg:squarederror',
+        'tree_method': 'hist',
+        'learning_rate': 0.1,
+        'max_depth': 6,
+        'seed': 42
+    }
+    DEFAULT_ROUNDS = 100
+    MAX_BIN = 256
+    
+    # Số split giữ trong cache (mỗi split giữ ma trận train/test đã chia bin)
+    MAX_CACHED_SPLITS = 32
+    
+    def __init__(self, nthread: Optional[int] = None):
+        self.nthread = settings.XGB_NTHREAD if nthread is None else nthread
+        self._splits: "OrderedDict[Hashable, XGBoostSplit]" = OrderedDict()
+    
+    def split(self, X_train: pd.DataFrame, y_train, X_test: Optional[pd.DataFrame] = None, y_test=None,
+              key: Optional[Hashable] = None, max_bin: Optional[int] = None,
+              enable_categorical: bool = False) -> XGBoostSplit:
+        """Chuyển dữ liệu train/test thành ma trận XGBoost; cùng key thì trả lại split đã tạo"""
+        if key is not None and key in self._splits:
+            self._splits.move_to_end(key)
+            return self._splits[key]
+        
+        max_bin = max_bin or self.MAX_BIN
+        start = time.perf_counter()
+        dtrain = xgb.QuantileDMatrix(X_train, y_train, max_bin=max_bin, nthread=self._nthread(),
+                                     enable_categorical=enable_categorical)
+        dtest = None
+        if X_test is not None:
+            dtest = xgb.QuantileDMatrix(X_test, y_test, ref=dtrain, max_bin=max_bin, nthread=self._nthread(),
+                                        enable_categorical=enable_categorical)
+        split = XGBoostSplit(dtrain, dtest, list(X_train.columns), max_bin, time.perf_counter() - start)
+        
+        if key is not None:
+            self._splits[key] = split
+            while len(self._splits) > self.MAX_CACHED_SPLITS:
+                self._splits.popitem(last=False)
+        return split
+    
+    def params(self, parameters: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], int]:
+        """(tham số native, số vòng boosting) từ tham số kiểu XGBRegressor"""
+        params = {**self.DEFAULT_PARAMS, **(parameters or {})}
+        rounds = int(params.pop('n_estimators', self.DEFAULT_ROUNDS))
+        if 'random_state' in params:
+            params['seed'] = params.pop('random_state')
+        params.pop('n_jobs', None)
+        if self._nthread() is not None:
+            params['nthread'] = self._nthread()
+        return params, rounds
+    
+    def fit(self, split: XGBoostSplit,
+            parameters: Optional[Dict[str, Any]] = None) -> Tuple[xgb.Booster, Dict[str, float]]:
+        """Fit booster trên split (không chuyển đổi lại dữ liệu); trả về booster và thời gian fit"""
+        params, rounds = self.params(parameters)
+        params['max_bin'] = split.max_bin
+        
+        start = time.perf_counter()
+        booster = xgb.train(params, split.dtrain, num_boost_round=rounds)
+        return booster, {
+            'conversion_seconds': split.conversion_seconds,
+            'fit_seconds': time.perf_counter() - start
+        }
+    
+    def matrix(self, X: pd.DataFrame) -> xgb.DMatrix:
+        """DMatrix của toàn bộ dòng (chuyển đổi một lần), các lần fit lấy tập con bằng fit_rows"""
+        return xgb.DMatrix(X, nthread=self._nthread())
+    
+    def fit_rows(self, matrix: xgb.DMatrix, rows: np.ndarray, labels: np.ndarray,
+                 parameters: Optional[Dict[str, Any]] = None) -> xgb.Booster:
+        """Fit booster trên các dòng rows của matrix với nhãn labels (slice của DMatrix, không chuyển đổi lại)"""
+        params, rounds = self.params(parameters)
+        params['max_bin'] = params.get('max_bin') or self.MAX_BIN
+        dtrain = matrix.slice(rows)
+        dtrain.set_label(labels)
+        return xgb.train(params, dtrain, num_boost_round=rounds)
+    
+    @staticmethod
+    def predict(booster: xgb.Booster, split: XGBoostSplit) -> np.ndarray:
+        """Dự đoán trên tập test của split"""
+        return booster.predict(split.dtest)
+    
+    @staticmethod
+    def feature_importance(booster: xgb.Booster, feature_names: List[str]) -> Dict[str, float]:
+        """Importance theo gain, chuẩn hóa tổng = 1 (giống XGBRegressor.feature_importances_)"""
+        score = booster.get_score(importance_type='gain')
+        values = np.array([score.get(name, 0.0) for name in feature_names], dtype=np.float32)
+        total = values.sum()
+        if total > 0:
+            values = values / total
+        return dict(zip(feature_names, values))
+    
+    def clear(self) -> None:
+        """Bỏ các split đã cache (vd: sau khi xong một lần tuning/backtest)"""
+        self._splits.clear()
+    
+    def _nthread(self) -> Optional[int]:
+        return self.nthread if self.nthread and self.nthread > 0 else None
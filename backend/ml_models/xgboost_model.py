@@ -12,11 +12,17 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import json
+import time
 from datetime import datetime
 import traceback
 
 from utils.helpers import generate_id, get_timestamp, ensure_dir
 from config.settings import settings
+from services.panel_service import DemandPanel, panel_service
+from services.feature_service import FeatureService
+from services.feature_store_service import feature_store
+from services.parallel_training_service import parallel_training
+from ml_models.xgboost_backend import XGBoostBackend
 
 class XGBoostModel:
     """XGBoost Model cho demand forecasting"""
@@ -33,60 +39,37 @@ class XGBoostModel:
         for path in self.paths.values():
             ensure_dir(path)
     
-    def create_features(self, df):
-        """Tạo features cho XGBoost model"""
+    # Features đưa vào model (thứ tự cột của ma trận X)
+    FEATURE_COLS = FeatureService.FEATURE_COLS
+    
+    # Model chung cho mọi sản phẩm (train_global): nhiều cây hơn, learning rate nhỏ hơn vì học trên dữ liệu của tất cả sản phẩm;
+    # split categorical ItemCode gom tối đa 32 nhóm để giữ model gọn
+    GLOBAL_PARAMS = {
+        'n_estimators': 300,
+        'learning_rate': 0.05,
+        'max_depth': 6,
+        'max_cat_to_onehot': 1,
+        'max_cat_threshold': 32
+    }
+    
+    # Tham số kiểu XGBRegressor nhận từ request (train mỗi sản phẩm một model) và search space của tuning
+    TUNABLE_PARAMS = ('n_estimators', 'learning_rate', 'max_depth', 'min_child_weight', 'subsample',
+                      'colsample_bytree', 'reg_lambda', 'reg_alpha', 'gamma', 'max_bin')
+    
+    # Số dòng train tối thiểu của một model (fold, horizon) trong backtest
+    MIN_BACKTEST_ROWS = 2
+    
+    # Các cột theo đơn vị số lượng, được chia cho scale của sản phẩm trong model chung
+    QUANTITY_PREFIXES = ('lag_', 'rolling_mean_', 'rolling_std_', 'rolling_min_', 'rolling_max_', 'rolling_sum_')
+    
+    def create_features(self, df, feature_spec=None):
+        """Tạo features cho XGBoost model (dựng panel từ bảng weekly, tạo features cho mọi sản phẩm trong một lần)"""
         try:
             print(f"🔄 Creating features for XGBoost...")
             
-            # Đảm bảo Week là datetime
-            df['Week'] = pd.to_datetime(df['Week'])
-            
-            # Sắp xếp theo ItemCode và Week
-            df = df.sort_values(['ItemCode', 'Week']).reset_index(drop=True)
-            
-            # Tạo features cho từng sản phẩm
-            features_list = []
-            
-            for item_code in df['ItemCode'].unique():
-                item_data = df[df['ItemCode'] == item_code].copy()
-                
-                if len(item_data) < 10:  # Bỏ qua sản phẩm có ít dữ liệu
-                    continue
-                
-                # Time-based features
-                item_data['week_of_year'] = item_data['Week'].dt.isocalendar().week
-                item_data['month'] = item_data['Week'].dt.month
-                item_data['quarter'] = item_data['Week'].dt.quarter
-                item_data['year'] = item_data['Week'].dt.year
-                
-                # Lag features
-                item_data['lag_1'] = item_data['TotalQuantity'].shift(1)
-                item_data['lag_2'] = item_data['TotalQuantity'].shift(2)
-                item_data['lag_3'] = item_data['TotalQuantity'].shift(3)
-                item_data['lag_4'] = item_data['TotalQuantity'].shift(4)
-                
-                # Rolling features
-                item_data['rolling_mean_4'] = item_data['TotalQuantity'].rolling(window=4).mean()
-                item_data['rolling_std_4'] = item_data['TotalQuantity'].rolling(window=4).std()
-                item_data['rolling_min_4'] = item_data['TotalQuantity'].rolling(window=4).min()
-                item_data['rolling_max_4'] = item_data['TotalQuantity'].rolling(window=4).max()
-                
-                # Trend features
-                item_data['trend'] = np.arange(len(item_data))
-                
-                # Seasonal features
-                item_data['sin_week'] = np.sin(2 * np.pi * item_data['week_of_year'] / 52)
-                item_data['cos_week'] = np.cos(2 * np.pi * item_data['week_of_year'] / 52)
-                item_data['sin_month'] = np.sin(2 * np.pi * item_data['month'] / 12)
-                item_data['cos_month'] = np.cos(2 * np.pi * item_data['month'] / 12)
-                
-                features_list.append(item_data)
+            df_features = FeatureService.build(DemandPanel.from_weekly(df), feature_spec)
             
-            # Gộp tất cả features
-            if features_list:
-                df_features = pd.concat(features_list, ignore_index=True)
-                df_features = df_features.dropna().reset_index(drop=True)
-                
+            if df_features is not None:
                 print(f"✅ Features created. Shape: {df_features.shape}")
                 return df_features
             else:
@@ -98,116 +81,125 @@ class XGBoostModel:
             print(f"📋 Traceback: {traceback.format_exc()}")
             raise
     
-    def evaluate_xgb(self, df_prod, test_ratio=0.3, plot=True):
+    def evaluate_xgb(self, df_prod, test_ratio=0.3, plot=True, feature_spec=None):
         """Đánh giá XGBoost model cho một sản phẩm"""
         try:
             print(f"🔄 Evaluating XGBoost for product...")
             
             # Tạo features
-            df_features = self.create_features(df_prod)
+            df_features = self.create_features(df_prod, feature_spec)
             if df_features is None:
                 return None
             
-            # Chia train/test
-            train_size = int(len(df_features) * (1 - test_ratio))
-            train_data = df_features.iloc[:train_size]
-            test_data = df_features.iloc[train_size:]
-            
-            # Features và target
-            feature_cols = [
-                'week_of_year', 'month', 'quarter', 'year',
-                'lag_1', 'lag_2', 'lag_3', 'lag_4',
-                'rolling_mean_4', 'rolling_std_4', 'rolling_min_4', 'rolling_max_4',
-                'trend', 'sin_week', 'cos_week', 'sin_month', 'cos_month'
-            ]
-            
-            X_train = train_data[feature_cols]
-            y_train = train_data['TotalQuantity']
-            X_test = test_data[feature_cols]
-            y_test = test_data['TotalQuantity']
-            
-            # Train model
-            model = xgb.XGBRegressor(
-                n_estimators=100,
-                learning_rate=0.1,
-                max_depth=6,
-                random_state=42
-            )
-            
-            model.fit(X_train, y_train)
-            
-            # Predictions
-            y_pred = model.predict(X_test)
-            
-            # Metrics
-            mae = mean_absolute_error(y_test, y_pred)
-            rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-            mape = np.mean(np.abs((y_test - y_pred) / y_test)) * 100
-            r2 = r2_score(y_test, y_pred)
-            
-            metrics = {
-                'mae': float(mae),
-                'rmse': float(rmse),
-                'mape': float(mape),
-                'r2': float(r2)
-            }
-            
-            # Plot nếu cần
-            plot_file = None
-            if plot:
-                plot_file = self._create_plot(train_data, test_data, y_pred, 'XGBoost')
-            
-            return {
-                'metrics': metrics,
-                'plot_file': plot_file,
-                'model': model,
-                'feature_importance': dict(zip(feature_cols, model.feature_importances_))
-            }
+            return self._evaluate_features(df_features, test_ratio, plot, FeatureService.compile(feature_spec).columns)
             
         except Exception as e:
             print(f"❌ Error in evaluate_xgb: {str(e)}")
             print(f"📋 Traceback: {traceback.format_exc()}")
             raise
     
-    def train_all_products(self, data_file, test_ratio=0.3):
-        """Train XGBoost cho tất cả sản phẩm"""
+    def _evaluate_features(self, df_features, test_ratio=0.3, plot=True, feature_cols=None, n_jobs=None,
+                           params=None):
+        """
+        Train/test XGBoost trên bảng features đã tạo của một sản phẩm (n_jobs: số thread của XGBoost,
+        params: tham số kiểu XGBRegressor ghi đè XGBoostBackend.DEFAULT_PARAMS)
+        """
+        # Chia train/test
+        train_size = int(len(df_features) * (1 - test_ratio))
+        train_data = df_features.iloc[:train_size]
+        test_data = df_features.iloc[train_size:]
+        
+        # Features và target
+        feature_cols = feature_cols or self.FEATURE_COLS
+        
+        X_train = train_data[feature_cols]
+        y_train = train_data['TotalQuantity']
+        X_test = test_data[feature_cols]
+        y_test = test_data['TotalQuantity']
+        
+        # Train model: chuyển dữ liệu sang QuantileDMatrix một lần rồi fit bằng hist
+        backend = XGBoostBackend(nthread=n_jobs)
+        split = backend.split(X_train, y_train, X_test, y_test, max_bin=(params or {}).get('max_bin'))
+        model, timings = backend.fit(split, params)
+        
+        # Predictions
+        y_pred = backend.predict(model, split)
+        
+        # Metrics
+        metrics = self._metrics(y_test, y_pred)
+        
+        # Plot nếu cần
+        plot_file = None
+        if plot:
+            plot_file = self._create_plot(train_data, test_data, y_pred, 'XGBoost')
+        
+        return {
+            'metrics': metrics,
+            'plot_file': plot_file,
+            'model': model,
+            'timings': timings,
+            'feature_importance': backend.feature_importance(model, feature_cols)
+        }
+    
+    @classmethod
+    def model_params(cls, parameters):
+        """Tham số XGBoost trong parameters của request (các khóa TUNABLE_PARAMS, còn lại dùng mặc định)"""
+        return {name: value for name, value in (parameters or {}).items() if name in cls.TUNABLE_PARAMS}
+    
+    @staticmethod
+    def _metrics(y_test, y_pred):
+        """MAE/RMSE/MAPE/R2 trên tập test của một sản phẩm"""
+        mae = mean_absolute_error(y_test, y_pred)
+        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+        mape = np.mean(np.abs((y_test - y_pred) / y_test)) * 100
+        r2 = r2_score(y_test, y_pred)
+        
+        return {
+            'mae': float(mae),
+            'rmse': float(rmse),
+            'mape': float(mape),
+            'r2': float(r2)
+        }
+    
+    def train_all_products(self, data_file, test_ratio=0.3, parameters=None, checkpoint=None):
+        """
+        Train XGBoost cho tất cả sản phẩm
+        parameters["features"]: spec features (xem FeatureService), parameters["workers"]: số worker process,
+        các khóa TUNABLE_PARAMS (vd: max_depth, learning_rate - kết quả tuning): tham số XGBoost
+        checkpoint: TrainingCheckpoint của job (ghi từng sản phẩm, resume và hủy giữa chừng)
+        """
         try:
             print(f"🚀 Starting XGBoost training for all products...")
             print(f"📖 Loading data from: {data_file}")
             
-            # Load data
-            df = pd.read_csv(data_file)
-            print(f"✅ Data loaded. Shape: {df.shape}")
-            
-            # Train cho từng sản phẩm
-            results = {}
-            overall_metrics = []
-            
-            for item_code in df['ItemCode'].unique():
-                try:
-                    print(f"🔄 Training for product: {item_code}")
-                    
-                    item_data = df[df['ItemCode'] == item_code].copy()
-                    result = self.evaluate_xgb(item_data, test_ratio, plot=False)
-                    
-                    if result:
-                        results[item_code] = result['metrics']
-                        overall_metrics.append(result['metrics'])
-                        
-                except Exception as e:
-                    print(f"❌ Error training for {item_code}: {str(e)}")
-                    continue
-            
-            # Tính metrics tổng thể
-            if overall_metrics:
-                avg_metrics = {
-                    'mae': np.mean([m['mae'] for m in overall_metrics]),
-                    'rmse': np.mean([m['rmse'] for m in overall_metrics]),
-                    'mape': np.mean([m['mape'] for m in overall_metrics]),
-                    'r2': np.mean([m['r2'] for m in overall_metrics])
-                }
-            else:
-                avg_metrics = {}
+            # Load panel sản phẩm × tuần (memory-map, mỗi sản phẩm là một hàng)
+            panel = panel_service.load(data_file)
+            print(f"✅ Data loaded. Panel shape: {panel.values.shape}")
+            
+            # Bảng features của dataset từ feature store (tạo một lần, các lần train sau đọc memory-map)
+            feature_spec = (parameters or {}).get('features')
+            feature_cols = FeatureService.compile(feature_spec).columns
+            table, store_info = feature_store.table(data_file, feature_spec)
+            item_codes = list(feature_store.product_offsets(table)) if table is not None else []
+            params = self.model_params(parameters)
+            
+            # Train cho từng sản phẩm (tuần tự hoặc chia nhóm cho các worker process, parameters["workers"])
+            workers = parallel_training.resolve_workers((parameters or {}).get('workers'))
+            train_start = time.perf_counter()
+            product_results = parallel_training.run(
+                self.train_products, item_codes, data_file, test_ratio, feature_spec,
+                1 if workers > 1 else None,  # Chạy song song thì mỗi worker chỉ dùng 1 thread XGBoost
+                params, workers=workers, checkpoint=checkpoint
+            )
+            results, overall_metrics, errors = parallel_training.merge(product_results)
+            train_seconds = time.perf_counter() - train_start
+            
+            # Tính metrics tổng thể (metrics từng sản phẩm kèm thời gian chuyển đổi dữ liệu và thời gian fit)
+            avg_metrics = self._average_metrics(overall_metrics)
+            timings = {
+                name: round(float(sum(m[name] for m in overall_metrics)), 3)
+                for name in ('conversion_seconds', 'fit_seconds')
+            }
             
             # Lưu kết quả
             results_file = self._save_results(results, avg_metrics, 'XGBoost')
@@ -219,7 +211,18 @@ class XGBoostModel:
             return {
                 'metrics': avg_metrics,
                 'results_file': results_file,
-                'total_products': len(results)
+                'total_products': len(results),
+                'panel': panel.describe(),
+                'failed_products': len(errors),
+                'workers': workers,
+                'train_seconds': round(train_seconds, 3),
+                'timings': timings,
+                'feature_cols': feature_cols,
+                'parameters': params,
+                'feature_store': store_info,
+                # Cờ hủy đặt sau khi sản phẩm cuối đã xong thì job vẫn là hoàn tất
+                'cancelled': len(item_codes) > len(product_results),
+                'pending_products': len(item_codes) - len(product_results)
             }
             
         except Exception as e:
@@ -227,6 +230,258 @@ class XGBoostModel:
             print(f"📋 Traceback: {traceback.format_exc()}")
             raise
     
+    def train_global(self, data_file, test_ratio=0.3, parameters=None):
+        """
+        Train một model XGBoost chung cho mọi sản phẩm (model_type "xgboost_global")
+        
+        Mỗi sản phẩm chia train/test như train_all_products (test_ratio dòng cuối), ItemCode là feature
+        categorical, các cột theo đơn vị số lượng (lag, rolling) và target được chia cho trung bình tập train
+        của sản phẩm, kèm thống kê của sản phẩm (log trung bình, hệ số biến thiên). Features luôn tạo với
+        exclude_current (rolling/pct_change kết thúc ở tuần t-1): vì target cũng chia cùng scale, cửa sổ chứa
+        tuần t sẽ cho model suy ra target từ rolling và lag. Metrics tính theo từng sản phẩm và lưu qua
+        _save_results.
+        """
+        try:
+            print(f"🚀 Starting global XGBoost training for all products...")
+            print(f"📖 Loading data from: {data_file}")
+            
+            parameters = parameters or {}
+            feature_spec = {**(parameters.get('features') or {}), 'exclude_current': True}
+            feature_cols = FeatureService.compile(feature_spec).columns
+            features = feature_store.load(data_file, feature_spec)
+            if features is None:
+                raise ValueError("No valid products for feature creation")
+            
+            # Chia train/test theo vị trí dòng trong từng sản phẩm (bảng đã sắp xếp theo sản phẩm, tuần)
+            item_codes = features['ItemCode'].to_numpy()
+            starts = np.concatenate([[0], np.flatnonzero(item_codes[1:] != item_codes[:-1]) + 1])
+            sizes = np.diff(np.append(starts, len(item_codes)))
+            position = np.arange(len(item_codes)) - np.repeat(starts, sizes)
+            is_train = position < np.repeat((sizes * (1 - test_ratio)).astype(int), sizes)
+            
+            X, y, scale = self._global_matrix(features, feature_cols, is_train)
+            
+            params = {**self.GLOBAL_PARAMS, **{k: parameters[k] for k in self.GLOBAL_PARAMS if k in parameters}}
+            backend = XGBoostBackend()
+            split = backend.split(X[is_train], y[is_train], X[~is_train], y[~is_train], enable_categorical=True)
+            model, timings = backend.fit(split, params)
+            train_seconds = timings['conversion_seconds'] + timings['fit_seconds']
+            
+            y_pred = backend.predict(model, split) * scale[~is_train]
+            y_test = features['TotalQuantity'].to_numpy()[~is_train]
+            
+            # Metrics theo từng sản phẩm trên các dòng test của nó (giống train_all_products)
+            results, overall_metrics = self._product_metrics(item_codes[~is_train], y_test, y_pred)
+            avg_metrics = self._average_metrics(overall_metrics)
+            
+            results_file = self._save_results(results, avg_metrics, 'XGBoost Global')
+            model_file = f"{self.paths['models']}/xgboost_global_{generate_id()}.json"
+            model.save_model(model_file)
+            
+            print(f"✅ Global XGBoost training completed in {train_seconds:.2f}s!")
+            print(f"📊 Evaluated {len(results)} products")
+            print(f"📊 Average metrics: {avg_metrics}")
+            
+            return {
+                'metrics': avg_metrics,
+                'results_file': results_file,
+                'model_file': model_file,
+                'model_size_mb': round(os.path.getsize(model_file) / (1024 * 1024), 3),
+                'total_products': len(results),
+                'train_rows': int(is_train.sum()),
+                'train_seconds': round(train_seconds, 3),
+                'timings': {name: round(seconds, 3) for name, seconds in timings.items()},
+                'parameters': params,
+                'feature_cols': list(X.columns),
+                'feature_store': features.attrs.get('feature_store')
+            }
+            
+        except Exception as e:
+            print(f"❌ Error in train_global: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            raise
+    
+    def _global_matrix(self, features, feature_cols, is_train):
+        """
+        Ma trận X của model chung: ItemCode (categorical) + features, cột theo đơn vị số lượng chia cho
+        scale của sản phẩm (trung bình TotalQuantity trên tập train) + thống kê sản phẩm; trả về (X, y/scale, scale)
+        """
+        item_codes = pd.Categorical(features['ItemCode'])
+        quantity = features['TotalQuantity'].to_numpy(dtype=np.float64)
+        
+        # Thống kê theo sản phẩm chỉ lấy từ các dòng train (không dùng thông tin tập test)
+        train_quantity = pd.Series(np.where(is_train, quantity, np.nan))
+        grouped = train_quantity.groupby(item_codes.codes)
+        mean = grouped.transform('mean').to_numpy()
+        std = grouped.transform('std').fillna(0).to_numpy()
+        scale = np.where(np.isfinite(mean) & (mean > 0), mean, 1.0)
+        
+        X = pd.DataFrame({'ItemCode': item_codes})
+        for col in feature_cols:
+            values = features[col].to_numpy()
+            X[col] = values / scale if col.startswith(self.QUANTITY_PREFIXES) else values
+        X['product_log_mean'] = np.log1p(scale)
+        X['product_cv'] = std / scale
+        
+        return X, quantity / scale, scale
+    
+    def _product_metrics(self, item_codes, y_test, y_pred):
+        """Metrics của từng sản phẩm từ các dòng test đã sắp xếp theo sản phẩm: ({ItemCode: metrics}, [metrics])"""
+        results = {}
+        overall_metrics = []
+        bounds = np.flatnonzero(item_codes[1:] != item_codes[:-1]) + 1
+        for start, item_test, item_pred in zip(np.concatenate([[0], bounds]),
+                                               np.split(y_test, bounds), np.split(y_pred, bounds)):
+            if len(item_test) == 0:
+                continue
+            try:
+                metrics = self._metrics(item_test, item_pred)
+            except Exception as e:
+                print(f"❌ Error evaluating {item_codes[start]}: {str(e)}")
+                continue
+            results[item_codes[start]] = metrics
+            overall_metrics.append(metrics)
+        return results, overall_metrics
+    
+    @staticmethod
+    def _average_metrics(overall_metrics):
+        """Trung bình metrics của các sản phẩm"""
+        if not overall_metrics:
+            return {}
+        return {
+            'mae': np.mean([m['mae'] for m in overall_metrics]),
+            'rmse': np.mean([m['rmse'] for m in overall_metrics]),
+            'mape': np.mean([m['mape'] for m in overall_metrics]),
+            'r2': np.mean([m['r2'] for m in overall_metrics])
+        }
+    
+    def train_products(self, data_file, test_ratio, feature_spec, n_jobs, params, item_codes, checkpoint=None):
+        """
+        Train XGBoost cho một nhóm sản phẩm (chạy trong process hiện tại hoặc worker process)
+        Features đọc từ feature store theo từng sản phẩm; lỗi của một sản phẩm không dừng cả nhóm
+        Có checkpoint: ghi kết quả từng sản phẩm ngay khi xong, dừng trước sản phẩm tiếp theo nếu job bị hủy
+        """
+        feature_cols = FeatureService.compile(feature_spec).columns
+        product_results = []
+        
+        for item_code, df_features in feature_store.iter_products(data_file, item_codes, feature_spec):
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Training cancelled before product: {item_code}")
+                break
+            try:
+                print(f"🔄 Training for product: {item_code}")
+                
+                result = self._evaluate_features(df_features, test_ratio, plot=False, feature_cols=feature_cols,
+                                                 n_jobs=n_jobs, params=params)
+                metrics = {**result['metrics'], **result['timings']} if result else None
+                product_results.append((item_code, metrics, None))
+                
+            except Exception as e:
+                print(f"❌ Error training for {item_code}: {str(e)}")
+                product_results.append((item_code, None, str(e)))
+            
+            if checkpoint is not None:
+                checkpoint.record(product_results[-1])
+        
+        return product_results
+    
+    def tune_products(self, data_file, test_ratio, feature_spec, n_jobs, configs, metric, validation, item_codes,
+                      checkpoint=None):
+        """
+        Đánh giá các cấu hình tuning (configs: {config_id: tham số}) cho một nhóm sản phẩm (xem TuningService)
+        validation: fit trên phần đầu tập train và chấm trên đoạn cuối tập train dài bằng tập test (chọn cấu hình);
+        False: fit trên cả tập train và chấm trên tập test như train_all_products (metric cuối của cấu hình đã chọn)
+        Mỗi sản phẩm chỉ chuyển dữ liệu sang QuantileDMatrix một lần cho mỗi max_bin (split cache theo key) rồi
+        fit lần lượt các cấu hình; trả về ProductResult với metrics là {config_id: giá trị metric}
+        (dừng trước sản phẩm tiếp theo nếu job bị hủy)
+        """
+        feature_cols = FeatureService.compile(feature_spec).columns
+        product_results = []
+        
+        for item_code, df_features in feature_store.iter_products(data_file, item_codes, feature_spec):
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Tuning cancelled before product: {item_code}")
+                break
+            try:
+                train_size = int(len(df_features) * (1 - test_ratio))
+                end = len(df_features)
+                if validation:
+                    train_size, end = 2 * train_size - end, train_size
+                    if train_size < 2:
+                        raise ValueError("Not enough rows for a validation split")
+                train_data = df_features.iloc[:train_size]
+                test_data = df_features.iloc[train_size:end]
+                y_test = test_data['TotalQuantity']
+                
+                backend = XGBoostBackend(nthread=n_jobs)
+                scores = {}
+                for config_id, params in configs.items():
+                    split = backend.split(train_data[feature_cols], train_data['TotalQuantity'],
+                                          test_data[feature_cols], y_test, key=params.get('max_bin'),
+                                          max_bin=params.get('max_bin'))
+                    model, _ = backend.fit(split, params)
+                    scores[config_id] = self._metrics(y_test, backend.predict(model, split))[metric]
+                product_results.append((item_code, scores, None))
+                
+            except Exception as e:
+                print(f"❌ Error tuning for {item_code}: {str(e)}")
+                product_results.append((item_code, None, str(e)))
+        
+        return product_results
+    
+    def backtest_products(self, data_file, origins, horizon, feature_spec, n_jobs, params, item_codes,
+                          checkpoint=None):
+        """
+        Dự báo rolling-origin cho một nhóm sản phẩm (xem BacktestService) theo chiến lược direct: mỗi (fold, h) một
+        model học features tuần s -> lượng bán tuần s + h (chỉ các tuần đích có bán, s + h trước mốc) rồi dự báo
+        từ features tuần ngay trước mốc. Features của nhóm tạo một lần, giữ cả tuần không bán để luôn có dòng tại
+        mốc; mỗi sản phẩm chuyển sang DMatrix một lần, các fit chỉ slice các dòng train.
+        Trả về ProductResult với metrics là {'forecasts': [fold][h]} (NaN nếu không đủ dữ liệu)
+        """
+        panel = panel_service.load(data_file)
+        rows = [row for row in (panel.row(item_code) for item_code in item_codes) if row is not None]
+        subset = DemandPanel(np.asarray(panel.values[rows]), panel.items[rows], panel.weeks[0])
+        plan = FeatureService.compile(feature_spec)
+        features = plan.build(subset, all_weeks=True)
+        products = {} if features is None else dict(tuple(features.groupby('ItemCode', sort=False)))
+        
+        backend = XGBoostBackend(nthread=n_jobs)
+        product_results = []
+        for item_code in item_codes:
+            if checkpoint is not None and checkpoint.cancelled():
+                print(f"🗑️ Backtest cancelled before product: {item_code}")
+                break
+            try:
+                df_features = products.get(item_code)
+                if df_features is None:
+                    product_results.append((item_code, None, None))
+                    continue
+                
+                print(f"🔄 Backtesting product: {item_code}")
+                y = np.asarray(panel.values[panel.row(item_code)], dtype=np.float64)
+                week = (df_features['Week'].to_numpy().astype('datetime64[D]') - panel.weeks[0]).astype(np.int64) // 7
+                matrix = backend.matrix(df_features[plan.columns])
+                
+                forecasts = np.full((len(origins), horizon), np.nan)
+                for step in range(1, horizon + 1):
+                    target = week + step
+                    label = y[np.minimum(target, len(y) - 1)]
+                    usable = (target < len(y)) & (label > 0)
+                    for fold, origin in enumerate(origins):
+                        train = np.flatnonzero(usable & (target < origin))
+                        at_origin = np.flatnonzero(week == origin - 1)
+                        if len(train) < self.MIN_BACKTEST_ROWS or len(at_origin) == 0:
+                            continue
+                        booster = backend.fit_rows(matrix, train, label[train], params)
+                        forecasts[fold, step - 1] = booster.predict(matrix.slice(at_origin))[0]
+                product_results.append((item_code, {'forecasts': forecasts.tolist()}, None))
+                
+            except Exception as e:
+                print(f"❌ Error backtesting {item_code}: {str(e)}")
+                product_results.append((item_code, None, str(e)))
+        
+        return product_results
+    
     def predict_single(self, model, features):
         """Predict cho một sản phẩm"""
         try:
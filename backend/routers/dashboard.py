@@ -6,6 +6,8 @@ import json
 from datetime import datetime, timedelta
 
 from services.metrics_service import MetricsService
+from services.panel_service import panel_service
+from services.catalog_service import catalog
 from utils.helpers import get_timestamp
 
 router = APIRouter()
@@ -16,20 +18,13 @@ async def get_metrics():
     Tổng hợp các chỉ số (RMSE, MAE,...)
     """
     try:
-        # Import from other routers
-        from routers.datasets import get_datasets
-        from routers.models import models
-        from routers.train import training_jobs
-        
-        datasets = get_datasets()
-        
-        # Calculate overall metrics
-        total_datasets = len(datasets)
-        total_models = len(models)
-        total_jobs = len(training_jobs)
+        # Calculate overall metrics (đếm trên catalog, không đọc toàn bộ bản ghi)
+        total_datasets = catalog.count("datasets")
+        total_models = catalog.count("models")
+        total_jobs = catalog.count("training_jobs")
         
         # Get deployed models
-        deployed_models = [m for m in models.values() if m.get("status") == "deployed"]
+        deployed_models = catalog.list("models", where={"status": "deployed"})
         total_deployed = len(deployed_models)
         
         # Calculate average metrics for deployed models
@@ -53,9 +48,9 @@ async def get_metrics():
         
         # Get recent activity
         recent_jobs = []
-        for job_id, job_info in list(training_jobs.items())[-5:]:  # Last 5 jobs
+        for job_info in reversed(catalog.list("training_jobs", newest_first=True, limit=5)):  # Last 5 jobs
             recent_jobs.append({
-                "id": job_id,
+                "id": job_info["id"],
                 "model_type": job_info["model_type"],
                 "status": job_info["status"],
                 "created_at": job_info["created_at"]
@@ -82,11 +77,8 @@ async def get_performance():
     Đánh giá hiệu suất trên dữ liệu thực tế
     """
     try:
-        # Import from other routers
-        from routers.models import models
-        
         # Get deployed models
-        deployed_models = [m for m in models.values() if m.get("status") == "deployed"]
+        deployed_models = catalog.list("models", where={"status": "deployed"})
         
         performance_data = []
         
@@ -119,35 +111,36 @@ async def get_trends():
     Xu hướng dự báo theo thời gian
     """
     try:
-        # Import from other routers
-        from routers.datasets import get_datasets
-        
-        datasets = get_datasets()
-        
-        # Get latest dataset
-        if not datasets:
+        # Get the most recent dataset
+        latest = catalog.list("datasets", newest_first=True, limit=1)
+        if not latest:
             return {
                 "success": True,
                 "trends": [],
                 "message": "No datasets available"
             }
         
-        # Get the most recent dataset
-        latest_dataset = max(datasets.values(), key=lambda x: x["uploaded_at"])
+        latest_dataset = latest[0]
         
-        # Load processed data
-        df = pd.read_csv(latest_dataset["processed_file"])
+        # Load panel sản phẩm × tuần (memory-map)
+        panel = panel_service.load(latest_dataset["processed_file"])
         
         # Calculate trends
         trends = []
         
-        # Weekly trends
-        df['Week'] = pd.to_datetime(df['Week'])
-        weekly_trends = df.groupby('Week')['TotalQuantity'].sum().reset_index()
+        # Weekly trends: tổng theo cột của panel, chỉ giữ các tuần có bán
+        weekly_totals = panel.values.sum(axis=0)
+        active_weeks = weekly_totals > 0
+        weekly_trends = pd.DataFrame({
+            'Week': panel.weeks[active_weeks].astype('datetime64[ns]'),
+            'TotalQuantity': weekly_totals[active_weeks]
+        })
         
         # Monthly trends
-        df['Month'] = df['Week'].dt.to_period('M')
-        monthly_trends = df.groupby('Month')['TotalQuantity'].sum().reset_index()
+        monthly_trends = (
+            weekly_trends.groupby(weekly_trends['Week'].dt.to_period('M').rename('Month'))['TotalQuantity']
+            .sum().reset_index()
+        )
         
         trends.append({
             "type": "weekly",
@@ -174,24 +167,20 @@ async def get_alerts():
     Cảnh báo về model performance
     """
     try:
-        # Import from other routers
-        from routers.models import models
-        from routers.train import training_jobs
-        
         alerts = []
         
         # Check for failed training jobs
-        failed_jobs = [j for j in training_jobs.values() if j["status"] == "failed"]
+        failed_jobs = catalog.count("training_jobs", where={"status": "failed"})
         if failed_jobs:
             alerts.append({
                 "type": "training_failed",
                 "severity": "high",
-                "message": f"{len(failed_jobs)} training jobs failed",
-                "count": len(failed_jobs)
+                "message": f"{failed_jobs} training jobs failed",
+                "count": failed_jobs
             })
         
         # Check for models with poor performance
-        deployed_models = [m for m in models.values() if m.get("status") == "deployed"]
+        deployed_models = catalog.list("models", where={"status": "deployed"})
         poor_performance_models = []
         
         for model in deployed_models:
@@ -243,41 +232,29 @@ async def get_summary():
     Tóm tắt tổng quan hệ thống
     """
     try:
-        # Import from other routers
-        from routers.datasets import get_datasets
-        from routers.models import models
-        from routers.train import training_jobs
-        
-        datasets = get_datasets()
-        
         # Calculate summary statistics
-        total_datasets = len(datasets)
-        total_models = len(models)
-        total_jobs = len(training_jobs)
+        total_datasets = catalog.count("datasets")
+        total_models = catalog.count("models")
+        total_jobs = catalog.count("training_jobs")
         
         # Job status breakdown
-        job_status = {}
-        for job in training_jobs.values():
-            status = job["status"]
-            job_status[status] = job_status.get(status, 0) + 1
+        job_status = catalog.count_by("training_jobs", "status")
         
         # Model type breakdown
-        model_types = {}
-        for model in models.values():
-            model_type = model["type"]
-            model_types[model_type] = model_types.get(model_type, 0) + 1
+        model_types = catalog.count_by("models", "type")
         
-        # Recent activity (last 7 days)
+        # Recent activity (last 7 days): chỉ đọc các job tạo trong 8 ngày gần nhất qua index created_at
         recent_activity = []
         current_time = datetime.now()
+        since = (current_time - timedelta(days=8)).isoformat()
         
-        for job_id, job_info in training_jobs.items():
+        for job_info in catalog.list("training_jobs", created_after=since):
             created_at = datetime.fromisoformat(job_info["created_at"].replace('Z', '+00:00'))
             days_ago = (current_time - created_at).days
             
             if days_ago <= 7:
                 recent_activity.append({
-                    "id": job_id,
+                    "id": job_info["id"],
                     "type": "training_job",
                     "model_type": job_info["model_type"],
                     "status": job_info["status"],
@@ -3,18 +3,53 @@ from fastapi.responses import FileResponse
 from typing import List, Optional, Dict, Any
 import pandas as pd
 import os
-import shutil
+import copy
 from datetime import datetime
 import traceback
 
 from services.data_service import DataService
 from utils.helpers import generate_id, get_timestamp, ensure_dir, validate_file_extension, get_data_paths
-from shared_state import add_dataset, remove_dataset, get_datasets
+from shared_state import add_dataset, remove_dataset, get_datasets, find_datasets
+from shared_state import get_dataset as get_dataset_info
+from services.ingestion_service import ingestion_service, IngestionBusyError
+from services.blob_store_service import BlobStoreService
+from services.panel_service import panel_service
+from services.feature_store_service import feature_store
 
 router = APIRouter()
 data_service = DataService()
+blob_store = BlobStoreService()
 paths = get_data_paths()
 
+def _find_processed_upload(content_hash: str) -> Optional[Dict[str, Any]]:
+    """Tìm dataset đã xử lý từ file có cùng hash (chưa append) và file kết quả vẫn còn"""
+    for dataset_info in find_datasets(where={"content_hash": content_hash}):
+        if not dataset_info.get("appends") and os.path.exists(dataset_info["processed_file"]):
+            return dataset_info
+    return None
+
+def _output_files(processed_file: str, pending_file: Optional[str]) -> List[str]:
+    """Các file kết quả xử lý: weekly_demand, panel đi kèm và các ngày đang chờ"""
+    return [processed_file, *panel_service.panel_files(processed_file), pending_file]
+
+def _dataset_files(dataset_info: Dict[str, Any]) -> List[str]:
+    """Các file trên đĩa mà dataset đang tham chiếu"""
+    files = [dataset_info["file_path"], *_output_files(dataset_info["processed_file"], dataset_info.get("pending_file"))]
+    files.extend(append_info["file_path"] for append_info in dataset_info.get("appends", []))
+    return [f for f in files if f]
+
+def _release_files(file_paths: List[str]) -> None:
+    """Xóa các file không còn dataset nào tham chiếu (file được dùng chung giữa các dataset trùng nội dung)"""
+    referenced = set()
+    for dataset_info in get_datasets().values():
+        referenced.update(_dataset_files(dataset_info))
+    
+    for file_path in set(file_paths):
+        if file_path not in referenced and os.path.exists(file_path):
+            feature_store.invalidate(file_path)
+            os.remove(file_path)
+            print(f"🗑️ Removed unreferenced file: {file_path}")
+
 @router.post("/")
 async def upload_dataset(
     file: UploadFile = File(...),
@@ -35,71 +70,228 @@ async def upload_dataset(
         # Generate dataset ID
         dataset_id = generate_id()
         
-        # Save uploaded file to storage/datasets
-        file_path = f"{paths['storage']}/datasets/{dataset_id}_{file.filename}"
-        ensure_dir(os.path.dirname(file_path))
+        # Save uploaded file to storage/datasets/blobs, hashing while streaming to disk
+        blob = await blob_store.save_upload(file)
+        file_path = blob["file_path"]
+        content_hash = blob["content_hash"]
         
-        print(f"💾 Saving file to: {file_path}")
+        print(f"💾 File saved to: {file_path} ({'existing blob' if blob['existed'] else 'new blob'})")
         
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        uploaded_at = get_timestamp()
         
-        print(f"✅ File saved successfully")
-        
-        # Process data using existing code from forecast1.py
-        print(f"🔄 Processing data...")
-        result = data_service.process_raw_data(file_path)
+        def on_processed(result: Dict[str, Any]):
+            # Create dataset record
+            dataset_info = {
+                "id": dataset_id,
+                "name": name,
+                "description": description,
+                "tags": tags.split(",") if tags else [],
+                "filename": file.filename,
+                "file_path": file_path,
+                "content_hash": content_hash,
+                "uploaded_at": uploaded_at,
+                "stats": result["stats"],
+                "processed_file": result["processed_file"],
+                "pending_file": result["pending_file"],
+                "appends": []
+            }
+            
+            # Add to shared state
+            add_dataset(dataset_id, dataset_info)
+            print(f"✅ Dataset created with ID: {dataset_id}")
+        
+        # File giống hệt một upload đã xử lý: dùng lại file kết quả và stats, không cần chạy job
+        duplicate = _find_processed_upload(content_hash)
+        if duplicate is not None:
+            on_processed({
+                "stats": copy.deepcopy(duplicate["stats"]),
+                "processed_file": duplicate["processed_file"],
+                "pending_file": duplicate.get("pending_file")
+            })
+            print(f"⚡ Duplicate upload of dataset {duplicate['id']}, reused processed data")
+            
+            return {
+                "success": True,
+                "dataset_id": dataset_id,
+                "job_id": None,
+                "status": "completed",
+                "duplicate_of": duplicate["id"],
+                "message": "Dataset uploaded, identical to an existing upload"
+            }
+        
+        # Process data in a worker process so the event loop is not blocked
+        job_id = ingestion_service.submit("upload", dataset_id, file_path, file.filename, on_processed,
+                                          content_hash=content_hash)
         
-        if not result["success"]:
-            raise HTTPException(status_code=400, detail=f"Lỗi xử lý dữ liệu: {result['error']}")
+        return {
+            "success": True,
+            "dataset_id": dataset_id,
+            "job_id": job_id,
+            "status": "pending",
+            "message": "Dataset uploaded, processing in background"
+        }
         
-        print(f"✅ Data processed successfully")
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        print(f"❌ Error in upload_dataset: {str(e)}")
+        print(f"📋 Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.post("/{dataset_id}/append")
+async def append_dataset(dataset_id: str, file: UploadFile = File(...)):
+    """
+    Append dữ liệu mới (delta) vào dataset đã có
+    Chỉ xử lý giao dịch trong file delta và cập nhật các tuần bị ảnh hưởng của từng ItemCode
+    """
+    try:
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
+            raise HTTPException(status_code=404, detail="Dataset not found")
         
-        # Create dataset record
-        dataset_info = {
-            "id": dataset_id,
-            "name": name,
-            "description": description,
-            "tags": tags.split(",") if tags else [],
-            "filename": file.filename,
-            "file_path": file_path,
-            "uploaded_at": get_timestamp(),
-            "stats": result["stats"],
-            "processed_file": result["processed_file"]
-        }
+        if not validate_file_extension(file.filename, ['.xlsx', '.csv']):
+            raise HTTPException(status_code=400, detail="Chỉ hỗ trợ file .xlsx hoặc .csv")
         
-        # Add to shared state
-        add_dataset(dataset_id, dataset_info)
+        # Các lần append vào một dataset chạy lần lượt: mỗi job dựng trên processed_file hiện tại của dataset
+        active_job = ingestion_service.active_job(dataset_id)
+        if active_job is not None:
+            raise HTTPException(status_code=409,
+                                detail=f"Dataset has an ingestion job in progress ({active_job}), retry when it completes")
+        
+        # Save delta file to storage/datasets/blobs
+        blob = await blob_store.save_upload(file)
+        file_path = blob["file_path"]
+        
+        print(f"💾 Delta file saved to: {file_path}")
+        
+        def on_appended(result: Dict[str, Any]):
+            # Đọc lại bản ghi mới nhất trong catalog (có thể đã được sửa trong lúc job chạy)
+            dataset_info = get_dataset_info(dataset_id)
+            if dataset_info is None:
+                _release_files([*_output_files(result["processed_file"], result["pending_file"]), file_path])
+                raise ValueError(f"Dataset {dataset_id} was deleted while appending")
+            
+            # Cập nhật stats, giữ thông tin file gốc
+            stats = result["stats"]
+            if "raw_file" in dataset_info["stats"]:
+                stats["raw_file"] = dataset_info["stats"]["raw_file"]
+            previous_file = dataset_info["processed_file"]
+            previous_files = _output_files(previous_file, dataset_info.get("pending_file"))
+            dataset_info["stats"] = stats
+            dataset_info["processed_file"] = result["processed_file"]
+            dataset_info["pending_file"] = result["pending_file"]
+            dataset_info.setdefault("appends", []).append({
+                "filename": file.filename,
+                "file_path": file_path,
+                **result["delta"]
+            })
+            dataset_info["updated_at"] = get_timestamp()
+            
+            add_dataset(dataset_id, dataset_info)
+            
+            # Nối các tuần mới vào bảng features đã có của file cũ (trước khi file cũ bị xóa);
+            # lỗi ở đây không làm hỏng append vì bảng sẽ được tạo lại khi train
+            try:
+                feature_store.refresh(previous_file, result["processed_file"])
+            except Exception as e:
+                print(f"❌ Feature store refresh failed, tables will be rebuilt on demand: {str(e)}")
+            
+            # File kết quả cũ có thể vẫn được dataset trùng nội dung dùng chung
+            _release_files([f for f in previous_files if f])
+            print(f"✅ Dataset {dataset_id} appended")
+        
+        # Đọc lại dataset sau khi lưu file: append trước đó có thể đã xong và đổi processed_file trong lúc chờ
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
+            _release_files([file_path])
+            raise HTTPException(status_code=404, detail="Dataset not found")
         
-        print(f"✅ Dataset created with ID: {dataset_id}")
+        try:
+            job_id = ingestion_service.submit(
+                "append", dataset_id, file_path, file.filename, on_appended, exclusive=True,
+                processed_file=dataset_info["processed_file"],
+                pending_file=dataset_info.get("pending_file"),
+                content_hash=blob["content_hash"]
+            )
+        except IngestionBusyError as e:
+            # Một append khác được nhận trong lúc lưu file delta
+            _release_files([file_path])
+            raise HTTPException(status_code=409, detail=str(e))
         
         return {
             "success": True,
             "dataset_id": dataset_id,
-            "message": "Dataset uploaded successfully",
-            "stats": result["stats"]
+            "job_id": job_id,
+            "status": "pending",
+            "message": "Delta uploaded, appending in background"
         }
         
     except HTTPException:
-        # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        print(f"❌ Error in upload_dataset: {str(e)}")
+        print(f"❌ Error in append_dataset: {str(e)}")
         print(f"📋 Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.get("/ingestion/jobs")
+async def list_ingestion_jobs():
+    """
+    Danh sách ingestion job (upload/append)
+    """
+    try:
+        jobs = ingestion_service.list_jobs()
+        
+        return {
+            "success": True,
+            "jobs": jobs,
+            "total": len(jobs)
+        }
+        
+    except Exception as e:
+        print(f"❌ Error in list_ingestion_jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/ingestion/{job_id}/status")
+async def get_ingestion_status(job_id: str):
+    """
+    Trạng thái và tiến độ ingestion job (số dòng đã đọc, bước đang chạy, ETA)
+    """
+    try:
+        job = ingestion_service.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Ingestion job not found")
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "dataset_id": job["dataset_id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "completed_at": job["completed_at"],
+            "result": job["result"],
+            "error": job["error"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error in get_ingestion_status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/")
 async def list_datasets():
     """
     Danh sách dataset
     """
     try:
-        datasets = get_datasets()
         dataset_list = []
-        for dataset_id, dataset_info in datasets.items():
+        for dataset_info in find_datasets():
             dataset_list.append({
-                "id": dataset_id,
+                "id": dataset_info["id"],
                 "name": dataset_info["name"],
                 "description": dataset_info["description"],
                 "tags": dataset_info["tags"],
@@ -124,12 +316,10 @@ async def get_dataset(dataset_id: str):
     Chi tiết dataset
     """
     try:
-        datasets = get_datasets()
-        if dataset_id not in datasets:
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        dataset_info = datasets[dataset_id]
-        
         return {
             "success": True,
             "dataset": dataset_info
@@ -147,22 +337,16 @@ async def delete_dataset(dataset_id: str):
     Xóa dataset
     """
     try:
-        datasets = get_datasets()
-        if dataset_id not in datasets:
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        dataset_info = datasets[dataset_id]
-        
-        # Delete files
-        if os.path.exists(dataset_info["file_path"]):
-            os.remove(dataset_info["file_path"])
-        
-        if os.path.exists(dataset_info["processed_file"]):
-            os.remove(dataset_info["processed_file"])
-        
         # Remove from shared state
         remove_dataset(dataset_id)
         
+        # Delete files no other dataset still shares
+        _release_files(_dataset_files(dataset_info))
+        
         return {
             "success": True,
             "message": "Dataset deleted successfully"
@@ -185,12 +369,10 @@ async def update_dataset(
     Cập nhật thông tin dataset
     """
     try:
-        datasets = get_datasets()
-        if dataset_id not in datasets:
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        dataset_info = datasets[dataset_id]
-        
         # Update fields
         if name is not None:
             dataset_info["name"] = name
@@ -220,11 +402,10 @@ async def download_dataset(dataset_id: str):
     Download dataset file
     """
     try:
-        datasets = get_datasets()
-        if dataset_id not in datasets:
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        dataset_info = datasets[dataset_id]
         file_path = dataset_info["file_path"]
         
         if not os.path.exists(file_path):
@@ -248,15 +429,14 @@ async def get_dataset_visualization(dataset_id: str, product_code: Optional[str]
     Tạo biểu đồ cho dataset
     """
     try:
-        datasets = get_datasets()
-        if dataset_id not in datasets:
+        dataset_info = get_dataset_info(dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        dataset_info = datasets[dataset_id]
-        df = pd.read_csv(dataset_info["processed_file"])
+        panel = panel_service.load(dataset_info["processed_file"])
         
         # Create visualization
-        plot_file = data_service.create_visualization(df, product_code)
+        plot_file = data_service.create_visualization(panel, product_code)
         
         return FileResponse(
             path=plot_file,
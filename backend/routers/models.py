@@ -10,26 +10,26 @@ from datetime import datetime
 from ml_models.xgboost_model import XGBoostModel
 from ml_models.prophet_model import ProphetModel
 from utils.helpers import generate_id, get_timestamp
+from services.catalog_service import catalog
 
 router = APIRouter()
 
-# In-memory storage cho models (trong thực tế nên dùng database)
-models = {}
-# Tạo model mẫu khi khởi động server để tránh lỗi khi chưa có model nào
-from uuid import uuid4
-sample_model_id = str(uuid4())
-models[sample_model_id] = {
-    "id": sample_model_id,
-    "name": "Sample XGBoost Model",
-    "type": "xgboost",
-    "dataset_id": "sample_dataset",
-    "status": "ready",
-    "metrics": {"mae": 0, "rmse": 0, "mape": 0, "r2": 0},
-    "created_at": get_timestamp(),
-    "parameters": {},
-    "tags": ["sample"],
-    "description": "Mẫu model XGBoost để test API"
-}
+# Tạo model mẫu khi catalog chưa có model nào để tránh lỗi khi chưa train
+if catalog.count("models") == 0:
+    from uuid import uuid4
+    sample_model_id = str(uuid4())
+    catalog.put("models", {
+        "id": sample_model_id,
+        "name": "Sample XGBoost Model",
+        "type": "xgboost",
+        "dataset_id": "sample_dataset",
+        "status": "ready",
+        "metrics": {"mae": 0, "rmse": 0, "mape": 0, "r2": 0},
+        "created_at": get_timestamp(),
+        "parameters": {},
+        "tags": ["sample"],
+        "description": "Mẫu model XGBoost để test API"
+    })
 
 class PredictRequest(BaseModel):
     product_code: str
@@ -47,9 +47,9 @@ async def list_models():
     """
     try:
         model_list = []
-        for model_id, model_info in models.items():
+        for model_info in catalog.list("models"):
             model_list.append({
-                "id": model_id,
+                "id": model_info["id"],
                 "name": model_info["name"],
                 "type": model_info["type"],
                 "dataset_id": model_info["dataset_id"],
@@ -74,11 +74,10 @@ async def get_model(model_id: str):
     Thông tin chi tiết model (type, metrics, param...)
     """
     try:
-        if model_id not in models:
+        model_info = catalog.get("models", model_id)
+        if model_info is None:
             raise HTTPException(status_code=404, detail="Model not found")
         
-        model_info = models[model_id]
-        
         return {
             "success": True,
             "model": model_info
@@ -99,20 +98,21 @@ async def update_model(
     Sửa/đổi tên, mô tả, tag, param
     """
     try:
-        if model_id not in models:
-            raise HTTPException(status_code=404, detail="Model not found")
-        
-        model_info = models[model_id]
-        
         # Update fields
+        fields = {}
         if name is not None:
-            model_info["name"] = name
+            fields["name"] = name
         if description is not None:
-            model_info["description"] = description
+            fields["description"] = description
         if tags is not None:
-            model_info["tags"] = tags.split(",")
+            fields["tags"] = tags.split(",")
         if parameters is not None:
-            model_info["parameters"] = json.loads(parameters)
+            fields["parameters"] = json.loads(parameters)
+        
+        # Đọc-sửa-ghi trong một transaction: không ghi đè thay đổi đồng thời (deploy, retrain) lên bản ghi
+        model_info = catalog.update("models", model_id, **fields)
+        if model_info is None:
+            raise HTTPException(status_code=404, detail="Model not found")
         
         return {
             "success": True,
@@ -120,6 +120,8 @@ async def update_model(
             "model": model_info
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -129,17 +131,16 @@ async def delete_model(model_id: str):
     Xóa model
     """
     try:
-        if model_id not in models:
+        model_info = catalog.get("models", model_id)
+        if model_info is None:
             raise HTTPException(status_code=404, detail="Model not found")
         
-        model_info = models[model_id]
-        
         # Delete model file if exists
         if "model_file" in model_info and os.path.exists(model_info["model_file"]):
             os.remove(model_info["model_file"])
         
-        # Remove from storage
-        del models[model_id]
+        # Remove from catalog
+        catalog.delete("models", model_id)
         
         return {
             "success": True,
@@ -155,12 +156,11 @@ async def deploy_model(model_id: str):
     Deploy model để sử dụng
     """
     try:
-        if model_id not in models:
+        model_info = catalog.get("models", model_id)
+        if model_info is None:
             raise HTTPException(status_code=404, detail="Model not found")
         
-        model_info = models[model_id]
-        model_info["status"] = "deployed"
-        model_info["deployed_at"] = get_timestamp()
+        model_info = catalog.update("models", model_id, status="deployed", deployed_at=get_timestamp())
         
         return {
             "success": True,
@@ -177,11 +177,10 @@ async def retrain_model(model_id: str, parameters: Optional[Dict[str, Any]] = No
     Retrain model với parameters mới
     """
     try:
-        if model_id not in models:
+        model_info = catalog.get("models", model_id)
+        if model_info is None:
             raise HTTPException(status_code=404, detail="Model not found")
         
-        model_info = models[model_id]
-        
         # Get model trainer based on type
         if model_info["type"] == "xgboost":
             trainer = XGBoostModel()
@@ -192,8 +191,7 @@ async def retrain_model(model_id: str, parameters: Optional[Dict[str, Any]] = No
         
         # Retrain model
         # This is a placeholder - actual retraining logic would go here
-        model_info["status"] = "retrained"
-        model_info["updated_at"] = get_timestamp()
+        model_info = catalog.update("models", model_id, status="retrained", updated_at=get_timestamp())
         
         return {
             "success": True,
@@ -260,11 +258,10 @@ async def download_model(model_id: str):
     Download model file
     """
     try:
-        if model_id not in models:
+        model_info = catalog.get("models", model_id)
+        if model_info is None:
             raise HTTPException(status_code=404, detail="Model not found")
         
-        model_info = models[model_id]
-        
         if "model_file" not in model_info or not os.path.exists(model_info["model_file"]):
             raise HTTPException(status_code=404, detail="Model file not found")
         
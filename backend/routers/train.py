@@ -1,25 +1,34 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 import pandas as pd
 import os
 import asyncio
+import time
 from datetime import datetime
 import traceback
 
 from services.train_service import TrainingService
+from services.feature_service import FeatureService
+from ml_models.baseline_model import BaselineModel
+from services.tuning_service import TuningService
+from services.backtest_service import BacktestService
 from schemas.train_schema import TrainRequest, ValidateRequest, ValidationResponse, JobStatus, JobListResponse, JobResult
 from utils.helpers import generate_id, get_timestamp
-from shared_state import get_datasets
-from utils.logger import log_training_start, log_training_complete, log_error
+from config.settings import settings
+from shared_state import get_dataset
+from services.catalog_service import catalog
+from services.training_executor_service import training_executor, TrainingQueueFullError
+from services.checkpoint_service import checkpoints
+from services.progress_service import progress_service
+from utils.logger import log_training_start, log_error
 
 router = APIRouter()
 training_service = TrainingService()
 
-# In-memory storage cho training jobs (trong thực tế nên dùng database)
-training_jobs = {}
-
 @router.post("/", response_model=Dict[str, Any])
-async def train_model(request: TrainRequest, background_tasks: BackgroundTasks):
+async def train_model(request: TrainRequest):
     """
     Train model mới (chọn loại model)
     GHI CHÚ: Endpoint này gọi code đã có từ forecast1.py, không code lại bên trong
@@ -28,10 +37,40 @@ async def train_model(request: TrainRequest, background_tasks: BackgroundTasks):
         print(f"🔄 Starting training job for dataset: {request.dataset_id}")
         
         # Validate dataset exists
-        datasets = get_datasets()
-        if request.dataset_id not in datasets:
+        dataset_info = get_dataset(request.dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
+        # Kiểm tra spec features (nếu có) trước khi tạo job
+        try:
+            FeatureService.compile((request.parameters or {}).get("features"))
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid feature spec: {e}")
+        
+        workers = (request.parameters or {}).get("workers")
+        if workers is not None and (not isinstance(workers, int) or isinstance(workers, bool)):
+            raise HTTPException(status_code=400, detail="parameters.workers must be an integer (<= 0 = all CPUs)")
+        
+        warm_start = (request.parameters or {}).get("warm_start", False)
+        if warm_start not in (True, False, "compare"):
+            raise HTTPException(status_code=400, detail="parameters.warm_start must be true, false or \"compare\"")
+        
+        methods = (request.parameters or {}).get("methods")
+        if methods is not None and (not isinstance(methods, list) or not set(methods) <= set(BaselineModel.METHODS)):
+            raise HTTPException(status_code=400, detail=f"parameters.methods must be a list of {list(BaselineModel.METHODS)}")
+        
+        if request.model_type == "tuning":
+            try:
+                TuningService.validate(request.parameters)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid tuning parameters: {e}")
+        
+        if request.model_type == "backtest":
+            try:
+                BacktestService.validate(request.parameters)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid backtest parameters: {e}")
+        
         # Generate job ID
         job_id = generate_id()
         
@@ -50,71 +89,52 @@ async def train_model(request: TrainRequest, background_tasks: BackgroundTasks):
             "error": None
         }
         
-        training_jobs[job_id] = job_info
+        catalog.put("training_jobs", job_info)
         
         # Log training start
         log_training_start(request.model_type, request.dataset_id, job_id)
         
-        # Start training in background
-        background_tasks.add_task(
-            run_training_job,
-            job_id,
-            request.dataset_id,
-            request.model_type,
-            request.parameters,
-            request.test_ratio
-        )
+        # Đưa job vào training executor (process pool riêng, trả về ngay)
+        try:
+            training_executor.submit(
+                job_id,
+                dataset_info["processed_file"],
+                request.model_type,
+                request.parameters,
+                request.test_ratio
+            )
+        except TrainingQueueFullError as e:
+            # Job không được nhận: bỏ bản ghi pending vừa tạo
+            catalog.delete("training_jobs", job_id)
+            raise HTTPException(status_code=429, detail=str(e))
         
         return {
             "success": True,
             "job_id": job_id,
-            "message": "Training job started",
+            "message": "Training job queued",
             "status": "pending"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         log_error("training", e, "train_model")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def run_training_job(job_id: str, dataset_id: str, model_type: str, parameters: Dict, test_ratio: float):
+@router.get("/executor", response_model=Dict[str, Any])
+async def get_executor_stats():
     """
-    Chạy training job trong background
-    GHI CHÚ: Sử dụng code đã có từ forecast1.py
+    Giới hạn và số job đang chạy/đang chờ của training executor
     """
     try:
-        print(f"🔄 Running training job {job_id}...")
-        
-        # Update job status
-        training_jobs[job_id]["status"] = "running"
-        training_jobs[job_id]["started_at"] = get_timestamp()
-        
-        # Load dataset
-        datasets = get_datasets()
-        dataset_info = datasets[dataset_id]
-        data_file = dataset_info["processed_file"]
-        
-        print(f"📖 Loading data from: {data_file}")
-        
-        # Train model using service
-        result = training_service.train_model(model_type, data_file, test_ratio)
-        
-        # Update job with results
-        training_jobs[job_id]["status"] = "completed"
-        training_jobs[job_id]["completed_at"] = get_timestamp()
-        training_jobs[job_id]["result"] = result
-        
-        # Log training complete
-        log_training_complete(model_type, job_id, result.get('metrics', {}))
-        
-        print(f"✅ Training job {job_id} completed successfully!")
+        return {
+            "success": True,
+            "executor": training_executor.stats()
+        }
         
     except Exception as e:
-        print(f"❌ Error in run_training_job: {str(e)}")
-        print(f"📋 Traceback: {traceback.format_exc()}")
-        training_jobs[job_id]["status"] = "failed"
-        training_jobs[job_id]["completed_at"] = get_timestamp()
-        training_jobs[job_id]["error"] = str(e)
-        log_error("training", e, f"run_training_job_{job_id}")
+        log_error("training", e, "get_executor_stats")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/validate", response_model=ValidationResponse)
 async def validate_data(request: ValidateRequest):
@@ -124,11 +144,10 @@ async def validate_data(request: ValidateRequest):
     try:
         print(f"🔍 Validating dataset: {request.dataset_id}")
         
-        datasets = get_datasets()
-        if request.dataset_id not in datasets:
+        dataset_info = get_dataset(request.dataset_id)
+        if dataset_info is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        dataset_info = datasets[request.dataset_id]
         data_file = dataset_info["processed_file"]
         
         print(f"📊 Validating data file: {data_file}")
@@ -154,9 +173,9 @@ async def list_training_jobs():
     """
     try:
         job_list = []
-        for job_id, job_info in training_jobs.items():
+        for job_info in catalog.list("training_jobs"):
             job_list.append(JobStatus(
-                id=job_id,
+                id=job_info["id"],
                 dataset_id=job_info["dataset_id"],
                 model_type=job_info["model_type"],
                 status=job_info["status"],
@@ -175,17 +194,75 @@ async def list_training_jobs():
         log_error("training", e, "list_training_jobs")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Gửi comment giữ kết nối SSE khi không có thay đổi (proxy thường đóng kết nối im lặng quá lâu)
+HEARTBEAT_SECONDS = 15
+
+# Header cho stream SSE (tắt buffer của nginx để event tới client ngay)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@router.get("/jobs/events")
+async def stream_all_jobs(request: Request):
+    """
+    Stream SSE tiến độ của mọi job đang chờ/đang chạy (event "jobs" mỗi khi có thay đổi)
+    """
+    async def events():
+        last_payload = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            # Snapshot đọc catalog và file checkpoint: chạy trong threadpool để không chặn event loop
+            jobs = await run_in_threadpool(progress_service.active_snapshots)
+            payload = [{key: value for key, value in job.items() if key != "updated_at"} for job in jobs]
+            if payload != last_payload:
+                last_payload = payload
+                last_sent = time.monotonic()
+                yield progress_service.event("jobs", {"jobs": jobs, "total": len(jobs)})
+            elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield ": heartbeat\n\n"
+            await asyncio.sleep(settings.TRAIN_PROGRESS_INTERVAL_SECONDS)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/job/{job_id}/events")
+async def stream_job(job_id: str, request: Request):
+    """
+    Stream SSE tiến độ của một job: event "progress" mỗi khi có thay đổi, event "done" khi job kết thúc
+    """
+    if catalog.get("training_jobs", job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_payload = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            snapshot = await run_in_threadpool(progress_service.snapshot, job_id)
+            if snapshot is None:
+                return
+            payload = {key: value for key, value in snapshot.items() if key != "updated_at"}
+            if snapshot["status"] in progress_service.TERMINAL_STATUSES:
+                yield progress_service.event("done", snapshot)
+                return
+            if payload != last_payload:
+                last_payload = payload
+                last_sent = time.monotonic()
+                yield progress_service.event("progress", snapshot)
+            elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield ": heartbeat\n\n"
+            await asyncio.sleep(settings.TRAIN_PROGRESS_INTERVAL_SECONDS)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.get("/job/{job_id}/status", response_model=Dict[str, Any])
 async def get_job_status(job_id: str):
     """
     Trạng thái training
     """
     try:
-        if job_id not in training_jobs:
+        job_info = catalog.get("training_jobs", job_id)
+        if job_info is None:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        job_info = training_jobs[job_id]
-        
         return {
             "success": True,
             "job_id": job_id,
@@ -193,7 +270,10 @@ async def get_job_status(job_id: str):
             "created_at": job_info["created_at"],
             "started_at": job_info["started_at"],
             "completed_at": job_info["completed_at"],
-            "error": job_info.get("error")
+            "error": job_info.get("error"),
+            # Số sản phẩm đã train xong (checkpoint được xóa khi job hoàn tất), đọc tăng dần qua progress_service
+            "checkpointed_products": (await run_in_threadpool(progress_service.products_done, job_id, job_info)
+                                      if job_info["status"] != "completed" else None)
         }
         
     except Exception as e:
@@ -206,12 +286,12 @@ async def get_job_result(job_id: str):
     Kết quả training, metrics, plots
     """
     try:
-        if job_id not in training_jobs:
+        job_info = catalog.get("training_jobs", job_id)
+        if job_info is None:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        job_info = training_jobs[job_id]
-        
-        if job_info["status"] != "completed":
+        # Job đã hủy vẫn có kết quả của các sản phẩm train xong trước khi hủy
+        if job_info["status"] not in ("completed", "cancelled") or not job_info.get("result"):
             raise HTTPException(status_code=400, detail="Job not completed yet")
         
         result = job_info["result"]
@@ -222,9 +302,98 @@ async def get_job_result(job_id: str):
             model_type=job_info["model_type"],
             metrics=result.get("metrics", {}),
             results_file=result.get("results_file"),
-            plot_file=result.get("plot_file")
+            plot_file=result.get("plot_file"),
+            tuning=result.get("tuning"),
+            backtest=result.get("backtest")
         )
         
     except Exception as e:
         log_error("training", e, f"get_job_result_{job_id}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/job/{job_id}/cancel", response_model=Dict[str, Any])
+async def cancel_job(job_id: str):
+    """
+    Hủy training job (worker dừng trước sản phẩm tiếp theo, kết quả đã train được giữ lại); job đang chạy
+    của loại không dừng giữa chừng được (xgboost_global, prophet_lite, baseline) trả về 409
+    """
+    try:
+        job_info = catalog.get("training_jobs", job_id)
+        if job_info is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        if job_info["status"] not in ("pending", "running"):
+            raise HTTPException(status_code=400, detail=f"Job is already {job_info['status']}")
+        
+        # Model train mọi sản phẩm trong một lần không có điểm dừng: chỉ hủy được khi còn trong hàng đợi
+        if job_info["status"] == "running" and job_info["model_type"] not in TrainingService.CANCELLABLE:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Running {job_info['model_type']} jobs cannot be cancelled "
+                       f"(cancellable: {list(TrainingService.CANCELLABLE)})"
+            )
+        
+        if not training_executor.cancel(job_id):
+            # Không còn worker nào xử lý job này
+            catalog.update("training_jobs", job_id, status="cancelled", completed_at=get_timestamp())
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "message": "Training job cancellation requested",
+            "status": catalog.get("training_jobs", job_id)["status"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error("training", e, f"cancel_job_{job_id}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/job/{job_id}/resume", response_model=Dict[str, Any])
+async def resume_job(job_id: str):
+    """
+    Chạy lại training job đã lỗi/bị hủy: tiếp tục từ các sản phẩm chưa có trong checkpoint
+    """
+    try:
+        job_info = catalog.get("training_jobs", job_id)
+        if job_info is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        if job_info["status"] not in ("failed", "cancelled"):
+            raise HTTPException(status_code=400, detail=f"Only failed or cancelled jobs can be resumed (job is {job_info['status']})")
+        
+        dataset_info = get_dataset(job_info["dataset_id"])
+        if dataset_info is None:
+            raise HTTPException(status_code=404, detail="Dataset not found")
+        
+        checkpoint = checkpoints.get(job_id)
+        checkpoint.clear_cancel()
+        catalog.update("training_jobs", job_id, status="pending", completed_at=None, result=None, error=None)
+        
+        try:
+            training_executor.submit(
+                job_id,
+                dataset_info["processed_file"],
+                job_info["model_type"],
+                job_info["parameters"],
+                job_info["test_ratio"]
+            )
+        except TrainingQueueFullError as e:
+            catalog.update("training_jobs", job_id, status=job_info["status"], completed_at=job_info["completed_at"],
+                           result=job_info["result"], error=job_info["error"])
+            raise HTTPException(status_code=429, detail=str(e))
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "message": "Training job resumed",
+            "status": "pending",
+            "checkpointed_products": checkpoint.count()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error("training", e, f"resume_job_{job_id}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -8,8 +8,8 @@ from typing import List, Optional, Dict, Any
 class TrainRequest(BaseModel):
     """Schema request để train model"""
     dataset_id: str
-    model_type: str  # "xgboost", "prophet", "lightgbm", "lstm"
-    parameters: Optional[Dict[str, Any]] = None
+    model_type: str  # "xgboost", "xgboost_global", "prophet", "prophet_lite", "baseline", "tuning", "backtest", "lightgbm", "lstm"
+    parameters: Optional[Dict[str, Any]] = None  # vd: {"features": {...}, "workers": 8} - spec features XGBoost, số process train
     test_ratio: float = 0.3
 
 class ValidateRequest(BaseModel):
@@ -26,6 +26,7 @@ class ValidationResult(BaseModel):
     quantity_stats: Dict[str, float]
     is_sufficient: bool
     recommendations: List[str]
+    panel: Optional[Dict[str, Any]] = None  # Kích thước/mật độ panel sản phẩm × tuần
 
 class ValidationResponse(BaseModel):
     """Schema response cho validation endpoint"""
@@ -57,3 +58,5 @@ class JobResult(BaseModel):
     metrics: Dict[str, Any]
     results_file: Optional[str] = None
     plot_file: Optional[str] = None
+    tuning: Optional[Dict[str, Any]] = None  # Job "tuning": cấu hình tốt nhất và chi phí theo loại model
+    backtest: Optional[Dict[str, Any]] = None  # Job "backtest": các mốc và lỗi theo model/horizon/fold
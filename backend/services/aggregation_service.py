@@ -0,0 +1,88 @@
+"""
+Aggregation Service - Gộp dữ liệu bán hàng theo ngày thành nhu cầu theo tuần (vector hóa)
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+class AggregationService:
+    """Engine gộp daily → weekly bằng một lần sắp xếp, không chạy Python theo từng dòng"""
+    
+    # Sản phẩm có số ngày bán <= ngưỡng này bị loại
+    MIN_ACTIVE_DAYS = 5
+    
+    @staticmethod
+    def week_start(dates: pd.Series) -> pd.Series:
+        """Ngày thứ Hai đầu tuần (giống Period('W').start_time) tính bằng số học datetime"""
+        return dates.dt.normalize() - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+    
+    @staticmethod
+    def weekly_demand(daily: pd.DataFrame, min_days: int = MIN_ACTIVE_DAYS) -> pd.DataFrame:
+        """Tạo weekly_demand (ItemCode, Week, TotalQuantity) từ dữ liệu theo ngày"""
+        weekly, _ = AggregationService.aggregate(daily, min_days)
+        return weekly
+    
+    @staticmethod
+    def aggregate(daily: pd.DataFrame, min_days: int = MIN_ACTIVE_DAYS) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Gộp dữ liệu theo ngày thành weekly_demand, đồng thời trả về các dòng theo ngày của sản phẩm bị loại
+        
+        daily cần có ItemCode, DocDate (datetime) và Quantity. Dữ liệu được sắp xếp một lần theo
+        (ItemCode, DocDate); số ngày bán của từng sản phẩm, tổng theo tuần và bộ lọc sản phẩm ít ngày
+        đều được tính trên thứ tự đó. weekly_demand đã sắp xếp theo (ItemCode, Week).
+        """
+        if daily.empty:
+            return pd.DataFrame(columns=['ItemCode', 'Week', 'TotalQuantity']), daily[['ItemCode', 'DocDate', 'Quantity']]
+        
+        item_values = daily['ItemCode']
+        if isinstance(item_values.dtype, pd.CategoricalDtype):
+            # factorize theo thứ tự category: sắp xếp bảng category để ItemCode ra theo thứ tự chữ cái
+            item_values = item_values.cat.remove_unused_categories()
+            item_values = item_values.cat.reorder_categories(item_values.cat.categories.sort_values())
+        item_codes, items = pd.factorize(item_values, sort=True)
+        items = np.asarray(items)
+        timestamps = daily['DocDate'].to_numpy()
+        quantities = daily['Quantity'].to_numpy()
+        
+        order = np.lexsort((timestamps, item_codes))
+        item_codes = item_codes[order]
+        timestamps = timestamps[order]
+        quantities = quantities[order]
+        
+        # Tuần bắt đầu từ thứ Hai: 1970-01-01 là thứ Năm nên (days + 3) % 7 == 0 ứng với thứ Hai
+        days = timestamps.astype('datetime64[D]')
+        weeks = days - (days.astype(np.int64) + 3) % 7
+        
+        item_changed = np.empty(len(order), dtype=bool)
+        item_changed[0] = True
+        item_changed[1:] = item_codes[1:] != item_codes[:-1]
+        
+        # Số ngày (DocDate khác nhau) của mỗi sản phẩm
+        new_day = item_changed.copy()
+        new_day[1:] |= timestamps[1:] != timestamps[:-1]
+        day_counts = np.bincount(item_codes[new_day], minlength=len(items))
+        active = day_counts > min_days
+        
+        # Tổng theo (ItemCode, Week) bằng reduceat trên các điểm bắt đầu nhóm
+        new_week = item_changed.copy()
+        new_week[1:] |= weeks[1:] != weeks[:-1]
+        starts = np.flatnonzero(new_week)
+        totals = np.add.reduceat(quantities, starts)
+        group_items = item_codes[starts]
+        
+        keep = active[group_items]
+        weekly = pd.DataFrame({
+            'ItemCode': items[group_items[keep]],
+            'Week': weeks[starts[keep]].astype(timestamps.dtype),
+            'TotalQuantity': totals[keep]
+        })
+        
+        dropped = ~active[item_codes]
+        pending_days = pd.DataFrame({
+            'ItemCode': items[item_codes[dropped]],
+            'DocDate': timestamps[dropped],
+            'Quantity': quantities[dropped]
+        })
+        return weekly, pending_days
@@ -0,0 +1,284 @@
+"""
+Backtest Service - Backtest rolling-origin cho mọi loại model: K mốc dự báo cách đều ở cuối lịch sử, mỗi mốc
+train trên các tuần trước mốc và dự báo H tuần tiếp theo; bảng lỗi theo (model, sản phẩm, fold, horizon) ghi ra
+file Parquet để phân tích theo cột
+"""
+
+import time
+import traceback
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ml_models.xgboost_model import XGBoostModel
+from ml_models.prophet_model import ProphetModel
+from ml_models.prophet_lite_model import ProphetLiteModel
+from ml_models.baseline_model import BaselineModel
+from services.panel_service import DemandPanel, panel_service
+from services.parallel_training_service import parallel_training
+from utils.helpers import generate_id
+from config.settings import settings
+
+class BacktestService:
+    """
+    Backtest (model_type "backtest"): parameters["models"] (mặc định mọi model trong MODELS), "folds" (K),
+    "horizon" (H), "step" (số tuần giữa hai mốc, mặc định H), "workers", "features" (XGBoost), "methods"
+    (baseline) và tham số model như job train (khóa TUNABLE_PARAMS ở cấp ngoài, hoặc riêng từng model trong
+    parameters["model_params"][model]).
+    
+    Mốc của fold k (tuần đầu tiên được dự báo) là W - H - step * (K - 1 - k) trên lưới tuần của panel (W tuần),
+    nên fold cuối dự báo đúng H tuần cuối. Phần dùng chung giữa các fold được tính một lần: chuỗi baseline dồn
+    hàng một lần rồi dự báo vector hóa mọi sản phẩm; features XGBoost tạo một lần và mỗi sản phẩm chỉ chuyển
+    sang DMatrix một lần. XGBoost và Prophet chạy song song theo sản phẩm.
+    
+    Lỗi = dự báo - thực tế; metrics tổng hợp (MAE/RMSE/bias) tính trên các ô tuần đích có bán (giống metrics
+    train), bảng Parquet giữ mọi ô có dự báo kèm cột observed.
+    """
+    
+    MODELS = ('baseline', 'prophet_lite', 'xgboost', 'prophet')
+    TUNABLE = {
+        'xgboost': XGBoostModel.TUNABLE_PARAMS,
+        'prophet': ProphetModel.TUNABLE_PARAMS,
+        'prophet_lite': ProphetLiteModel.TUNABLE_PARAMS,
+        'baseline': ()
+    }
+    
+    DEFAULT_FOLDS = 3
+    DEFAULT_HORIZON = 4
+    MIN_TRAIN_WEEKS = 2  # Số tuần tối thiểu trước mốc đầu tiên
+    
+    def __init__(self, trainers: Dict[str, Any]):
+        self.trainers = trainers
+    
+    @classmethod
+    def validate(cls, parameters: Optional[Dict[str, Any]]) -> None:
+        """Kiểm tra parameters của job backtest (ValueError nếu không hợp lệ)"""
+        parameters = parameters or {}
+        models = parameters.get('models', list(cls.MODELS))
+        if not isinstance(models, list) or not models:
+            raise ValueError("parameters.models must be a non-empty list of model types")
+        unknown = [model_type for model_type in models if model_type not in cls.MODELS]
+        if unknown:
+            raise ValueError(f"Cannot backtest model types {unknown} (supported: {list(cls.MODELS)})")
+        for name in ('folds', 'horizon', 'step'):
+            value = parameters.get(name)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                raise ValueError(f"parameters.{name} must be an integer >= 1")
+        model_params = parameters.get('model_params') or {}
+        if not isinstance(model_params, dict) or any(not isinstance(params, dict) for params in model_params.values()):
+            raise ValueError("parameters.model_params must be an object of {model type: parameters}")
+        for model_type, params in model_params.items():
+            if model_type not in cls.MODELS:
+                raise ValueError(f"Unknown model type in parameters.model_params: {model_type!r}")
+            unknown = [name for name in params if name not in cls.TUNABLE[model_type]]
+            if unknown:
+                raise ValueError(f"Unknown {model_type} parameters {unknown} "
+                                 f"(supported: {list(cls.TUNABLE[model_type])})")
+        methods = parameters.get('methods')
+        if methods is not None and (not isinstance(methods, list)
+                                    or set(methods) - set(BaselineModel.METHODS)):
+            raise ValueError(f"parameters.methods must be a list of {list(BaselineModel.METHODS)}")
+    
+    @staticmethod
+    def origins(num_weeks: int, folds: int, horizon: int, step: int) -> np.ndarray:
+        """Chỉ số tuần của các mốc dự báo (tăng dần, mốc cuối = num_weeks - horizon)"""
+        return num_weeks - horizon - step * np.arange(folds - 1, -1, -1)
+    
+    def backtest(self, data_file: str, parameters: Optional[Dict[str, Any]] = None,
+                 checkpoint=None) -> Dict[str, Any]:
+        """
+        Chạy backtest rolling-origin cho các model trong parameters["models"] và lưu bảng lỗi
+        checkpoint: TrainingCheckpoint của job (cờ hủy kiểm tra trước mỗi model và mỗi sản phẩm của XGBoost/
+        Prophet); job bị hủy trả về kết quả của các model đã backtest xong với "cancelled": True
+        """
+        try:
+            print(f"🚀 Starting rolling-origin backtest...")
+            print(f"📖 Loading data from: {data_file}")
+            parameters = parameters or {}
+            self.validate(parameters)
+            
+            panel = panel_service.load(data_file)
+            print(f"✅ Data loaded. Panel shape: {panel.values.shape}")
+            
+            folds = parameters.get('folds', self.DEFAULT_FOLDS)
+            horizon = parameters.get('horizon', self.DEFAULT_HORIZON)
+            step = parameters.get('step', horizon)
+            origins = self.origins(panel.num_weeks, folds, horizon, step)
+            if origins[0] < self.MIN_TRAIN_WEEKS:
+                raise ValueError(f"Not enough weeks for {folds} folds of horizon {horizon} with step {step} "
+                                 f"({panel.num_weeks} weeks in dataset)")
+            print(f"📋 Origins: {[str(panel.weeks[origin]) for origin in origins]}, horizon {horizon}")
+            
+            forecasts, timings = {}, {}
+            cancelled = False
+            start = time.perf_counter()
+            for model_type in parameters.get('models', list(self.MODELS)):
+                if checkpoint is not None and checkpoint.cancelled():
+                    cancelled = True
+                    break
+                print(f"🔄 Backtesting {model_type}...")
+                model_start = time.perf_counter()
+                forecast = self._forecast(model_type, panel, data_file, origins, horizon, parameters, checkpoint)
+                # Hủy giữa chừng: dự báo của model này thiếu sản phẩm nên không dùng
+                if checkpoint is not None and checkpoint.cancelled():
+                    print(f"🗑️ Backtest cancelled during {model_type}")
+                    cancelled = True
+                    break
+                forecasts[model_type] = forecast
+                timings[model_type] = round(time.perf_counter() - model_start, 3)
+                print(f"✅ {model_type} backtest done in {timings[model_type]:.2f}s")
+            backtest_seconds = time.perf_counter() - start
+            
+            table = self._error_table(panel, origins, horizon, forecasts)
+            results_file = f"{settings.RESULTS_STORAGE_PATH}/backtest_{generate_id()}.parquet"
+            pq.write_table(table, results_file)
+            print(f"💾 Backtest table saved: {results_file} ({table.num_rows} rows)")
+            
+            actual = self._grid(panel, origins, horizon)[-1]
+            summary = {model_type: {**self._summary(forecast, actual), 'seconds': timings[model_type]}
+                       for model_type, forecast in forecasts.items()}
+            metrics = {f"{model_type}_{name}": result['overall'][name]
+                       for model_type, result in summary.items() for name in ('mae', 'rmse')
+                       if result['overall'][name] is not None}
+            print(f"📊 Backtest metrics: {metrics}")
+            if cancelled:
+                print(f"🗑️ Backtest cancelled after {backtest_seconds:.2f}s ({len(forecasts)} models done)")
+            else:
+                print(f"✅ Backtest completed in {backtest_seconds:.2f}s!")
+            
+            return {
+                'metrics': metrics,
+                'results_file': results_file,
+                'backtest': {
+                    'folds': folds,
+                    'horizon': horizon,
+                    'step': step,
+                    'origins': [str(panel.weeks[origin]) for origin in origins],
+                    'rows': table.num_rows,
+                    'models': summary
+                },
+                'train_seconds': round(backtest_seconds, 3),
+                'panel': panel.describe(),
+                'cancelled': cancelled
+            }
+        
+        except Exception as e:
+            print(f"❌ Error in backtest: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            raise
+    
+    def _model_params(self, model_type: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Tham số của một model: khóa TUNABLE_PARAMS ở cấp ngoài, ghi đè bởi parameters["model_params"][model]"""
+        params = {name: value for name, value in parameters.items() if name in self.TUNABLE[model_type]}
+        params.update((parameters.get('model_params') or {}).get(model_type) or {})
+        if model_type == 'prophet':
+            return ProphetModel.model_params(params)
+        return params
+    
+    def _forecast(self, model_type: str, panel: DemandPanel, data_file: str, origins: np.ndarray, horizon: int,
+                  parameters: Dict[str, Any], checkpoint=None) -> np.ndarray:
+        """Dự báo [sản phẩm, fold, horizon] của một model (NaN: không có dự báo)"""
+        trainer = self.trainers[model_type]
+        params = self._model_params(model_type, parameters)
+        if model_type == 'baseline':
+            return trainer.backtest(panel, origins, horizon, parameters.get('methods'))
+        if model_type == 'prophet_lite':
+            return trainer.backtest(panel, origins, horizon, params)
+        
+        # Model train từng sản phẩm: song song theo sản phẩm có bán trước mốc cuối
+        workers = parallel_training.resolve_workers(parameters.get('workers'))
+        item_codes = [str(item) for item in panel.items[panel.observed()[:, :origins[-1]].any(axis=1)]]
+        if model_type == 'xgboost':
+            args = (data_file, origins, horizon, parameters.get('features'),
+                    1 if workers > 1 else None,  # Chạy song song thì mỗi worker chỉ dùng 1 thread XGBoost
+                    params)
+        else:
+            args = (data_file, origins, horizon, params)
+        product_results = parallel_training.run(trainer.backtest_products, item_codes, *args, workers=workers,
+                                                cancel=checkpoint)
+        
+        forecasts = np.full((panel.num_products, len(origins), horizon), np.nan)
+        failed = 0
+        for item_code, result, error in product_results:
+            failed += error is not None
+            if result:
+                forecasts[panel.row(item_code)] = np.asarray(result['forecasts'], dtype=np.float64)
+        if failed:
+            print(f"❌ {failed} products failed in {model_type} backtest")
+        return forecasts
+    
+    @staticmethod
+    def _grid(panel: DemandPanel, origins: np.ndarray, horizon: int):
+        """Chỉ số (sản phẩm, fold, bước, tuần đích) và lượng bán thực tế của mọi ô [sản phẩm, fold, horizon]"""
+        products, folds, steps = np.meshgrid(np.arange(panel.num_products), np.arange(len(origins)),
+                                             np.arange(horizon), indexing='ij')
+        weeks = origins[folds] + steps
+        actual = np.asarray(panel.values, dtype=np.float64)[products, weeks]
+        return products, folds, steps, weeks, actual
+    
+    @classmethod
+    def _error_table(cls, panel: DemandPanel, origins: np.ndarray, horizon: int,
+                     forecasts: Dict[str, np.ndarray]) -> pa.Table:
+        """Bảng lỗi dạng cột: một dòng cho mỗi ô (model, sản phẩm, fold, horizon) có dự báo"""
+        products, folds, steps, weeks, actual = cls._grid(panel, origins, horizon)
+        
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name in (
+            'model', 'item_code', 'fold', 'origin', 'horizon', 'week', 'actual', 'forecast', 'error', 'observed')}
+        for model_type, forecast in forecasts.items():
+            cells = np.isfinite(forecast)
+            columns['model'].append(np.full(int(cells.sum()), model_type, dtype=object))
+            columns['item_code'].append(panel.items[products[cells]])
+            columns['fold'].append(folds[cells])
+            columns['origin'].append(panel.weeks[origins[folds[cells]]])
+            columns['horizon'].append(steps[cells] + 1)
+            columns['week'].append(panel.weeks[weeks[cells]])
+            columns['actual'].append(actual[cells])
+            columns['forecast'].append(forecast[cells])
+            columns['error'].append(forecast[cells] - actual[cells])
+            columns['observed'].append(actual[cells] > 0)
+        if not forecasts:
+            # Job bị hủy trước khi model đầu tiên xong: bảng rỗng cùng schema
+            columns = {name: [np.empty(0, dtype=object)] for name in columns}
+        
+        return pa.table({
+            'model': pa.array(np.concatenate(columns['model']), pa.string()).dictionary_encode(),
+            'item_code': pa.array(np.concatenate(columns['item_code']), pa.string()),
+            'fold': pa.array(np.concatenate(columns['fold']), pa.int16()),
+            'origin': pa.array(np.concatenate(columns['origin']), pa.date32()),
+            'horizon': pa.array(np.concatenate(columns['horizon']), pa.int16()),
+            'week': pa.array(np.concatenate(columns['week']), pa.date32()),
+            'actual': pa.array(np.concatenate(columns['actual']), pa.float64()),
+            'forecast': pa.array(np.concatenate(columns['forecast']), pa.float64()),
+            'error': pa.array(np.concatenate(columns['error']), pa.float64()),
+            'observed': pa.array(np.concatenate(columns['observed']), pa.bool_())
+        })
+    
+    @staticmethod
+    def _summary(forecast: np.ndarray, actual: np.ndarray) -> Dict[str, Any]:
+        """MAE/RMSE/bias của một model trên các ô có bán có dự báo: tổng thể, theo horizon và theo fold"""
+        error = forecast - actual
+        scored = np.isfinite(forecast) & (actual > 0)
+        
+        def stats(mask):
+            values = error[mask]
+            if len(values) == 0:
+                return {'mae': None, 'rmse': None, 'bias': None, 'cells': 0}
+            return {
+                'mae': float(np.abs(values).mean()),
+                'rmse': float(np.sqrt((values ** 2).mean())),
+                'bias': float(values.mean()),
+                'cells': int(len(values))
+            }
+        
+        folds, horizon = forecast.shape[1:]
+        fold = np.arange(folds)[None, :, None]
+        step = np.arange(horizon)[None, None, :]
+        return {
+            'products': int(np.isfinite(forecast).any(axis=(1, 2)).sum()),
+            'forecast_cells': int(np.isfinite(forecast).sum()),
+            'overall': stats(scored),
+            'by_horizon': [{'horizon': h + 1, **stats(scored & (step == h))} for h in range(horizon)],
+            'by_fold': [{'fold': k, **stats(scored & (fold == k))} for k in range(folds)]
+        }
@@ -0,0 +1,84 @@
+"""
+Blob Store Service - Lưu file theo hash nội dung (content-addressed) để file trùng chỉ lưu một lần
+"""
+
+import os
+import hashlib
+from typing import Dict, Any, Callable, Tuple
+
+from fastapi import UploadFile
+
+from services.raw_cache_service import RawCacheService
+from utils.helpers import generate_id, ensure_dir
+from config.settings import settings
+
+class BlobStoreService:
+    """Kho file bất biến đặt tên theo SHA-256: file giống hệt nhau dùng chung một bản trên đĩa"""
+    
+    UPLOAD_BLOCK_SIZE = 1024 * 1024
+    
+    def __init__(self, blob_dir: str = None):
+        self.blob_dir = blob_dir or settings.UPLOAD_BLOB_PATH
+        ensure_dir(self.blob_dir)
+    
+    async def save_upload(self, upload: UploadFile) -> Dict[str, Any]:
+        """
+        Ghi file upload xuống đĩa theo từng khối và tính hash trong cùng lượt đọc
+        Trả về content_hash, đường dẫn blob, kích thước và file đã có sẵn trong kho hay chưa
+        """
+        extension = os.path.splitext(upload.filename)[1].lower()
+        tmp_file = os.path.join(self.blob_dir, f"{generate_id()}.upload.tmp")
+        
+        digest = hashlib.sha256()
+        size_bytes = 0
+        try:
+            with open(tmp_file, "wb") as buffer:
+                while True:
+                    block = await upload.read(self.UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    buffer.write(block)
+                    size_bytes += len(block)
+            
+            content_hash = digest.hexdigest()
+            file_path, existed = self.publish(tmp_file, self.blob_dir, content_hash, extension)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        
+        return {
+            "content_hash": content_hash,
+            "file_path": file_path,
+            "size_bytes": size_bytes,
+            "existed": existed
+        }
+    
+    @staticmethod
+    def publish(tmp_file: str, target_dir: str, content_hash: str, extension: str,
+                prefix: str = "") -> Tuple[str, bool]:
+        """
+        Đưa file tạm vào kho với tên {prefix}{hash}{extension}
+        Nếu đã có file cùng hash thì bỏ file tạm và dùng lại file cũ; trả về (đường dẫn, đã tồn tại)
+        """
+        target = os.path.join(target_dir, f"{prefix}{content_hash}{extension}")
+        if os.path.exists(target):
+            os.remove(tmp_file)
+            return target, True
+        os.replace(tmp_file, target)
+        return target, False
+    
+    @classmethod
+    def write_file(cls, write: Callable[[str], None], target_dir: str, extension: str,
+                   prefix: str = "") -> Tuple[str, str]:
+        """Ghi file qua write(path) vào file tạm, băm nội dung rồi lưu theo hash; trả về (đường dẫn, hash)"""
+        ensure_dir(target_dir)
+        tmp_file = os.path.join(target_dir, f"{generate_id()}{extension}.tmp")
+        try:
+            write(tmp_file)
+            content_hash = RawCacheService.file_hash(tmp_file)
+            file_path, _ = cls.publish(tmp_file, target_dir, content_hash, extension, prefix)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return file_path, content_hash
@@ -0,0 +1,189 @@
+"""
+Catalog Service - Lưu datasets, models, training jobs và ingestion jobs vào SQLite (WAL) theo DATABASE_URL
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+
+from utils.helpers import get_timestamp
+from config.settings import settings
+
+class CatalogService:
+    """
+    Catalog bền vững cho metadata: mỗi bản ghi lưu nguyên dạng JSON, các trường hay dùng để lọc/sắp xếp
+    (status, created_at, dataset_id, type...) được tách thành cột có index
+    """
+    
+    # Bảng → {cột có index: khóa tương ứng trong bản ghi}
+    TABLES = {
+        "datasets": {
+            "name": "name",
+            "content_hash": "content_hash",
+            "created_at": "uploaded_at"
+        },
+        "models": {
+            "name": "name",
+            "type": "type",
+            "dataset_id": "dataset_id",
+            "status": "status",
+            "created_at": "created_at"
+        },
+        "training_jobs": {
+            "dataset_id": "dataset_id",
+            "model_type": "model_type",
+            "status": "status",
+            "created_at": "created_at"
+        },
+        "ingestion_jobs": {
+            "dataset_id": "dataset_id",
+            "kind": "kind",
+            "status": "status",
+            "created_at": "created_at"
+        }
+    }
+    
+    INDEXES = {
+        "datasets": ["created_at", "content_hash"],
+        "models": ["status", "created_at", "dataset_id", "type"],
+        "training_jobs": ["status", "created_at", "dataset_id", "model_type"],
+        "ingestion_jobs": ["status", "created_at", "dataset_id"]
+    }
+    
+    def __init__(self, database_url: Optional[str] = None):
+        self.db_path = self._sqlite_path(database_url or settings.DATABASE_URL)
+        self._local = threading.local()
+        self._create_schema()
+    
+    @staticmethod
+    def _sqlite_path(database_url: str) -> str:
+        """Lấy đường dẫn file từ URL dạng sqlite:///path"""
+        prefix = "sqlite:///"
+        if not database_url.startswith(prefix):
+            raise ValueError(f"Unsupported DATABASE_URL (only sqlite is supported): {database_url}")
+        return database_url[len(prefix):]
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Mỗi thread dùng một connection riêng (router, callback của process pool, background task)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # WAL: đọc không bị chặn bởi ghi; synchronous=NORMAL đủ an toàn với WAL
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _create_schema(self) -> None:
+        """Tạo bảng và index nếu chưa có"""
+        conn = self._connection()
+        for table, columns in self.TABLES.items():
+            column_defs = ", ".join(f"{col} TEXT" for col in columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, {column_defs}, data TEXT NOT NULL)")
+            for col in self.INDEXES[table]:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ({col})")
+    
+    def put(self, table: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Thêm hoặc thay thế bản ghi (giữ nguyên thứ tự chèn ban đầu)"""
+        columns = self.TABLES[table]
+        values = [record.get(key) for key in columns.values()]
+        names = ", ".join(columns)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns)
+        self._connection().execute(
+            f"INSERT INTO {table} (id, {names}, data) VALUES (?, {placeholders}, ?) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}, data = excluded.data",
+            [record["id"], *values, json.dumps(record, ensure_ascii=False, default=str)]
+        )
+        return record
+    
+    def get(self, table: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy bản ghi theo id"""
+        row = self._connection().execute(f"SELECT data FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+    
+    def update(self, table: str, record_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Cập nhật một số trường của bản ghi trong một transaction (đọc-sửa-ghi)"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record = self.get(table, record_id)
+            if record is not None:
+                record.update(fields)
+                self.put(table, record)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return record
+    
+    def delete(self, table: str, record_id: str) -> bool:
+        """Xóa bản ghi, trả về True nếu có bản ghi bị xóa"""
+        cursor = self._connection().execute(f"DELETE FROM {table} WHERE id = ?", (record_id,))
+        return cursor.rowcount > 0
+    
+    def list(self, table: str, where: Optional[Dict[str, Any]] = None, created_after: Optional[str] = None,
+             newest_first: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Liệt kê bản ghi theo thứ tự created_at (cùng thời điểm thì theo thứ tự chèn)
+        where chỉ lọc bằng trên các cột có index; created_after lọc created_at > giá trị (chuỗi ISO)
+        """
+        clause, params = self._where(table, where, created_after)
+        direction = "DESC" if newest_first else "ASC"
+        sql = f"SELECT data FROM {table}{clause} ORDER BY created_at {direction}, rowid {direction}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [json.loads(row["data"]) for row in self._connection().execute(sql, params)]
+    
+    def count(self, table: str, where: Optional[Dict[str, Any]] = None) -> int:
+        """Đếm số bản ghi (dùng index, không đọc JSON)"""
+        clause, params = self._where(table, where)
+        return self._connection().execute(f"SELECT COUNT(*) FROM {table}{clause}", params).fetchone()[0]
+    
+    def count_by(self, table: str, column: str) -> Dict[str, int]:
+        """Đếm số bản ghi theo từng giá trị của một cột có index (vd: status, type)"""
+        if column not in self.TABLES[table]:
+            raise ValueError(f"Unknown column for {table}: {column}")
+        rows = self._connection().execute(f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}")
+        return {row[0]: row[1] for row in rows}
+    
+    def _where(self, table: str, where: Optional[Dict[str, Any]] = None,
+               created_after: Optional[str] = None):
+        """Dựng mệnh đề WHERE từ các điều kiện bằng trên cột có index"""
+        conditions = []
+        params = []
+        for col, value in (where or {}).items():
+            if col not in self.TABLES[table]:
+                raise ValueError(f"Unknown column for {table}: {col}")
+            conditions.append(f"{col} = ?")
+            params.append(value)
+        if created_after is not None:
+            conditions.append("created_at > ?")
+            params.append(created_after)
+        clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return clause, params
+    
+    def fail_interrupted_jobs(self, error: str = "Interrupted by server restart", table: str = "training_jobs") -> int:
+        """
+        Đánh dấu failed các job (training_jobs hoặc ingestion_jobs) còn pending/running từ lần chạy trước
+        (không còn worker nào xử lý)
+        """
+        interrupted = 0
+        for status in ("pending", "running"):
+            for job in self.list(table, where={"status": status}):
+                job["status"] = "failed"
+                job["error"] = error
+                job["completed_at"] = get_timestamp()
+                self.put(table, job)
+                interrupted += 1
+        return interrupted
+
+# Instance dùng chung cho các routers
+catalog = CatalogService()
@@ -0,0 +1,100 @@
+"""
+Checkpoint Service - Lưu kết quả từng sản phẩm của training job ngay khi train xong để job chạy lại (resume)
+tiếp tục từ sản phẩm chưa xong, và cờ hủy (cancel) để các worker dừng sớm
+"""
+
+import os
+import glob
+import json
+import shutil
+import time
+from typing import Dict, Optional
+
+from services.parallel_training_service import ProductResult
+from utils.helpers import ensure_dir, save_json, load_json
+from config.settings import settings
+
+class TrainingCheckpoint:
+    """
+    Checkpoint của một training job: thư mục {checkpoint_dir}/{job_id}/ chứa products-{pid}.jsonl (mỗi process
+    ghi file riêng, mỗi dòng là kết quả một sản phẩm) và file cờ "cancel". Chỉ giữ đường dẫn nên pickle được
+    để truyền sang worker process.
+    """
+    
+    CANCEL_FLAG = "cancel"
+    PROGRESS_FILE = "progress.json"
+    
+    def __init__(self, job_id: str, checkpoint_dir: Optional[str] = None):
+        self.job_id = job_id
+        self.job_dir = os.path.join(checkpoint_dir or settings.TRAIN_CHECKPOINT_PATH, job_id)
+    
+    def start(self, total: int, done: int) -> None:
+        """Ghi tổng số sản phẩm và thời điểm bắt đầu lần chạy này (để tính tốc độ/ETA, xem progress_service)"""
+        ensure_dir(self.job_dir)
+        save_json({"total": total, "done_at_start": done, "started_at": time.time()},
+                  os.path.join(self.job_dir, self.PROGRESS_FILE))
+    
+    def progress_info(self) -> Optional[Dict[str, float]]:
+        """Thông tin do start() ghi (None nếu job chưa bắt đầu train từng sản phẩm)"""
+        try:
+            return load_json(os.path.join(self.job_dir, self.PROGRESS_FILE))
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def record(self, result: ProductResult) -> None:
+        """Ghi thêm kết quả một sản phẩm (flush ngay: process chết vẫn giữ các sản phẩm đã xong)"""
+        ensure_dir(self.job_dir)
+        item_code, metrics, error = result
+        line = json.dumps({"item_code": item_code, "metrics": metrics, "error": error, "recorded_at": time.time()},
+                          default=float)
+        with open(os.path.join(self.job_dir, f"products-{os.getpid()}.jsonl"), "a") as f:
+            f.write(line + "\n")
+            f.flush()
+    
+    def load(self) -> Dict[str, ProductResult]:
+        """Kết quả các sản phẩm đã checkpoint (bỏ qua dòng cuối dở dang nếu process chết giữa lúc ghi)"""
+        results: Dict[str, ProductResult] = {}
+        for path in sorted(glob.glob(os.path.join(self.job_dir, "products-*.jsonl"))):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    results[record["item_code"]] = (record["item_code"], record["metrics"], record["error"])
+        return results
+    
+    def count(self) -> int:
+        """Số sản phẩm đã checkpoint"""
+        return len(self.load())
+    
+    def cancel(self) -> None:
+        """Đặt cờ hủy (worker kiểm tra trước mỗi sản phẩm)"""
+        ensure_dir(self.job_dir)
+        open(os.path.join(self.job_dir, self.CANCEL_FLAG), "w").close()
+    
+    def cancelled(self) -> bool:
+        return os.path.exists(os.path.join(self.job_dir, self.CANCEL_FLAG))
+    
+    def clear_cancel(self) -> None:
+        """Bỏ cờ hủy trước khi chạy lại job"""
+        flag = os.path.join(self.job_dir, self.CANCEL_FLAG)
+        if os.path.exists(flag):
+            os.remove(flag)
+
+class CheckpointService:
+    """Tạo/xóa checkpoint theo job_id"""
+    
+    def __init__(self, checkpoint_dir: Optional[str] = None):
+        self.checkpoint_dir = checkpoint_dir or settings.TRAIN_CHECKPOINT_PATH
+        ensure_dir(self.checkpoint_dir)
+    
+    def get(self, job_id: str) -> TrainingCheckpoint:
+        return TrainingCheckpoint(job_id, self.checkpoint_dir)
+    
+    def remove(self, job_id: str) -> None:
+        """Xóa checkpoint khi job đã hoàn tất (kết quả đầy đủ nằm trong file results)"""
+        shutil.rmtree(os.path.join(self.checkpoint_dir, job_id), ignore_errors=True)
+
+# Instance dùng chung (training executor, routers)
+checkpoints = CheckpointService()
@@ -2,147 +2,332 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional, Callable
 import os
 from datetime import datetime
 import json
 import traceback
 from utils.helpers import generate_id, get_timestamp, ensure_dir, save_json, get_data_paths
+from services.raw_cache_service import RawCacheService
+from services.aggregation_service import AggregationService
+from services.blob_store_service import BlobStoreService
+from services.demand_loader_service import DemandLoaderService
+from services.panel_service import DemandPanel, panel_service
+
+# Callback báo tiến độ: (stage, rows_read, total_rows)
+ProgressCallback = Callable[[str, Optional[int], Optional[int]], None]
 
 class DataService:
+    # Các cột cần thiết trong file dữ liệu thô
+    RAW_COLUMNS = [
+        'DocDate',           # Ngày chứng từ
+        'BranchCode0',       # Mã chi nhánh
+        'BranchName0',       # Tên chi nhánh
+        'CustomerCode',      # Mã khách hàng
+        'ItemCode',          # Mã hàng
+        'ItemName',          # Tên hàng
+        'Quantity',          # Số lượng
+        'Unit'               # Đơn vị
+    ]
+    
     def __init__(self):
         self.paths = get_data_paths()
         # Ensure all directories exist
         for path in self.paths.values():
             ensure_dir(path)
+        self.raw_cache = RawCacheService()
+        self.loader = DemandLoaderService(self.raw_cache)
         
-    def process_raw_data(self, file_path: str) -> Dict[str, Any]:
+    def process_raw_data(self, file_path: str, chunksize: Optional[int] = None,
+                         progress: Optional[ProgressCallback] = None,
+                         content_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         Xử lý dữ liệu thô từ file Excel/CSV
         Dựa trên cấu trúc dữ liệu thực tế: DocDate, BranchCode0, BranchName0, CustomerCode, ItemCode, ItemName, Quantity, Unit
+        
+        Nếu truyền chunksize, file được đọc theo từng khối (streaming): mỗi khối được lọc và
+        gộp thành tổng theo (ItemCode, DocDate) rồi mới ghép lại, nên bộ nhớ chỉ phụ thuộc vào
+        số cặp sản phẩm-ngày chứ không phụ thuộc vào số dòng thô. Kết quả giống hệt chế độ đọc toàn bộ.
+        
+        progress (nếu có) được gọi với (stage, rows_read, total_rows) khi chuyển bước và sau mỗi khối.
+        content_hash (nếu đã tính lúc upload) giúp bỏ qua bước băm lại file thô.
+        
+        File kết quả được đặt tên theo hash nội dung nên các dataset cho ra cùng kết quả dùng chung một file.
         """
         try:
-            print(f"📖 Reading file: {file_path}")
-            
-            # Đọc file dữ liệu
-            if file_path.endswith('.xlsx'):
-                print("📊 Reading Excel file...")
-                df = pd.read_excel(file_path)
-            elif file_path.endswith('.csv'):
-                print("📊 Reading CSV file...")
-                df = pd.read_csv(file_path)
-            else:
-                raise ValueError("Unsupported file format")
+            df_grouped, raw_info = self._load_daily(file_path, chunksize, progress, content_hash)
             
-            print(f"✅ File read successfully. Shape: {df.shape}")
-            print(f"📋 Columns: {list(df.columns)}")
+            self._report(progress, "aggregating_weekly")
             
-            # Kiểm tra cấu trúc dữ liệu thực tế
-            expected_columns = [
-                'DocDate',           # Ngày chứng từ
-                'BranchCode0',       # Mã chi nhánh
-                'BranchName0',       # Tên chi nhánh
-                'CustomerCode',      # Mã khách hàng
-                'ItemCode',          # Mã hàng
-                'ItemName',          # Tên hàng
-                'Quantity',          # Số lượng
-                'Unit'               # Đơn vị
-            ]
-            
-            # Kiểm tra xem có đủ cột cần thiết không
-            missing_columns = [col for col in expected_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Thiếu các cột: {missing_columns}. Các cột có sẵn: {list(df.columns)}")
-            
-            # Chỉ giữ các cột cần thiết
-            df_v = df[expected_columns].copy()
-            print(f"✅ Filtered columns. Shape: {df_v.shape}")
-            
-            # Xử lý dữ liệu
-            df_v = df_v.dropna().reset_index(drop=True)
-            print(f"✅ Removed null values. Shape: {df_v.shape}")
-            
-            # Chuẩn hóa đơn vị và ItemCode
-            df_v['Unit'] = df_v['Unit'].astype(str).str.lower()
-            df_v['ItemCode'] = df_v['ItemCode'].astype(str).str.strip()
-            
-            # Lọc theo điều kiện: chỉ giữ 'viên' và ItemCode khác 'VANCHUYEN'
-            df_v_filtered = df_v[(df_v['Unit'] == 'viên') & (df_v['ItemCode'] != 'VANCHUYEN')].copy()
-            print(f"✅ Filtered by unit and item code. Shape: {df_v_filtered.shape}")
-            
-            # Lọc hàng bán (Quantity > 0)
-            df_pos = df_v_filtered[df_v_filtered['Quantity'] > 0].copy()
-            print(f"✅ Filtered positive quantities. Shape: {df_pos.shape}")
+            # Loại bỏ sản phẩm bán ít ngày và gộp theo tuần trong một lần sắp xếp (vector hóa)
+            weekly_demand, pending_days = AggregationService.aggregate(df_grouped)
+            del df_grouped
+            print(f"✅ Removed products with <= {AggregationService.MIN_ACTIVE_DAYS} days and created weekly demand data. Shape: {weekly_demand.shape}")
             
-            # Gộp dữ liệu theo ItemCode và DocDate
-            df_grouped = (
-                df_pos.groupby(['ItemCode', 'DocDate'], as_index=False)
-                .agg({'Quantity': 'sum'})
-            )
-            print(f"✅ Grouped by ItemCode and DocDate. Shape: {df_grouped.shape}")
+            self._report(progress, "writing")
             
-            # Đảm bảo DocDate là datetime trước khi sắp xếp
-            if not pd.api.types.is_datetime64_any_dtype(df_grouped['DocDate']):
-                df_grouped['DocDate'] = pd.to_datetime(df_grouped['DocDate'], errors='coerce')
-                df_grouped = df_grouped.dropna(subset=['DocDate'])
-            print(f"✅ DocDate is datetime. Shape: {df_grouped.shape}")
+            # Lưu dữ liệu đã xử lý và các ngày bán của sản phẩm chưa đủ ngày (để lần append sau xét lại)
+            processed_file, processed_hash, pending_file = self._write_outputs(weekly_demand, pending_days)
             
-            # Sắp xếp theo thời gian
-            df_grouped = df_grouped.sort_values('DocDate').reset_index(drop=True)
+            # Tạo thống kê
+            stats = self._build_stats(weekly_demand, processed_file, processed_hash)
+            stats["raw_file"] = self._raw_file_stats(raw_info)
             
-            # Loại bỏ sản phẩm bán ít ngày
-            day_counts = df_grouped.groupby('ItemCode')['DocDate'].nunique()
-            few_day_products = day_counts[day_counts <= 5].index
-            df_grouped = df_grouped[~df_grouped['ItemCode'].isin(few_day_products)].copy()
-            print(f"✅ Removed products with <= 5 days. Shape: {df_grouped.shape}")
+            print(f"✅ Processing completed. Stats: {stats}")
             
-            # Tạo dữ liệu theo tuần
-            df_grouped['week_start'] = df_grouped['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+            return {
+                "success": True,
+                "data": weekly_demand.to_dict('records'),
+                "stats": stats,
+                "processed_file": processed_file,
+                "pending_file": pending_file
+            }
             
+        except Exception as e:
+            print(f"❌ Error in process_raw_data: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def append_raw_data(self, file_path: str, processed_file: str, pending_file: Optional[str] = None,
+                        chunksize: Optional[int] = None,
+                        progress: Optional[ProgressCallback] = None,
+                        content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Append giao dịch mới (delta) vào dataset đã xử lý
+        
+        Chỉ file delta được đọc và gộp. Sản phẩm đã có trong weekly_demand được cộng thẳng vào các tuần
+        bị ảnh hưởng; sản phẩm chưa đủ ngày bán được xét lại cùng các ngày đang chờ trong pending_file.
+        File delta chỉ nên chứa giao dịch mới (chưa có trong các lần upload trước).
+        
+        File cũ không bị ghi đè (có thể đang được dataset khác dùng chung): kết quả được ghi ra
+        file mới theo hash nội dung và trả về trong processed_file/pending_file.
+        """
+        try:
+            delta_daily, raw_info = self._load_daily(file_path, chunksize, progress, content_hash)
+            
+            self._report(progress, "merging")
+            
+            existing = pd.read_csv(processed_file, dtype={'ItemCode': str}, parse_dates=['Week'])
+            pending = (
+                pd.read_parquet(pending_file)
+                if pending_file and os.path.exists(pending_file)
+                else delta_daily.iloc[:0]
+            )
+            print(f"✅ Loaded existing weekly demand. Shape: {existing.shape}. Pending item-days: {len(pending)}")
+            
+            # Sản phẩm đã đạt ngưỡng: chỉ cần gộp delta theo tuần
+            is_known = delta_daily['ItemCode'].isin(existing['ItemCode'].unique())
+            known_weekly = AggregationService.weekly_demand(delta_daily[is_known], min_days=0)
+            
+            # Sản phẩm chưa đạt ngưỡng: xét lại cùng các ngày đang chờ
+            promoted_weekly, pending = AggregationService.aggregate(
+                pd.concat([pending, delta_daily[~is_known]], ignore_index=True)
+            )
+            
+            touched = pd.concat([known_weekly, promoted_weekly], ignore_index=True)
             weekly_demand = (
-                df_grouped
-                .groupby(['ItemCode', 'week_start'], as_index=False)
-                .agg({'Quantity': 'sum'})
+                pd.concat([existing, touched], ignore_index=True)
+                .groupby(['ItemCode', 'Week'], as_index=False)
+                .agg({'TotalQuantity': 'sum'})
             )
+            print(f"✅ Merged {len(touched)} touched item-weeks "
+                  f"({promoted_weekly['ItemCode'].nunique()} newly qualified products). Shape: {weekly_demand.shape}")
             
-            weekly_demand.columns = ['ItemCode', 'Week', 'TotalQuantity']
-            weekly_demand = weekly_demand.sort_values(by=['ItemCode', 'Week']).reset_index(drop=True)
-            print(f"✅ Created weekly demand data. Shape: {weekly_demand.shape}")
+            self._report(progress, "writing")
             
-            # Lưu dữ liệu đã xử lý vào thư mục processed
-            processed_file = f"{self.paths['processed']}/weekly_demand_{generate_id()}.csv"
-            weekly_demand.to_csv(processed_file, index=False, encoding="utf-8-sig")
-            print(f"✅ Saved processed data to: {processed_file}")
+            processed_file, processed_hash, pending_file = self._write_outputs(weekly_demand, pending)
             
-            # Tạo thống kê
-            stats = {
-                "total_products": len(weekly_demand['ItemCode'].unique()),
-                "total_weeks": len(weekly_demand['Week'].unique()),
-                "total_records": len(weekly_demand),
-                "date_range": {
-                    "start": weekly_demand['Week'].min().strftime('%Y-%m-%d'),
-                    "end": weekly_demand['Week'].max().strftime('%Y-%m-%d')
-                },
-                "processed_file": processed_file
+            stats = self._build_stats(weekly_demand, processed_file, processed_hash)
+            delta_stats = {
+                "raw_file": self._raw_file_stats(raw_info),
+                "touched_products": int(touched['ItemCode'].nunique()),
+                "touched_weeks": len(touched),
+                "new_products": int(promoted_weekly['ItemCode'].nunique()),
+                "appended_at": get_timestamp()
             }
             
-            print(f"✅ Processing completed. Stats: {stats}")
+            print(f"✅ Append completed. Stats: {stats}")
             
             return {
                 "success": True,
-                "data": weekly_demand.to_dict('records'),
                 "stats": stats,
-                "processed_file": processed_file
+                "delta": delta_stats,
+                "processed_file": processed_file,
+                "pending_file": pending_file
             }
             
         except Exception as e:
-            print(f"❌ Error in process_raw_data: {str(e)}")
+            print(f"❌ Error in append_raw_data: {str(e)}")
             print(f"📋 Traceback: {traceback.format_exc()}")
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    def _load_daily(self, file_path: str, chunksize: Optional[int] = None,
+                    progress: Optional[ProgressCallback] = None,
+                    content_hash: Optional[str] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """Đọc file thô (qua cache) và gộp thành tổng theo (ItemCode, DocDate) với DocDate kiểu datetime"""
+        print(f"📖 Reading file: {file_path}")
+        self._report(progress, "caching")
+        
+        # Chuyển file sang cache Parquet (chỉ parse lần đầu, các lần sau đọc thẳng từ cache)
+        raw_info = self.raw_cache.ensure_cached(file_path, chunksize, content_hash)
+        
+        self._report(progress, "aggregating_daily", 0, raw_info["num_rows"])
+        
+        if chunksize:
+            df_grouped = self._aggregate_daily_streaming(file_path, chunksize, raw_info["content_hash"],
+                                                         progress, raw_info["num_rows"])
+        else:
+            # Cột định danh dạng category; Quantity giữ kiểu của nguồn (int64 nếu file chỉ có số nguyên)
+            # để tổng ghi ra file giống hệt trước đây (không thành "11.0")
+            df = self.loader.load_raw(file_path, columns=self.RAW_COLUMNS, content_hash=raw_info["content_hash"],
+                                      quantity_dtype=None)
+            
+            print(f"✅ File read successfully. Shape: {df.shape}")
+            print(f"📋 Columns: {list(df.columns)}")
+            
+            df_pos = self._filter_raw(df)
+            del df
+            
+            # Gộp dữ liệu theo ItemCode và DocDate
+            df_grouped = self._aggregate_daily(df_pos)
+            print(f"✅ Grouped by ItemCode and DocDate. Shape: {df_grouped.shape}")
+            self._report(progress, "aggregating_daily", raw_info["num_rows"], raw_info["num_rows"])
+        
+        # Đảm bảo DocDate là datetime
+        if not pd.api.types.is_datetime64_any_dtype(df_grouped['DocDate']):
+            df_grouped['DocDate'] = pd.to_datetime(df_grouped['DocDate'], errors='coerce')
+            df_grouped = df_grouped.dropna(subset=['DocDate'])
+        print(f"✅ DocDate is datetime. Shape: {df_grouped.shape}")
+        
+        return df_grouped, raw_info
+    
+    @staticmethod
+    def _report(progress: Optional[ProgressCallback], stage: str,
+                rows_read: Optional[int] = None, total_rows: Optional[int] = None) -> None:
+        """Báo tiến độ xử lý cho caller (nếu có)"""
+        if progress is not None:
+            progress(stage, rows_read, total_rows)
+    
+    @staticmethod
+    def _build_stats(weekly_demand: pd.DataFrame, processed_file: str, processed_hash: str) -> Dict[str, Any]:
+        """Thống kê của dữ liệu theo tuần"""
+        return {
+            "total_products": len(weekly_demand['ItemCode'].unique()),
+            "total_weeks": len(weekly_demand['Week'].unique()),
+            "total_records": len(weekly_demand),
+            "date_range": {
+                "start": weekly_demand['Week'].min().strftime('%Y-%m-%d'),
+                "end": weekly_demand['Week'].max().strftime('%Y-%m-%d')
+            },
+            "processed_file": processed_file,
+            "processed_hash": processed_hash,
+            "panel": panel_service.load(processed_file).describe()
+        }
+    
+    @staticmethod
+    def _raw_file_stats(raw_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Thông tin parse file thô đưa vào stats"""
+        return {
+            "content_hash": raw_info["content_hash"],
+            "file_size_mb": raw_info["file_size_mb"],
+            "parse_seconds": raw_info["parse_seconds"],
+            "reader": raw_info["reader"],
+            "cache_hit": raw_info["cache_hit"],
+            "num_rows": raw_info["num_rows"]
+        }
+    
+    def _write_outputs(self, weekly_demand: pd.DataFrame, pending_days: pd.DataFrame) -> Tuple[str, str, str]:
+        """
+        Ghi weekly_demand (CSV), panel sản phẩm × tuần (.npy) và các ngày đang chờ (Parquet) vào thư mục processed,
+        đặt tên theo hash nội dung. Trả về (processed_file, processed_hash, pending_file); file trùng nội dung được dùng lại thay vì ghi thêm bản mới
+        """
+        processed_file, processed_hash = BlobStoreService.write_file(
+            lambda path: weekly_demand.to_csv(path, index=False, encoding="utf-8-sig"),
+            self.paths['processed'], ".csv", prefix="weekly_demand_"
+        )
+        print(f"✅ Saved processed data to: {processed_file}")
+        
+        # Panel dày dùng cho feature, training và dashboard (memory-map, không cần parse lại CSV)
+        panel_service.save(DemandPanel.from_weekly(weekly_demand), processed_file)
+        
+        pending_file, _ = BlobStoreService.write_file(
+            lambda path: pending_days.to_parquet(path, index=False),
+            self.paths['processed'], ".parquet", prefix="pending_days_"
+        )
+        return processed_file, processed_hash, pending_file
+    
+    def _filter_raw(self, df: pd.DataFrame, verbose: bool = True) -> pd.DataFrame:
+        """Chọn cột, bỏ null, chuẩn hóa và lọc các dòng bán hàng hợp lệ"""
+        # Kiểm tra xem có đủ cột cần thiết không
+        missing_columns = [col for col in self.RAW_COLUMNS if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Thiếu các cột: {missing_columns}. Các cột có sẵn: {list(df.columns)}")
+        
+        # Chỉ giữ các cột cần thiết
+        df_v = df[self.RAW_COLUMNS].dropna().reset_index(drop=True)
+        if verbose:
+            print(f"✅ Filtered columns and removed null values. Shape: {df_v.shape}")
+        
+        # Chuẩn hóa đơn vị và ItemCode (trên bảng category nếu cột là category)
+        df_v['Unit'] = DemandLoaderService.map_categories(df_v['Unit'], lambda s: s.astype(str).str.lower())
+        df_v['ItemCode'] = DemandLoaderService.map_categories(df_v['ItemCode'], lambda s: s.astype(str).str.strip())
+        
+        # Lọc theo điều kiện: chỉ giữ 'viên', ItemCode khác 'VANCHUYEN' và hàng bán (Quantity > 0)
+        df_pos = df_v[
+            (df_v['Unit'] == 'viên') & (df_v['ItemCode'] != 'VANCHUYEN') & (df_v['Quantity'] > 0)
+        ]
+        if verbose:
+            print(f"✅ Filtered by unit, item code and positive quantities. Shape: {df_pos.shape}")
+        return df_pos
+    
+    @staticmethod
+    def _aggregate_daily(df: pd.DataFrame) -> pd.DataFrame:
+        """Gộp tổng Quantity theo (ItemCode, DocDate)"""
+        return (
+            df.groupby(['ItemCode', 'DocDate'], as_index=False, observed=True)
+            .agg({'Quantity': 'sum'})
+        )
+    
+    def _aggregate_daily_streaming(self, file_path: str, chunksize: int,
+                                   content_hash: Optional[str] = None,
+                                   progress: Optional[ProgressCallback] = None,
+                                   total_rows: Optional[int] = None) -> pd.DataFrame:
+        """Đọc file theo từng khối và gộp dần thành tổng theo (ItemCode, DocDate)"""
+        print(f"📊 Streaming file in chunks of {chunksize} rows...")
+        
+        partials = []
+        buffered_rows = 0
+        compacted_rows = 0
+        rows_read = 0
+        
+        for chunk in self.loader.iter_raw_chunks(file_path, chunksize, columns=self.RAW_COLUMNS,
+                                                 content_hash=content_hash, quantity_dtype=None):
+            rows_read += len(chunk)
+            partial = self._aggregate_daily(self._filter_raw(chunk, verbose=False))
+            partials.append(partial)
+            buffered_rows += len(partial)
+            
+            # Gộp các tổng riêng phần khi bộ đệm lớn gấp đôi phần đã gộp (chi phí gộp được khấu hao)
+            if len(partials) > 1 and buffered_rows > 2 * max(compacted_rows, chunksize):
+                partials = [self._aggregate_daily(pd.concat(partials, ignore_index=True))]
+                compacted_rows = buffered_rows = len(partials[0])
+            
+            print(f"🔄 Read {rows_read} rows, {buffered_rows} partial item-day rows buffered")
+            self._report(progress, "aggregating_daily", rows_read, total_rows)
+        
+        if not partials:
+            raise ValueError("File không có dữ liệu")
+        
+        df_grouped = self._aggregate_daily(pd.concat(partials, ignore_index=True))
+        print(f"✅ Streamed {rows_read} rows. Grouped by ItemCode and DocDate. Shape: {df_grouped.shape}")
+        return df_grouped
+    
     def get_data_summary(self, data: pd.DataFrame) -> Dict[str, Any]:
         """Tạo tóm tắt dữ liệu"""
         summary = {
@@ -161,21 +346,22 @@ class DataService:
         }
         return summary
     
-    def create_visualization(self, data: pd.DataFrame, product_code: str = None) -> str:
-        """Tạo biểu đồ cho dữ liệu"""
+    def create_visualization(self, panel: DemandPanel, product_code: str = None) -> str:
+        """Tạo biểu đồ cho dữ liệu (vẽ các tuần có bán của từng hàng trong panel)"""
         try:
             plt.figure(figsize=(12, 6))
             
             if product_code:
                 # Biểu đồ cho 1 sản phẩm
-                product_data = data[data['ItemCode'] == product_code]
-                plt.plot(product_data['Week'], product_data['TotalQuantity'], marker='o')
+                row = panel.row(product_code)
+                weeks, quantities = panel.observed_series(row) if row is not None else ([], [])
+                plt.plot(weeks, quantities, marker='o')
                 plt.title(f'Demand Forecast - {product_code}')
             else:
                 # Biểu đồ tổng hợp
-                for item in data['ItemCode'].unique()[:10]:  # Chỉ vẽ 10 sản phẩm đầu
-                    item_data = data[data['ItemCode'] == item]
-                    plt.plot(item_data['Week'], item_data['TotalQuantity'], marker='o', label=str(item))
+                for row in range(min(10, panel.num_products)):  # Chỉ vẽ 10 sản phẩm đầu
+                    weeks, quantities = panel.observed_series(row)
+                    plt.plot(weeks, quantities, marker='o', label=str(panel.items[row]))
                 plt.title('Demand Forecast - Top 10 Products')
                 plt.legend()
             
@@ -203,12 +389,8 @@ class DataService:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        if filename.endswith('.xlsx'):
-            return pd.read_excel(file_path)
-        elif filename.endswith('.csv'):
-            return pd.read_csv(file_path)
-        else:
-            raise ValueError("Unsupported file format")
+        # Đọc qua cache Parquet để file Excel chỉ phải parse một lần, cột định danh dạng category
+        return self.loader.load_raw(file_path)
     
     def save_processed_data(self, data: pd.DataFrame, filename: str) -> str:
         """Lưu dữ liệu đã xử lý vào thư mục processed"""
@@ -0,0 +1,130 @@
+"""
+Demand Loader Service - Đọc dữ liệu thô/đã xử lý ở dạng gọn: mã dạng category, số lượng float32, chỉ số tuần int
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from services.raw_cache_service import RawCacheService
+
+class DemandLoaderService:
+    """Loader dùng chung cho DataService, XGBoostModel và ProphetModel"""
+    
+    # Các cột định danh lưu dưới dạng category (mã int + bảng giá trị duy nhất)
+    CATEGORY_COLUMNS = ['ItemCode', 'Unit', 'BranchCode0', 'BranchName0', 'CustomerCode', 'ItemName']
+    QUANTITY_DTYPE = np.float32
+    
+    # Kích thước một tham chiếu và phần đầu của một str Python, dùng để ước tính bộ nhớ dạng object
+    OBJECT_POINTER_BYTES = 8
+    PY_STR_OVERHEAD_BYTES = 49
+    
+    def __init__(self, raw_cache: Optional[RawCacheService] = None):
+        self.raw_cache = raw_cache or RawCacheService()
+    
+    def load_weekly(self, processed_file: str) -> pd.DataFrame:
+        """
+        Đọc file weekly_demand đã xử lý
+        ItemCode là category, Week là datetime, TotalQuantity là float32 và WeekIndex là số tuần tính từ tuần đầu
+        """
+        df = pd.read_csv(
+            processed_file,
+            dtype={'ItemCode': 'category', 'TotalQuantity': self.QUANTITY_DTYPE},
+            parse_dates=['Week']
+        )
+        df['WeekIndex'] = self.week_index(df['Week'])
+        self._log_memory("weekly demand", df)
+        return df
+    
+    def load_raw(self, file_path: str, columns: Optional[List[str]] = None, content_hash: Optional[str] = None,
+                 quantity_dtype=QUANTITY_DTYPE) -> pd.DataFrame:
+        """Đọc file thô qua cache Parquet, các cột định danh được đọc thẳng thành category (không qua str)"""
+        df = self.raw_cache.read_frame(file_path, columns=columns, content_hash=content_hash,
+                                       categories=self.CATEGORY_COLUMNS)
+        df = self.compact(df, quantity_dtype)
+        self._log_memory("raw data", df)
+        return df
+    
+    def iter_raw_chunks(self, file_path: str, chunksize: int, columns: Optional[List[str]] = None,
+                        content_hash: Optional[str] = None, quantity_dtype=QUANTITY_DTYPE) -> Iterator[pd.DataFrame]:
+        """Đọc file thô theo từng khối chunksize dòng ở dạng gọn"""
+        for chunk in self.raw_cache.iter_chunks(file_path, chunksize, columns=columns, content_hash=content_hash,
+                                                categories=self.CATEGORY_COLUMNS):
+            yield self.compact(chunk, quantity_dtype)
+    
+    @classmethod
+    def compact(cls, df: pd.DataFrame, quantity_dtype=QUANTITY_DTYPE) -> pd.DataFrame:
+        """
+        Chuyển DataFrame sẵn có sang dạng gọn (cột định danh → category, Quantity/TotalQuantity → quantity_dtype)
+        quantity_dtype=None giữ nguyên kiểu số lượng của nguồn (vd: int64 khi file chỉ có số nguyên)
+        """
+        for col in cls.CATEGORY_COLUMNS:
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        for col in ('Quantity', 'TotalQuantity'):
+            if quantity_dtype is not None and col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].astype(quantity_dtype)
+        return df
+    
+    @staticmethod
+    def week_index(weeks: pd.Series) -> np.ndarray:
+        """Số thứ tự tuần tính từ tuần nhỏ nhất, dùng kiểu int nhỏ nhất đủ chứa"""
+        if weeks.empty:
+            return np.zeros(0, dtype=np.int16)
+        days = weeks.to_numpy().astype('datetime64[D]').astype(np.int64)
+        index = (days - days.min()) // 7
+        return index.astype(np.int16 if index.max() <= np.iinfo(np.int16).max else np.int32)
+    
+    @staticmethod
+    def map_categories(series: pd.Series, func: Callable[[pd.Series], pd.Series]) -> pd.Series:
+        """
+        Áp dụng phép chuẩn hóa chuỗi (vd: lower, strip) lên bảng category thay vì từng dòng
+        Các giá trị trùng nhau sau chuẩn hóa được gộp; cột không phải category thì áp dụng trực tiếp
+        """
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            return func(series)
+        
+        mapped = func(pd.Series(series.cat.categories))
+        new_codes, new_categories = pd.factorize(mapped, sort=True)
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, new_codes[codes], -1)
+        return pd.Series(pd.Categorical.from_codes(codes, categories=new_categories),
+                         index=series.index, name=series.name)
+    
+    @classmethod
+    def memory_report(cls, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Bộ nhớ của DataFrame hiện tại so với cách lưu cũ (cột định danh là str Python, số lượng float64)
+        Phần "trước" được ước tính từ bảng category nên không cần dựng lại cột object
+        """
+        after = int(df.memory_usage(deep=True, index=False).sum())
+        before = 0
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                sizes = series.cat.categories.astype(str).str.len().to_numpy() + cls.PY_STR_OVERHEAD_BYTES
+                codes = series.cat.codes.to_numpy()
+                before += len(series) * cls.OBJECT_POINTER_BYTES + int(sizes[codes[codes >= 0]].sum())
+            elif col in ('Quantity', 'TotalQuantity'):
+                before += len(series) * np.dtype(np.float64).itemsize
+            elif col == 'WeekIndex':
+                continue
+            else:
+                before += int(series.memory_usage(deep=True, index=False))
+        
+        return {
+            "rows": len(df),
+            "memory_mb_before": round(before / (1024 * 1024), 3),
+            "memory_mb_after": round(after / (1024 * 1024), 3),
+            "saved_percent": round(100 * (1 - after / before), 1) if before else 0.0
+        }
+    
+    @classmethod
+    def _log_memory(cls, label: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """In và gắn báo cáo bộ nhớ vào df.attrs['memory'] để caller đưa vào kết quả"""
+        report = cls.memory_report(df)
+        df.attrs['memory'] = report
+        print(f"📊 Loaded {label}: {report['rows']} rows, {report['memory_mb_before']} MB → "
+              f"{report['memory_mb_after']} MB ({report['saved_percent']}% saved)")
+        return report
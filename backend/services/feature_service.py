@@ -0,0 +1,544 @@
+"""
+Feature Service - Tạo features lag/rolling/trend/lịch cho toàn bộ sản phẩm trong một lần (vector hóa trên panel)
+Bộ features được khai báo bằng spec (dict) và biên dịch một lần thành FeaturePlan
+"""
+
+import os
+import json
+import hashlib
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from services.panel_service import DemandPanel
+from utils.helpers import generate_id
+
+class FeaturePlan:
+    """
+    Spec features đã chuẩn hóa và biên dịch: danh sách cột theo thứ tự, số tuần lịch sử cần có và các phép
+    toán dùng chung (mỗi lag gom một lần cho cả lag_k lẫn pct_change_k, mỗi cửa sổ rolling gom một lần
+    cho mọi thống kê của nó, lịch tính theo cột tuần và chỉ cho các mã hóa được yêu cầu)
+    """
+    
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self.spec_hash = FeatureService.spec_hash(spec)
+        
+        calendar = spec["calendar"]
+        self.columns: List[str] = [
+            *(name for name in calendar if name in FeatureService.CALENDAR),
+            *(f"lag_{lag}" for lag in spec["lags"]),
+            *(f"rolling_{stat}_{rolling['window']}" for rolling in spec["rolling"] for stat in rolling["stats"]),
+            *(f"pct_change_{period}" for period in spec["pct_change"]),
+            *(["trend"] if spec["trend"] else []),
+            *(name for name in calendar if name in FeatureService.CYCLICAL)
+        ]
+        
+        # exclude_current: rolling/pct_change kết thúc ở tuần t-1 (không chứa lượng bán của chính tuần t)
+        self.offset = 1 if spec["exclude_current"] else 0
+        
+        # Các độ trễ cần gom (lag_k, gốc của pct_change, tuần t-1 khi bỏ tuần hiện tại khỏi pct_change)
+        self.lag_keys = sorted({
+            *spec["lags"],
+            *(period + self.offset for period in spec["pct_change"]),
+            *([self.offset] if self.offset and spec["pct_change"] else [])
+        })
+        
+        # Số tuần lịch sử cần có trước tuần được giữ (lag dài nhất, cửa sổ dài nhất - 1, chu kỳ pct_change dài nhất)
+        self.history = max([
+            0,
+            *self.lag_keys,
+            *(rolling["window"] - 1 + self.offset for rolling in spec["rolling"])
+        ])
+    
+    def build(self, panel: DemandPanel, all_weeks: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Bảng features (ItemCode, Week, TotalQuantity + columns) của tất cả sản phẩm, sắp xếp theo
+        (hàng panel, tuần). Lag/rolling tính theo tuần lịch (tuần không bán = 0); trend là số tuần kể từ
+        tuần bán đầu tiên; chỉ giữ các tuần có bán và đủ `history` tuần lịch sử (all_weeks: giữ mọi tuần đủ
+        lịch sử kể cả tuần không bán, vd: features tại mốc dự báo của backtest).
+        """
+        if panel.num_products == 0 or panel.num_weeks <= self.history:
+            return None
+        
+        values = np.asarray(panel.values, dtype=np.float64)
+        observed = values > 0
+        first = observed.argmax(axis=1)
+        eligible = observed.sum(axis=1) >= self.spec["min_observed_weeks"]
+        
+        # Ô được giữ: tuần có bán, cách tuần bán đầu tiên ít nhất `history` tuần, sản phẩm đủ số tuần bán
+        offset = np.arange(panel.num_weeks) - first[:, None]
+        rows, cols = np.nonzero((observed | all_weeks) & (offset >= self.history) & eligible[:, None])
+        if len(rows) == 0:
+            return None
+        
+        current = values[rows, cols]
+        features: Dict[str, Any] = {}
+        
+        # Lag: gom một lần cho mỗi độ trễ (pct_change dùng lại)
+        lags = {lag: values[rows, cols - lag] for lag in self.lag_keys}
+        for lag in self.spec["lags"]:
+            features[f"lag_{lag}"] = lags[lag]
+        
+        # Rolling: cửa sổ [t-w+1, t] của từng ô (exclude_current: [t-w, t-1]) là view trên ma trận,
+        # dùng chung cho mọi thống kê của cửa sổ
+        for rolling in self.spec["rolling"]:
+            window = rolling["window"]
+            windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=1)[
+                rows, cols - window + 1 - self.offset]
+            for stat in rolling["stats"]:
+                features[f"rolling_{stat}_{window}"] = FeatureService.ROLLING_STATS[stat](windows)
+        
+        calendar = FeatureService.calendar(panel.weeks, self.spec["calendar"])
+        return self._frame(panel.items[rows], calendar, cols, current, lags, features, cols - first[rows])
+    
+    def state(self, panel: DemandPanel) -> "FeatureState":
+        """Trạng thái rolling của từng sản phẩm sau tuần cuối của panel (để tạo features cho các tuần tiếp theo)"""
+        return FeatureState.from_panel(self, panel)
+    
+    def _frame(self, items: np.ndarray, calendar: Dict[str, Any], cols: np.ndarray, current: np.ndarray,
+               lags: Dict[int, np.ndarray], features: Dict[str, Any], trend: np.ndarray) -> pd.DataFrame:
+        """Bổ sung pct_change/trend/lịch vào features lag/rolling rồi ghép bảng theo thứ tự columns"""
+        # pct_change: tuần gốc không bán (= 0) thì để NaN (XGBoost coi là giá trị thiếu)
+        latest = lags[self.offset] if self.offset else current
+        for period in self.spec["pct_change"]:
+            base = lags[period + self.offset]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                features[f"pct_change_{period}"] = np.where(base > 0, (latest - base) / base, np.nan)
+        
+        if self.spec["trend"]:
+            features["trend"] = trend
+        
+        for name in self.spec["calendar"]:
+            features[name] = calendar[name][cols]
+        
+        return pd.DataFrame({
+            'ItemCode': items,
+            'Week': calendar['Week'][cols],
+            'TotalQuantity': current,
+            **{col: features[col] for col in self.columns}
+        })
+
+class WindowDeque:
+    """
+    Deque đơn điệu cho min/max của cửa sổ trượt, vector hóa theo sản phẩm: mỗi hàng giữ các (tuần, giá trị)
+    còn có thể là cực trị của cửa sổ, phần tử đầu là kết quả. Mỗi tuần chỉ một phần tử hết hạn ở đầu và
+    các phần tử bị giá trị mới lấn át luôn nằm ở cuối nên cập nhật không phải duyệt lại cửa sổ.
+    """
+    
+    def __init__(self, window: int, num_products: int, stat: str):
+        self.window = window
+        self.stat = stat
+        # Phần tử cũ còn giữ khi giá trị mới vào: min giữ giá trị nhỏ hơn hẳn, max giữ giá trị lớn hơn hẳn
+        self._keeps = np.less if stat == 'min' else np.greater
+        self.values = np.zeros((num_products, window))
+        self.weeks = np.full((num_products, window), -1, dtype=np.int64)
+        self.size = np.zeros(num_products, dtype=np.int64)
+    
+    def push(self, week: int, values: np.ndarray) -> None:
+        """Đưa giá trị tuần `week` của mọi sản phẩm vào cửa sổ"""
+        expired = (self.size > 0) & (self.weeks[:, 0] <= week - self.window)
+        if expired.any():
+            self.values[expired, :-1] = self.values[expired, 1:]
+            self.weeks[expired, :-1] = self.weeks[expired, 1:]
+            self.size[expired] -= 1
+        
+        # Deque đơn điệu nên các phần tử còn giữ là một tiền tố; giá trị mới ghi ngay sau tiền tố đó
+        valid = np.arange(self.window) < self.size[:, None]
+        keep = np.count_nonzero(valid & self._keeps(self.values, values[:, None]), axis=1)
+        rows = np.arange(len(values))
+        self.values[rows, keep] = values
+        self.weeks[rows, keep] = week
+        self.size = keep + 1
+    
+    def front(self) -> np.ndarray:
+        """Min/max của cửa sổ hiện tại cho từng sản phẩm"""
+        return self.values[:, 0]
+    
+    def extend(self, num_new: int, week: int) -> None:
+        """Thêm hàng cho sản phẩm mới (lịch sử toàn 0: cửa sổ chỉ còn giá trị 0 của tuần gần nhất)"""
+        self.values = np.vstack([self.values, np.zeros((num_new, self.window))])
+        weeks = np.full((num_new, self.window), -1, dtype=np.int64)
+        weeks[:, 0] = week
+        self.weeks = np.vstack([self.weeks, weeks])
+        self.size = np.append(self.size, np.full(num_new, 1 if week >= 0 else 0, dtype=np.int64))
+    
+    def take(self, order: np.ndarray) -> None:
+        """Sắp xếp lại các hàng theo thứ tự sản phẩm mới"""
+        self.values, self.weeks, self.size = self.values[order], self.weeks[order], self.size[order]
+
+class FeatureState:
+    """
+    Trạng thái rolling của từng sản phẩm để tạo features cho tuần mới mà không tính lại cả lịch sử:
+    `history` + 1 tuần gần nhất (lag, pct_change), tổng và tổng bình phương của mỗi cửa sổ (mean/sum/std),
+    deque đơn điệu của mỗi cửa sổ (min/max), tuần bán đầu tiên và số tuần có bán.
+    
+    Mỗi lần update() tốn O(số sản phẩm) và trả về đúng các dòng FeaturePlan.build sinh ra cho tuần đó
+    nếu dựng lại panel có thêm tuần mới (dùng cho refresh hằng tuần và predict ngay khi tuần vừa đóng).
+    """
+    
+    def __init__(self, plan: FeaturePlan, items: np.ndarray, next_week: np.datetime64, last_index: int = -1):
+        self.plan = plan
+        self.items = items
+        self.next_week = np.datetime64(next_week, 'D')
+        self.last_index = last_index  # Chỉ số (từ tuần đầu panel) của tuần cuối đã nạp
+        
+        num_products = len(items)
+        self.recent = np.zeros((num_products, plan.history + 1))  # recent[:, -1 - k] = giá trị tuần last_index - k
+        self.first = np.full(num_products, -1, dtype=np.int64)
+        self.observed_weeks = np.zeros(num_products, dtype=np.int64)
+        self.sums = {rolling["window"]: np.zeros(num_products) for rolling in plan.spec["rolling"]}
+        self.squares = {window: np.zeros(num_products) for window in self.sums}
+        self.deques = {
+            (rolling["window"], stat): WindowDeque(rolling["window"], num_products, stat)
+            for rolling in plan.spec["rolling"] for stat in rolling["stats"] if stat in ('min', 'max')
+        }
+    
+    @property
+    def num_products(self) -> int:
+        return len(self.items)
+    
+    @classmethod
+    def from_panel(cls, plan: FeaturePlan, panel: DemandPanel) -> "FeatureState":
+        """Khởi tạo từ panel: chỉ đọc `history` + 1 tuần cuối, tuần bán đầu tiên và số tuần có bán"""
+        start_week = panel.weeks[0] if panel.num_weeks else np.datetime64('1970-01-05', 'D')
+        state = cls(plan, np.asarray(panel.items, dtype=object).copy(),
+                    start_week + 7 * panel.num_weeks, panel.num_weeks - 1)
+        if panel.num_products == 0 or panel.num_weeks == 0:
+            return state
+        
+        span = min(plan.history + 1, panel.num_weeks)
+        tail = np.asarray(panel.values[:, -span:], dtype=np.float64)
+        state.recent[:, -span:] = tail
+        
+        observed = np.asarray(panel.values) > 0
+        state.observed_weeks = observed.sum(axis=1)
+        state.first = np.where(state.observed_weeks > 0, observed.argmax(axis=1), -1)
+        
+        for window in state.sums:
+            state.sums[window] = state.recent[:, -window:].sum(axis=1)
+            state.squares[window] = (state.recent[:, -window:] ** 2).sum(axis=1)
+        
+        # Deque nạp lại các tuần của cửa sổ dài nhất (tuần trước tuần đầu panel coi như 0 giống panel)
+        for (window, _), deque in state.deques.items():
+            for offset in range(window, 0, -1):
+                deque.push(state.last_index + 1 - offset, state.recent[:, -offset])
+        return state
+    
+    def update(self, quantities: Union[pd.Series, Dict[str, float]]) -> pd.DataFrame:
+        """
+        Nạp tổng số lượng của tuần kế tiếp (ItemCode -> TotalQuantity, sản phẩm không có = không bán)
+        và trả về các dòng features của tuần đó; sản phẩm mới được thêm vào trạng thái
+        """
+        quantities = pd.Series(quantities, dtype=np.float64)
+        quantities.index = quantities.index.astype(str)
+        quantities = quantities[quantities > 0].groupby(level=0).sum()
+        
+        item_codes = quantities.index.to_numpy(dtype=object)
+        rows = self._rows(item_codes)
+        if (rows < 0).any():
+            self._add_products(item_codes[rows < 0])
+            rows = self._rows(item_codes)
+        
+        # Làm tròn về float32 giống giá trị lưu trong panel
+        values = np.zeros(self.num_products)
+        values[rows] = quantities.to_numpy().astype(DemandPanel.DTYPE)
+        
+        week_index = self.last_index + 1
+        week = self.next_week
+        
+        # exclude_current: thống kê rolling lấy trước khi nạp tuần mới (cửa sổ kết thúc ở tuần trước)
+        rolling = self._rolling() if self.plan.offset else None
+        
+        for window in self.sums:
+            dropped = self.recent[:, -window]  # Giá trị tuần week_index - window ra khỏi cửa sổ
+            self.sums[window] += values - dropped
+            self.squares[window] += values ** 2 - dropped ** 2
+        for deque in self.deques.values():
+            deque.push(week_index, values)
+        
+        self.recent[:, :-1] = self.recent[:, 1:]
+        self.recent[:, -1] = values
+        
+        observed = values > 0
+        self.first[(self.first < 0) & observed] = week_index
+        self.observed_weeks += observed
+        self.last_index = week_index
+        self.next_week = week + 7
+        
+        rows = np.flatnonzero(
+            observed
+            & (week_index - self.first >= self.plan.history)
+            & (self.observed_weeks >= self.plan.spec["min_observed_weeks"])
+        )
+        return self._features(rows, week, rolling or self._rolling())
+    
+    def _rolling(self) -> Dict[str, np.ndarray]:
+        """Thống kê rolling của cửa sổ hiện tại (kết thúc ở tuần cuối đã nạp) cho mọi sản phẩm"""
+        features: Dict[str, np.ndarray] = {}
+        for rolling in self.plan.spec["rolling"]:
+            window = rolling["window"]
+            sums, squares = self.sums[window], self.squares[window]
+            for stat in rolling["stats"]:
+                if stat in ('min', 'max'):
+                    value = self.deques[(window, stat)].front().copy()
+                elif stat == 'sum':
+                    value = sums.copy()
+                elif stat == 'mean':
+                    value = sums / window
+                else:
+                    # Phương sai mẫu từ tổng và tổng bình phương (chặn sai số làm tròn về 0)
+                    value = np.sqrt(np.maximum(squares - sums ** 2 / window, 0) / (window - 1))
+                features[f"rolling_{stat}_{window}"] = value
+        return features
+    
+    def _features(self, rows: np.ndarray, week: np.datetime64, rolling: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """Dòng features của tuần vừa nạp cho các hàng `rows` (rolling: thống kê rolling của mọi sản phẩm)"""
+        current = self.recent[rows, -1]
+        lags = {lag: self.recent[rows, -1 - lag] for lag in self.plan.lag_keys}
+        features: Dict[str, Any] = {f"lag_{lag}": lags[lag] for lag in self.plan.spec["lags"]}
+        features.update({name: values[rows] for name, values in rolling.items()})
+        
+        calendar = FeatureService.calendar(np.array([week]), self.plan.spec["calendar"])
+        cols = np.zeros(len(rows), dtype=np.int64)
+        return self.plan._frame(self.items[rows], calendar, cols, current, lags, features,
+                                self.last_index - self.first[rows])
+    
+    def _rows(self, item_codes: np.ndarray) -> np.ndarray:
+        """Chỉ số hàng của các mã sản phẩm (items đã sắp xếp nên tìm nhị phân), -1 nếu chưa có"""
+        rows = np.searchsorted(self.items, item_codes)
+        found = rows < self.num_products
+        found[found] = self.items[rows[found]] == item_codes[found]
+        return np.where(found, rows, -1)
+    
+    def _add_products(self, new_items: np.ndarray) -> None:
+        """Thêm sản phẩm mới (lịch sử toàn 0) rồi giữ các hàng sắp xếp theo ItemCode như panel"""
+        num_new = len(new_items)
+        items = np.concatenate([self.items, new_items.astype(object)])
+        order = np.argsort(items, kind='stable')
+        
+        self.items = items[order]
+        self.recent = np.vstack([self.recent, np.zeros((num_new, self.recent.shape[1]))])[order]
+        self.first = np.append(self.first, np.full(num_new, -1, dtype=np.int64))[order]
+        self.observed_weeks = np.append(self.observed_weeks, np.zeros(num_new, dtype=np.int64))[order]
+        for window in self.sums:
+            self.sums[window] = np.append(self.sums[window], np.zeros(num_new))[order]
+            self.squares[window] = np.append(self.squares[window], np.zeros(num_new))[order]
+        for deque in self.deques.values():
+            deque.extend(num_new, self.last_index)
+            deque.take(order)
+        print(f"🔄 Added {num_new} new products to feature state")
+    
+    def save(self, state_file: str) -> str:
+        """Lưu trạng thái (.npz) kèm spec để nạp lại ở lần refresh sau"""
+        arrays = {
+            "items": self.items.astype(str),
+            "recent": self.recent,
+            "first": self.first,
+            "observed_weeks": self.observed_weeks,
+            "meta": np.array(json.dumps({
+                "spec": self.plan.spec,
+                "next_week": str(self.next_week),
+                "last_index": self.last_index
+            }))
+        }
+        for window in self.sums:
+            arrays[f"sum_{window}"] = self.sums[window]
+            arrays[f"square_{window}"] = self.squares[window]
+        for (window, stat), deque in self.deques.items():
+            arrays[f"{stat}_{window}_values"] = deque.values
+            arrays[f"{stat}_{window}_weeks"] = deque.weeks
+            arrays[f"{stat}_{window}_size"] = deque.size
+        
+        tmp_file = f"{state_file}.{generate_id()}.tmp.npz"
+        np.savez(tmp_file, **arrays)
+        os.replace(tmp_file, state_file)
+        print(f"💾 Saved feature state ({self.num_products} products) to: {state_file}")
+        return state_file
+    
+    @classmethod
+    def load(cls, state_file: str) -> "FeatureState":
+        """Nạp trạng thái đã lưu bằng save()"""
+        with np.load(state_file) as arrays:
+            meta = json.loads(str(arrays["meta"]))
+            state = cls(FeatureService.compile(meta["spec"]), arrays["items"].astype(object),
+                        np.datetime64(meta["next_week"], 'D'), meta["last_index"])
+            state.recent = arrays["recent"]
+            state.first = arrays["first"]
+            state.observed_weeks = arrays["observed_weeks"]
+            for window in state.sums:
+                state.sums[window] = arrays[f"sum_{window}"]
+                state.squares[window] = arrays[f"square_{window}"]
+            for (window, stat), deque in state.deques.items():
+                deque.values = arrays[f"{stat}_{window}_values"]
+                deque.weeks = arrays[f"{stat}_{window}_weeks"]
+                deque.size = arrays[f"{stat}_{window}_size"]
+        return state
+
+class FeatureService:
+    """
+    Engine tạo features trên cả panel sản phẩm × tuần: không lặp theo sản phẩm, mỗi feature là một phép
+    toán trên ma trận rồi lấy ra các ô cần dùng (tuần có bán, đủ lịch sử, sản phẩm đủ số tuần bán)
+    
+    Spec (vd: TrainRequest.parameters["features"]), khóa nào không khai báo thì lấy theo DEFAULT_SPEC:
+        {
+            "lags": [1, 2, 4],
+            "rolling": [{"window": 2, "stats": ["mean", "std", "min", "max"]}],
+            "pct_change": [1, 4],
+            "calendar": ["week_of_year", "month", "quarter", "year", "day_of_week"],
+            "trend": false,
+            "min_observed_weeks": 10,
+            "exclude_current": false
+        }
+    
+    exclude_current: rolling và pct_change chỉ dùng các tuần trước tuần t (cửa sổ [t-w, t-1]) để không
+    chứa target của dòng; mặc định giữ cách tính cũ (cửa sổ [t-w+1, t])
+    """
+    
+    # Features đưa vào model với bộ mặc định (thứ tự cột của ma trận X)
+    FEATURE_COLS = [
+        'week_of_year', 'month', 'quarter', 'year',
+        'lag_1', 'lag_2', 'lag_3', 'lag_4',
+        'rolling_mean_4', 'rolling_std_4', 'rolling_min_4', 'rolling_max_4',
+        'trend', 'sin_week', 'cos_week', 'sin_month', 'cos_month'
+    ]
+    
+    MIN_OBSERVED_WEEKS = 10  # Bỏ qua sản phẩm có ít tuần bán
+    WINDOW = 4  # Số lag / độ dài cửa sổ rolling của bộ mặc định
+    
+    # Bộ features mặc định (sinh đúng FEATURE_COLS)
+    DEFAULT_SPEC = {
+        "lags": [1, 2, 3, 4],
+        "rolling": [{"window": WINDOW, "stats": ["mean", "std", "min", "max"]}],
+        "pct_change": [],
+        "calendar": ['week_of_year', 'month', 'quarter', 'year', 'sin_week', 'cos_week', 'sin_month', 'cos_month'],
+        "trend": True,
+        "min_observed_weeks": MIN_OBSERVED_WEEKS,
+        "exclude_current": False
+    }
+    
+    # Các mã hóa lịch hỗ trợ (giá trị số và dạng sin/cos)
+    CALENDAR = ('week_of_year', 'month', 'quarter', 'year', 'day_of_week')
+    CYCLICAL = ('sin_week', 'cos_week', 'sin_month', 'cos_month')
+    
+    # Thống kê trên cửa sổ rolling (mảng [số ô, window])
+    ROLLING_STATS = {
+        'mean': lambda windows: windows.mean(axis=1),
+        'std': lambda windows: windows.std(axis=1, ddof=1),
+        'min': lambda windows: windows.min(axis=1),
+        'max': lambda windows: windows.max(axis=1),
+        'sum': lambda windows: windows.sum(axis=1)
+    }
+    
+    # Tăng khi đổi cách tính features (feature store tự bỏ các bảng features tạo theo phiên bản cũ)
+    SPEC_VERSION = 1
+    
+    @classmethod
+    def normalize_spec(cls, spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Kiểm tra spec và đưa về dạng chuẩn (bổ sung giá trị mặc định, lag/cửa sổ sắp xếp và không trùng)"""
+        spec = spec or {}
+        unknown = set(spec) - set(cls.DEFAULT_SPEC)
+        if unknown:
+            raise ValueError(f"Unknown feature spec keys: {sorted(unknown)}")
+        merged = {**cls.DEFAULT_SPEC, **spec}
+        
+        def periods(key: str) -> List[int]:
+            values = merged[key]
+            if not isinstance(values, list) or not all(isinstance(v, int) and v >= 1 for v in values):
+                raise ValueError(f"Feature spec '{key}' must be a list of positive integers")
+            return sorted(set(values))
+        
+        # Các khai báo cùng cửa sổ được gộp lại để chỉ gom cửa sổ một lần
+        rolling: Dict[int, List[str]] = {}
+        for item in merged["rolling"]:
+            if not isinstance(item, dict):
+                raise ValueError("Rolling items must look like {\"window\": 4, \"stats\": [\"mean\", \"std\"]}")
+            window, stats = item.get("window"), item.get("stats", list(cls.ROLLING_STATS))
+            if not isinstance(window, int) or window < 2:
+                raise ValueError("Rolling window must be an integer >= 2")
+            unknown_stats = set(stats) - set(cls.ROLLING_STATS)
+            if unknown_stats:
+                raise ValueError(f"Unknown rolling stats: {sorted(unknown_stats)} (supported: {list(cls.ROLLING_STATS)})")
+            window_stats = rolling.setdefault(window, [])
+            window_stats.extend(stat for stat in stats if stat not in window_stats)
+        
+        unknown_calendar = set(merged["calendar"]) - set(cls.CALENDAR) - set(cls.CYCLICAL)
+        if unknown_calendar:
+            raise ValueError(f"Unknown calendar encodings: {sorted(unknown_calendar)} "
+                             f"(supported: {list(cls.CALENDAR + cls.CYCLICAL)})")
+        
+        min_observed = merged["min_observed_weeks"]
+        if not isinstance(min_observed, int) or min_observed < 1:
+            raise ValueError("Feature spec 'min_observed_weeks' must be a positive integer")
+        
+        normalized = {
+            "lags": periods("lags"),
+            "rolling": [{"window": window, "stats": rolling[window]} for window in sorted(rolling)],
+            "pct_change": periods("pct_change"),
+            "calendar": list(dict.fromkeys(merged["calendar"])),
+            "trend": bool(merged["trend"]),
+            "min_observed_weeks": min_observed,
+            "exclude_current": bool(merged["exclude_current"])
+        }
+        if not any([normalized["lags"], normalized["rolling"], normalized["pct_change"],
+                    normalized["calendar"], normalized["trend"]]):
+            raise ValueError("Feature spec selects no features")
+        return normalized
+    
+    @classmethod
+    def compile(cls, spec: Optional[Dict[str, Any]] = None) -> FeaturePlan:
+        """Biên dịch spec thành FeaturePlan (spec giống nhau dùng lại plan đã biên dịch)"""
+        return cls._compile(json.dumps(cls.normalize_spec(spec), sort_keys=True))
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _compile(spec_json: str) -> FeaturePlan:
+        return FeaturePlan(json.loads(spec_json))
+    
+    @classmethod
+    def spec(cls, spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Định nghĩa features đã chuẩn hóa kèm phiên bản engine"""
+        return {"version": cls.SPEC_VERSION, **cls.normalize_spec(spec)}
+    
+    @classmethod
+    def spec_hash(cls, spec: Optional[Dict[str, Any]] = None) -> str:
+        """Hash ngắn của định nghĩa features, dùng làm khóa trong feature store"""
+        return hashlib.sha256(json.dumps(cls.spec(spec), sort_keys=True).encode()).hexdigest()[:16]
+    
+    @staticmethod
+    def calendar(weeks: np.ndarray, encodings: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Features theo lịch của từng tuần trong panel (tính một lần cho mỗi cột tuần, chỉ các mã hóa cần dùng)"""
+        encodings = set(FeatureService.CALENDAR + FeatureService.CYCLICAL if encodings is None else encodings)
+        index = pd.DatetimeIndex(weeks.astype('datetime64[ns]'))
+        calendar = {'Week': index}
+        
+        if encodings & {'week_of_year', 'sin_week', 'cos_week'}:
+            week_of_year = index.isocalendar().week.to_numpy(dtype=np.int64)
+            calendar['week_of_year'] = week_of_year
+            calendar['sin_week'] = np.sin(2 * np.pi * week_of_year / 52)
+            calendar['cos_week'] = np.cos(2 * np.pi * week_of_year / 52)
+        if encodings & {'month', 'sin_month', 'cos_month'}:
+            month = index.month.to_numpy()
+            calendar['month'] = month
+            calendar['sin_month'] = np.sin(2 * np.pi * month / 12)
+            calendar['cos_month'] = np.cos(2 * np.pi * month / 12)
+        if 'quarter' in encodings:
+            calendar['quarter'] = index.quarter.to_numpy()
+        if 'year' in encodings:
+            calendar['year'] = index.year.to_numpy()
+        if 'day_of_week' in encodings:
+            calendar['day_of_week'] = index.dayofweek.to_numpy()
+        return calendar
+    
+    @classmethod
+    def build(cls, panel: DemandPanel, spec: Optional[Dict[str, Any]] = None,
+              all_weeks: bool = False) -> Optional[pd.DataFrame]:
+        """Bảng features của tất cả sản phẩm theo spec (mặc định: bộ features của XGBoostModel)"""
+        return cls.compile(spec).build(panel, all_weeks)
+    
+    @classmethod
+    def state(cls, panel: DemandPanel, spec: Optional[Dict[str, Any]] = None) -> FeatureState:
+        """Trạng thái rolling sau tuần cuối của panel, dùng update() để tạo features cho từng tuần mới"""
+        return cls.compile(spec).state(panel)
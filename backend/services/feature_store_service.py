@@ -0,0 +1,258 @@
+"""
+Feature Store Service - Lưu bảng features của XGBoost dạng cột (Arrow IPC), khóa theo (hash dataset, phiên bản features)
+"""
+
+import os
+import re
+import json
+import shutil
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from services.feature_service import FeatureService, FeatureState
+from services.panel_service import DemandPanel, panel_service
+from services.raw_cache_service import RawCacheService
+from utils.helpers import generate_id, ensure_dir
+from config.settings import settings
+
+class FeatureStoreService:
+    """
+    Bảng features được tạo một lần cho mỗi (dataset, spec features) rồi đọc lại bằng memory-map
+    File đã xử lý đặt tên theo hash nội dung nên append (tạo file mới) tự dùng khóa mới; mỗi spec có
+    một bảng riêng, khi đổi cách tính features (SPEC_VERSION) các bảng của phiên bản cũ bị xóa.
+    Cạnh mỗi bảng lưu FeatureState sau tuần cuối, để append chỉ cần tính features của các tuần mới.
+    """
+    
+    PROCESSED_NAME = re.compile(r"^weekly_demand_([0-9a-f]{64})\.csv$")
+    EXTENSION = ".arrow"
+    STATE_EXTENSION = ".state.npz"
+    
+    def __init__(self, store_dir: Optional[str] = None):
+        self.store_dir = store_dir or settings.FEATURE_STORE_PATH
+        ensure_dir(self.store_dir)
+    
+    def dataset_hash(self, processed_file: str) -> Optional[str]:
+        """Hash nội dung của file đã xử lý (lấy từ tên file, file tên cũ thì băm nội dung)"""
+        match = self.PROCESSED_NAME.match(os.path.basename(processed_file))
+        if match:
+            return match.group(1)
+        if os.path.exists(processed_file):
+            return RawCacheService.file_hash(processed_file)
+        return None
+    
+    @staticmethod
+    def _version_prefix() -> str:
+        return f"v{FeatureService.SPEC_VERSION}_"
+    
+    def feature_file(self, dataset_hash: str, spec: Optional[Dict[str, Any]] = None) -> str:
+        """Đường dẫn bảng features: {store}/{hash dataset}/v{SPEC_VERSION}_{spec_hash}.arrow"""
+        file_name = f"{self._version_prefix()}{FeatureService.spec_hash(spec)}{self.EXTENSION}"
+        return os.path.join(self.store_dir, dataset_hash, file_name)
+    
+    def state_file(self, feature_file: str) -> str:
+        """Đường dẫn FeatureState lưu cạnh bảng features"""
+        return feature_file[:-len(self.EXTENSION)] + self.STATE_EXTENSION
+    
+    def table(self, processed_file: str,
+              spec: Optional[Dict[str, Any]] = None) -> Tuple[Optional[pa.Table], Dict[str, Any]]:
+        """
+        Bảng Arrow (memory-map) của dataset theo spec, tạo và lưu nếu chưa có
+        Kèm thông tin có dùng lại bảng đã lưu hay không (hit, file, spec, seconds)
+        """
+        dataset_hash = self.dataset_hash(processed_file)
+        feature_file = self.feature_file(dataset_hash, spec)
+        
+        hit = os.path.exists(feature_file)
+        start = time.perf_counter()
+        if hit:
+            table = self._read_table(feature_file)
+        else:
+            table = self._build(processed_file, feature_file, spec)
+        
+        info = {
+            "hit": hit,
+            "file": feature_file,
+            "spec": FeatureService.spec_hash(spec),
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+        if table is not None:
+            print(f"{'⚡ Feature store hit' if hit else '💾 Feature store built'}: {feature_file} ({table.num_rows} rows)")
+        return table, info
+    
+    def load(self, processed_file: str, spec: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+        """
+        Bảng features của dataset theo spec (giống XGBoostModel.create_features); tạo và lưu nếu chưa có
+        df.attrs['feature_store'] cho biết có dùng lại bảng đã lưu hay không
+        """
+        table, info = self.table(processed_file, spec)
+        if table is None:
+            return None
+        
+        df = table.to_pandas(split_blocks=True)
+        df.attrs['feature_store'] = info
+        return df
+    
+    @staticmethod
+    def product_offsets(table: pa.Table) -> Dict[str, List[int]]:
+        """[start, stop) các dòng của từng ItemCode trong bảng (theo thứ tự sản phẩm của bảng)"""
+        return json.loads(table.schema.metadata[b'offsets'])
+    
+    def iter_products(self, processed_file: str, item_codes: Optional[List[str]] = None,
+                      spec: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """(ItemCode, bảng features) của từng sản phẩm, cắt trên bảng memory-map (worker train chỉ đọc phần của mình)"""
+        table, _ = self.table(processed_file, spec)
+        if table is None:
+            return
+        
+        offsets = self.product_offsets(table)
+        for item_code in (offsets if item_codes is None else item_codes):
+            if item_code in offsets:
+                start, stop = offsets[item_code]
+                yield item_code, table.slice(start, stop - start).to_pandas(split_blocks=True)
+    
+    def load_product(self, processed_file: str, item_code: str,
+                     spec: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+        """Các dòng features của một sản phẩm (dùng khi predict), cắt trực tiếp trên bảng memory-map"""
+        feature_file = self.feature_file(self.dataset_hash(processed_file), spec)
+        if not os.path.exists(feature_file):
+            self.load(processed_file, spec)
+            if not os.path.exists(feature_file):
+                return None
+        
+        table = self._read_table(feature_file)
+        offsets = self.product_offsets(table)
+        if item_code not in offsets:
+            return None
+        start, stop = offsets[item_code]
+        return table.slice(start, stop - start).to_pandas(split_blocks=True)
+    
+    def invalidate(self, processed_file: str) -> None:
+        """Xóa mọi bảng features của một file đã xử lý (vd: khi file bị xóa sau append/delete dataset)"""
+        dataset_hash = self.dataset_hash(processed_file)
+        dataset_dir = os.path.join(self.store_dir, dataset_hash) if dataset_hash else None
+        if dataset_dir and os.path.isdir(dataset_dir):
+            shutil.rmtree(dataset_dir, ignore_errors=True)
+            print(f"🗑️ Removed feature store entries: {dataset_dir}")
+    
+    def refresh(self, previous_file: str, processed_file: str) -> List[str]:
+        """
+        Sau append: tạo bảng features của file mới từ các bảng đã có của file cũ, chỉ tính features của các
+        tuần mới bằng FeatureState.update (O(số sản phẩm) mỗi tuần) thay vì tính lại toàn bộ lịch sử
+        Chỉ áp dụng khi file mới giữ nguyên các tuần cũ và chỉ thêm tuần sau tuần cuối; ngược lại
+        (delta sửa tuần cũ, sản phẩm mới có lịch sử cũ) bảng của file mới được tạo lại khi cần.
+        Trả về các bảng đã tạo.
+        """
+        previous_hash = self.dataset_hash(previous_file)
+        previous_dir = os.path.join(self.store_dir, previous_hash) if previous_hash else None
+        if previous_dir is None or not os.path.isdir(previous_dir):
+            return []
+        
+        previous = panel_service.load(previous_file)
+        panel = panel_service.load(processed_file)
+        if not self._extends(previous, panel):
+            print("📋 Appended data changes existing weeks, feature tables will be rebuilt on demand")
+            return []
+        
+        refreshed = []
+        dataset_hash = self.dataset_hash(processed_file)
+        for name in sorted(os.listdir(previous_dir)):
+            if not (name.startswith(self._version_prefix()) and name.endswith(self.EXTENSION)):
+                continue
+            previous_file_path = os.path.join(previous_dir, name)
+            previous_table = self._read_table(previous_file_path)
+            spec = json.loads(previous_table.schema.metadata[b'spec'])
+            spec.pop("version")  # Bảng cùng prefix phiên bản: spec còn lại là spec đã chuẩn hóa
+            feature_file = self.feature_file(dataset_hash, spec)
+            if os.path.exists(feature_file):
+                continue
+            
+            start = time.perf_counter()
+            state_file = self.state_file(previous_file_path)
+            state = FeatureState.load(state_file) if os.path.exists(state_file) else FeatureService.state(previous, spec)
+            
+            # Nạp từng tuần mới; sản phẩm mới (không bán ở các tuần cũ) được thêm vào trạng thái
+            rows = [
+                state.update(pd.Series(panel.values[:, week], index=panel.items))
+                for week in range(previous.num_weeks, panel.num_weeks)
+            ]
+            
+            # Giữ thứ tự (sản phẩm, tuần) của bảng: dòng tuần mới xếp sau các dòng cũ của cùng sản phẩm
+            features = pd.concat([previous_table.to_pandas(), *rows], ignore_index=True)
+            order = np.argsort(features['ItemCode'].to_numpy(dtype=object), kind='stable')
+            self._write(features.iloc[order].reset_index(drop=True), feature_file, spec, state)
+            refreshed.append(feature_file)
+            print(f"⚡ Feature table refreshed with {panel.num_weeks - previous.num_weeks} new weeks in "
+                  f"{time.perf_counter() - start:.3f}s: {feature_file}")
+        return refreshed
+    
+    @staticmethod
+    def _extends(previous: DemandPanel, panel: DemandPanel) -> bool:
+        """panel chỉ thêm tuần sau tuần cuối của previous (cùng tuần đầu, các tuần cũ giữ nguyên giá trị)"""
+        num_weeks = previous.num_weeks
+        if num_weeks == 0 or panel.num_weeks <= num_weeks or panel.weeks[0] != previous.weeks[0]:
+            return False
+        
+        rows = np.searchsorted(panel.items, previous.items)
+        if (rows >= panel.num_products).any() or not np.array_equal(panel.items[rows], previous.items):
+            return False
+        
+        # Sản phẩm chỉ có trong panel mới phải không bán ở các tuần cũ
+        expected = np.zeros((panel.num_products, num_weeks), dtype=panel.values.dtype)
+        expected[rows] = previous.values
+        return np.array_equal(panel.values[:, :num_weeks], expected)
+    
+    @staticmethod
+    def _read_table(feature_file: str) -> pa.Table:
+        """Đọc bảng Arrow IPC bằng memory-map (không copy các cột số vào bộ nhớ)"""
+        return pa.ipc.open_file(pa.memory_map(feature_file, 'r')).read_all()
+    
+    def _build(self, processed_file: str, feature_file: str,
+               spec: Optional[Dict[str, Any]] = None) -> Optional[pa.Table]:
+        """Tạo bảng features từ panel, ghi file (kèm vị trí dòng của từng sản phẩm) rồi đọc lại bằng memory-map"""
+        panel = panel_service.load(processed_file)
+        features = FeatureService.build(panel, spec)
+        if features is None:
+            return None
+        return self._write(features, feature_file, spec, FeatureService.state(panel, spec))
+        
+    def _write(self, features: pd.DataFrame, feature_file: str, spec: Optional[Dict[str, Any]],
+               state: FeatureState) -> pa.Table:
+        """Ghi bảng features (kèm vị trí dòng của từng sản phẩm) và FeatureState cạnh bảng, rồi đọc lại bằng memory-map"""
+        # Bảng đã sắp xếp theo sản phẩm: lưu [start, stop) của từng ItemCode để cắt nhanh khi predict
+        item_codes = features['ItemCode'].to_numpy()
+        starts = np.concatenate([[0], np.flatnonzero(item_codes[1:] != item_codes[:-1]) + 1])
+        stops = np.append(starts[1:], len(item_codes))
+        offsets = {str(item_codes[start]): [int(start), int(stop)] for start, stop in zip(starts, stops)}
+        
+        table = pa.Table.from_pandas(features, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'offsets': json.dumps(offsets).encode(),
+            b'spec': json.dumps(FeatureService.spec(spec)).encode()
+        })
+        
+        # Ghi file tạm rồi đổi tên; bỏ các bảng tạo theo phiên bản engine features cũ
+        dataset_dir = os.path.dirname(feature_file)
+        ensure_dir(dataset_dir)
+        tmp_file = os.path.join(dataset_dir, f"{generate_id()}{self.EXTENSION}.tmp")
+        with pa.OSFile(tmp_file, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_file, feature_file)
+        state.save(self.state_file(feature_file))
+        
+        for name in os.listdir(dataset_dir):
+            stale = os.path.join(dataset_dir, name)
+            stored = name.endswith(self.EXTENSION) or name.endswith(self.STATE_EXTENSION)
+            if stored and not name.startswith(self._version_prefix()):
+                os.remove(stale)
+                print(f"🗑️ Removed stale feature table: {stale}")
+        
+        return self._read_table(feature_file)
+
+# Instance dùng chung (training, prediction)
+feature_store = FeatureStoreService()
@@ -0,0 +1,222 @@
+"""
+Ingestion Service - Chạy xử lý dataset (upload/append) trong process pool, không chặn event loop
+"""
+
+import os
+import time
+import traceback
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, Optional, Callable, List
+
+from services.data_service import DataService
+from services.catalog_service import catalog
+from utils.helpers import generate_id, get_timestamp, ensure_dir, save_json, load_json
+from config.settings import settings
+
+class ProgressReporter:
+    """Ghi tiến độ ingestion ra file JSON (chạy trong worker process)"""
+    
+    # Khoảng thời gian tối thiểu giữa hai lần ghi trong cùng một bước
+    MIN_INTERVAL_SECONDS = 0.5
+    
+    def __init__(self, progress_file: str):
+        self.progress_file = progress_file
+        self.stage = None
+        self.stage_started = time.perf_counter()
+        self.last_write = 0.0
+        self.rows_read = None
+        self.total_rows = None
+        self.started_at = get_timestamp()
+    
+    def __call__(self, stage: str, rows_read: Optional[int] = None, total_rows: Optional[int] = None):
+        now = time.perf_counter()
+        if stage != self.stage:
+            self.stage = stage
+            self.stage_started = now
+        elif now - self.last_write < self.MIN_INTERVAL_SECONDS and (rows_read is None or rows_read != total_rows):
+            return
+        self.last_write = now
+        
+        elapsed = now - self.stage_started
+        rows_per_second = rows_read / elapsed if rows_read and elapsed > 0 else None
+        eta_seconds = None
+        if rows_per_second and total_rows:
+            eta_seconds = round(max(total_rows - rows_read, 0) / rows_per_second, 1)
+        
+        # Các bước sau khi đọc xong không báo số dòng: giữ lại giá trị đã biết
+        self.rows_read = rows_read if rows_read is not None else self.rows_read
+        self.total_rows = total_rows if total_rows is not None else self.total_rows
+        
+        progress = {
+            "stage": stage,
+            "rows_read": self.rows_read,
+            "total_rows": self.total_rows,
+            "rows_per_second": round(rows_per_second, 1) if rows_per_second else None,
+            "eta_seconds": eta_seconds,
+            "started_at": self.started_at,
+            "updated_at": get_timestamp()
+        }
+        
+        # Ghi qua file tạm để bên đọc không thấy JSON dở dang
+        tmp_file = f"{self.progress_file}.tmp"
+        save_json(progress, tmp_file)
+        os.replace(tmp_file, self.progress_file)
+
+def run_ingestion(kind: str, file_path: str, progress_file: str, chunksize: Optional[int] = None,
+                  processed_file: Optional[str] = None, pending_file: Optional[str] = None,
+                  content_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Hàm chạy trong worker process: xử lý file upload hoặc append delta"""
+    reporter = ProgressReporter(progress_file)
+    reporter("started")
+    
+    data_service = DataService()
+    if kind == "upload":
+        result = data_service.process_raw_data(file_path, chunksize, reporter, content_hash)
+    elif kind == "append":
+        result = data_service.append_raw_data(file_path, processed_file, pending_file, chunksize, reporter,
+                                              content_hash)
+    else:
+        raise ValueError(f"Unsupported ingestion kind: {kind}")
+    
+    # Không gửi toàn bộ bản ghi weekly_demand ngược về process chính
+    result.pop("data", None)
+    return result
+
+class IngestionBusyError(RuntimeError):
+    """Dataset đang có ingestion job chưa xong (các lần append vào một dataset phải chạy lần lượt)"""
+
+class IngestionService:
+    """
+    Quản lý các ingestion job: submit vào process pool, theo dõi trạng thái và tiến độ
+    Trạng thái job lưu trong catalog (bảng ingestion_jobs) nên vẫn xem được sau khi server khởi động lại
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or settings.INGEST_WORKERS
+        self.progress_dir = settings.INGEST_PROGRESS_PATH
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        ensure_dir(self.progress_dir)
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Tạo process pool khi có job đầu tiên"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def active_job(self, dataset_id: str) -> Optional[str]:
+        """job_id của ingestion job đang chờ/đang chạy của dataset (None nếu không có)"""
+        for status in ("pending", "running"):
+            jobs = catalog.list("ingestion_jobs", where={"dataset_id": dataset_id, "status": status}, limit=1)
+            if jobs:
+                return jobs[0]["id"]
+        return None
+    
+    def submit(self, kind: str, dataset_id: str, file_path: str, filename: str,
+               on_complete: Callable[[Dict[str, Any]], None], exclusive: bool = False, **kwargs) -> str:
+        """
+        Đưa một ingestion job vào hàng đợi và trả về job_id ngay
+        on_complete(result) được gọi khi worker xử lý thành công (để tạo/cập nhật bản ghi dataset)
+        exclusive: báo IngestionBusyError nếu dataset còn job chưa xong (job append đọc processed_file hiện tại
+        của dataset, chạy song song thì job xong sau sẽ ghi đè kết quả của job kia); job chỉ xong sau on_complete
+        """
+        job_id = generate_id()
+        progress_file = os.path.join(self.progress_dir, f"{job_id}.json")
+        
+        with self._lock:
+            active = self.active_job(dataset_id) if exclusive else None
+            if active is not None:
+                raise IngestionBusyError(f"Dataset {dataset_id} already has an ingestion job in progress ({active})")
+            catalog.put("ingestion_jobs", {
+                "id": job_id,
+                "kind": kind,
+                "dataset_id": dataset_id,
+                "filename": filename,
+                "status": "pending",
+                "created_at": get_timestamp(),
+                "started_at": None,
+                "completed_at": None,
+                "progress": None,
+                "result": None,
+                "error": None
+            })
+        
+        future = self._get_executor().submit(
+            run_ingestion, kind, file_path, progress_file, settings.INGEST_CHUNK_SIZE, **kwargs
+        )
+        future.add_done_callback(lambda f: self._on_done(job_id, progress_file, on_complete, f))
+        
+        print(f"📥 Ingestion job {job_id} ({kind}) queued for dataset {dataset_id}")
+        return job_id
+    
+    def _on_done(self, job_id: str, progress_file: str,
+                 on_complete: Callable[[Dict[str, Any]], None], future: Future) -> None:
+        """Cập nhật trạng thái job khi worker xong"""
+        job = catalog.get("ingestion_jobs", job_id)
+        progress = self._read_progress(progress_file) or job["progress"]
+        fields = {}
+        try:
+            result = future.result()
+            if not result["success"]:
+                raise ValueError(f"Lỗi xử lý dữ liệu: {result['error']}")
+            
+            on_complete(result)
+            
+            if progress:
+                progress["stage"] = "completed"
+                progress["eta_seconds"] = 0
+            fields.update(status="completed", result={"stats": result["stats"], "delta": result.get("delta")})
+            print(f"✅ Ingestion job {job_id} completed")
+        except Exception as e:
+            print(f"❌ Ingestion job {job_id} failed: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            fields.update(status="failed", error=str(e))
+        finally:
+            with self._lock:
+                catalog.update("ingestion_jobs", job_id, progress=progress, completed_at=get_timestamp(),
+                               started_at=job["started_at"] or (progress or {}).get("started_at"), **fields)
+            if os.path.exists(progress_file):
+                os.remove(progress_file)
+    
+    @staticmethod
+    def _read_progress(progress_file: str) -> Optional[Dict[str, Any]]:
+        """Đọc tiến độ worker đã ghi (nếu có)"""
+        try:
+            return load_json(progress_file)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Trạng thái job kèm tiến độ mới nhất (số dòng đã đọc, bước, ETA)"""
+        job = catalog.get("ingestion_jobs", job_id)
+        if job is None:
+            return None
+        
+        if job["status"] in ("pending", "running"):
+            progress = self._read_progress(os.path.join(self.progress_dir, f"{job_id}.json"))
+            if progress and progress != job["progress"]:
+                with self._lock:
+                    # Đọc lại trong lock: _on_done có thể vừa ghi trạng thái cuối
+                    job = catalog.get("ingestion_jobs", job_id)
+                    if job["status"] in ("pending", "running"):
+                        job = catalog.update("ingestion_jobs", job_id, progress=progress, status="running",
+                                             started_at=job["started_at"] or progress["started_at"])
+        return job
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Danh sách ingestion job"""
+        return [self.get_job(job["id"]) for job in catalog.list("ingestion_jobs")]
+    
+    def shutdown(self) -> None:
+        """Dừng process pool khi tắt server"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Instance dùng chung cho các routers
+ingestion_service = IngestionService()
@@ -0,0 +1,146 @@
+"""
+Panel Service - Dữ liệu nhu cầu dạng panel dày sản phẩm × tuần (NumPy float32), lưu .npy để memory-map
+"""
+
+import os
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.helpers import generate_id, save_json, load_json
+from services.demand_loader_service import DemandLoaderService
+
+class DemandPanel:
+    """
+    Ma trận values[sản phẩm, tuần] float32 trên các tuần liên tiếp (tuần không bán = 0)
+    items là mã sản phẩm theo thứ tự hàng, weeks là ngày thứ Hai đầu mỗi tuần (datetime64[D])
+    """
+    
+    DTYPE = np.float32
+    
+    def __init__(self, values: np.ndarray, items: np.ndarray, start_week: np.datetime64):
+        self.values = values
+        self.items = items
+        self.weeks = np.datetime64(start_week, 'D') + 7 * np.arange(values.shape[1])
+        self._rows = None
+    
+    @property
+    def num_products(self) -> int:
+        return self.values.shape[0]
+    
+    @property
+    def num_weeks(self) -> int:
+        return self.values.shape[1]
+    
+    @classmethod
+    def from_weekly(cls, weekly_demand: pd.DataFrame) -> "DemandPanel":
+        """Dựng panel từ bảng dài (ItemCode, Week, TotalQuantity); mỗi cặp (ItemCode, Week) xuất hiện một lần"""
+        if weekly_demand.empty:
+            return cls(np.zeros((0, 0), dtype=cls.DTYPE), np.array([], dtype=object), np.datetime64('1970-01-05'))
+        
+        item_codes, items = pd.factorize(weekly_demand['ItemCode'].astype(str), sort=True)
+        days = pd.to_datetime(weekly_demand['Week']).to_numpy().astype('datetime64[D]')
+        start_week = days.min()
+        week_idx = ((days - start_week).astype(np.int64) // 7)
+        
+        values = np.zeros((len(items), int(week_idx.max()) + 1), dtype=cls.DTYPE)
+        values[item_codes, week_idx] = weekly_demand['TotalQuantity'].to_numpy()
+        return cls(values, np.asarray(items, dtype=object), start_week)
+    
+    def row(self, item_code: str) -> Optional[int]:
+        """Chỉ số hàng của một sản phẩm (None nếu không có)"""
+        if self._rows is None:
+            self._rows = {item: i for i, item in enumerate(self.items)}
+        return self._rows.get(item_code)
+    
+    def observed(self) -> np.ndarray:
+        """Mặt nạ các ô có giao dịch (weekly_demand chỉ chứa tổng dương nên ô 0 là tuần không bán)"""
+        return self.values > 0
+    
+    def active_range(self, row: int) -> Optional[Tuple[int, int]]:
+        """Khoảng tuần [first, last] từ tuần bán đầu tiên đến tuần bán cuối cùng của sản phẩm"""
+        observed = np.flatnonzero(self.values[row] > 0)
+        if len(observed) == 0:
+            return None
+        return int(observed[0]), int(observed[-1])
+    
+    def observed_series(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(tuần, số lượng) của các tuần có bán của một sản phẩm - giống các dòng trong weekly_demand"""
+        observed = np.flatnonzero(self.values[row] > 0)
+        return self.weeks[observed], self.values[row, observed]
+    
+    def to_weekly(self) -> pd.DataFrame:
+        """Chuyển ngược về bảng dài (ItemCode, Week, TotalQuantity) chỉ gồm các ô có bán"""
+        rows, cols = np.nonzero(self.values > 0)
+        return pd.DataFrame({
+            'ItemCode': self.items[rows],
+            'Week': self.weeks[cols].astype('datetime64[ns]'),
+            'TotalQuantity': self.values[rows, cols]
+        })
+    
+    def describe(self) -> Dict[str, Any]:
+        """Kích thước, mật độ và bộ nhớ của panel"""
+        observed = int(np.count_nonzero(self.values > 0))
+        cells = self.values.size
+        return {
+            "products": self.num_products,
+            "weeks": self.num_weeks,
+            "observed_points": observed,
+            "density": round(observed / cells, 4) if cells else 0.0,
+            "memory_mb": round(self.values.nbytes / (1024 * 1024), 3),
+            "start_week": str(self.weeks[0]) if self.num_weeks else None
+        }
+
+class PanelService:
+    """Ghi/đọc panel cạnh file weekly_demand đã xử lý ({tên file}.panel.npy và .panel.json)"""
+    
+    @staticmethod
+    def panel_files(processed_file: str) -> Tuple[str, str]:
+        """(file .npy chứa values, file .json chứa items và tuần đầu) ứng với file đã xử lý"""
+        stem = os.path.splitext(processed_file)[0]
+        return f"{stem}.panel.npy", f"{stem}.panel.json"
+    
+    def save(self, panel: DemandPanel, processed_file: str) -> str:
+        """Lưu panel; file đã xử lý đặt tên theo hash nội dung nên panel đã có thì không ghi lại"""
+        values_file, index_file = self.panel_files(processed_file)
+        if os.path.exists(values_file) and os.path.exists(index_file):
+            return values_file
+        
+        # Tên file tạm riêng cho mỗi lần ghi (hai worker cùng lưu một panel không ghi đè lên nhau);
+        # index thay thế sau cùng: đã thấy index thì values chắc chắn đã ghi xong
+        tmp_id = generate_id()
+        tmp_values = f"{values_file}.{tmp_id}.tmp.npy"
+        tmp_index = f"{index_file}.{tmp_id}.tmp"
+        try:
+            np.save(tmp_values, panel.values)
+            save_json({
+                "items": [str(item) for item in panel.items],
+                "start_week": str(panel.weeks[0]) if panel.num_weeks else None,
+                "num_weeks": panel.num_weeks
+            }, tmp_index)
+            os.replace(tmp_values, values_file)
+            os.replace(tmp_index, index_file)
+        finally:
+            for tmp_file in (tmp_values, tmp_index):
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+        print(f"✅ Saved demand panel {panel.values.shape} to: {values_file}")
+        return values_file
+    
+    def load(self, processed_file: str, mmap: bool = True) -> DemandPanel:
+        """
+        Đọc panel của file đã xử lý (memory-map, chỉ đọc); dataset cũ chưa có panel thì dựng từ CSV và lưu lại
+        """
+        values_file, index_file = self.panel_files(processed_file)
+        if not (os.path.exists(values_file) and os.path.exists(index_file)):
+            print(f"🔄 Building demand panel for: {processed_file}")
+            self.save(DemandPanel.from_weekly(DemandLoaderService().load_weekly(processed_file)), processed_file)
+        
+        index = load_json(index_file)
+        values = np.load(values_file, mmap_mode='r' if mmap else None)
+        start_week = np.datetime64(index["start_week"] or '1970-01-05', 'D')
+        return DemandPanel(values, np.asarray(index["items"], dtype=object), start_week)
+
+# Instance dùng chung
+panel_service = PanelService()
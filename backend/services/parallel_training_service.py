@@ -0,0 +1,104 @@
+"""
+Parallel Training Service - Chia các sản phẩm thành nhóm và train song song trong process pool
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+
+# Kết quả train một sản phẩm: (ItemCode, metrics hoặc None, lỗi hoặc None)
+ProductResult = Tuple[str, Optional[Dict[str, float]], Optional[str]]
+
+class ParallelTrainingService:
+    """
+    Chạy hàm train theo nhóm sản phẩm: tuần tự trong process hiện tại (1 worker) hoặc song song trong
+    process pool. Hàm train nhận danh sách ItemCode làm tham số vị trí cuối (và keyword checkpoint), trả về
+    list[ProductResult] theo đúng thứ tự đó (ngắn hơn nếu job bị hủy giữa chừng); kết quả các nhóm được ghép
+    lại theo thứ tự sản phẩm ban đầu nên metrics và file kết quả giống hệt chế độ tuần tự.
+    """
+    
+    # Số nhóm cho mỗi worker (nhóm nhỏ hơn giúp chia tải đều khi thời gian train từng sản phẩm chênh lệch)
+    CHUNKS_PER_WORKER = 4
+    
+    @staticmethod
+    def resolve_workers(workers: Optional[int] = None) -> int:
+        """Số worker thực tế: mặc định TRAIN_WORKERS, giá trị <= 0 nghĩa là dùng mọi CPU"""
+        workers = settings.TRAIN_WORKERS if workers is None else int(workers)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        return workers
+    
+    def run(self, train_chunk: Callable[..., List[ProductResult]], item_codes: List[str], *args,
+            workers: Optional[int] = None, checkpoint=None, cancel=None) -> List[ProductResult]:
+        """
+        Gọi train_chunk(*args, nhóm ItemCode, checkpoint=checkpoint) cho mọi sản phẩm và trả về kết quả theo thứ
+        tự item_codes. Có checkpoint (TrainingCheckpoint) thì bỏ qua các sản phẩm đã checkpoint ở lần chạy trước
+        và ghép lại kết quả của chúng; train_chunk ghi từng sản phẩm vào checkpoint và dừng khi job bị hủy.
+        cancel: checkpoint chỉ dùng làm cờ hủy (truyền cho train_chunk, không đọc/ghi kết quả từng sản phẩm),
+        cho các job mà kết quả sản phẩm không dùng lại được khi chạy lại (tuning, backtest).
+        """
+        if checkpoint is None and cancel is not None:
+            return self._run(train_chunk, list(item_codes), args, workers, cancel)
+        
+        done = checkpoint.load() if checkpoint is not None else {}
+        remaining = [item_code for item_code in item_codes if item_code not in done]
+        if done:
+            print(f"🔄 Resuming from checkpoint: {len(done)} products done, {len(remaining)} remaining")
+        if checkpoint is not None:
+            checkpoint.start(len(item_codes), len(item_codes) - len(remaining))
+        
+        by_item = {**done, **{result[0]: result for result in self._run(train_chunk, remaining, args, workers,
+                                                                         checkpoint)}}
+        return [by_item[item_code] for item_code in item_codes if item_code in by_item]
+    
+    def _run(self, train_chunk: Callable[..., List[ProductResult]], item_codes: List[str], args,
+             workers: Optional[int], checkpoint) -> List[ProductResult]:
+        """Chạy các sản phẩm chưa xong: tuần tự hoặc chia nhóm cho process pool"""
+        if not item_codes:
+            return []
+        workers = min(self.resolve_workers(workers), len(item_codes))
+        if workers <= 1:
+            return train_chunk(*args, list(item_codes), checkpoint=checkpoint)
+        
+        chunks = [list(chunk) for chunk in np.array_split(np.asarray(item_codes, dtype=object),
+                                                           min(workers * self.CHUNKS_PER_WORKER, len(item_codes)))]
+        print(f"⚡ Training {len(item_codes)} products in {len(chunks)} chunks on {workers} worker processes")
+        
+        chunk_results: List[List[ProductResult]] = [[] for _ in chunks]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(train_chunk, *args, chunk, checkpoint=checkpoint): index
+                       for index, chunk in enumerate(chunks)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                try:
+                    chunk_results[index] = future.result()
+                except Exception as e:
+                    # Worker chết giữa chừng: chỉ các sản phẩm của nhóm đó bị đánh lỗi
+                    print(f"❌ Training chunk {index} ({len(chunks[index])} products) failed: {str(e)}")
+                    chunk_results[index] = [(item_code, None, str(e)) for item_code in chunks[index]]
+                print(f"📊 Finished chunk {done}/{len(chunks)}")
+        
+        return [result for results in chunk_results for result in results]
+    
+    @staticmethod
+    def merge(product_results: List[ProductResult]) -> Tuple[Dict[str, Dict[str, float]],
+                                                             List[Dict[str, float]], Dict[str, str]]:
+        """(metrics theo sản phẩm, danh sách metrics để lấy trung bình, lỗi theo sản phẩm) theo thứ tự sản phẩm"""
+        results: Dict[str, Dict[str, float]] = {}
+        overall_metrics: List[Dict[str, float]] = []
+        errors: Dict[str, str] = {}
+        for item_code, metrics, error in product_results:
+            if error is not None:
+                errors[item_code] = error
+            elif metrics:
+                results[item_code] = metrics
+                overall_metrics.append(metrics)
+        return results, overall_metrics, errors
+
+# Instance dùng chung (XGBoostModel, ProphetModel)
+parallel_training = ParallelTrainingService()
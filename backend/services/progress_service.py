@@ -0,0 +1,171 @@
+"""
+Progress Service - Tiến độ training job (số sản phẩm xong/tổng, tốc độ, ETA, metrics trung bình đang chạy, lỗi
+từng sản phẩm) đọc tăng dần từ checkpoint, dùng cho stream SSE
+"""
+
+import os
+import glob
+import json
+import math
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from services.catalog_service import catalog
+from services.checkpoint_service import checkpoints, TrainingCheckpoint
+from utils.helpers import get_timestamp
+
+class JobProgress:
+    """
+    Tổng hợp checkpoint của một job: mỗi lần refresh chỉ đọc các dòng mới ghi thêm (giữ offset từng file),
+    nên chi phí mỗi lần cập nhật tỷ lệ với số sản phẩm mới xong chứ không phải toàn bộ job
+    """
+    
+    METRICS = ('mae', 'rmse', 'mape', 'r2')
+    RECENT_FAILURES = 20
+    
+    def __init__(self, checkpoint: TrainingCheckpoint):
+        self.checkpoint = checkpoint
+        self._offsets: Dict[str, int] = {}
+        self.products = set()
+        self.failed = 0
+        self.metric_sums = {name: 0.0 for name in self.METRICS}
+        self.metric_counts = {name: 0 for name in self.METRICS}
+        self.recent_failures = deque(maxlen=self.RECENT_FAILURES)
+    
+    def refresh(self) -> None:
+        """Đọc các dòng hoàn chỉnh mới ghi vào các file checkpoint"""
+        for path in glob.glob(os.path.join(self.checkpoint.job_dir, "products-*.jsonl")):
+            offset = self._offsets.get(path, 0)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+            # Dòng cuối chưa có "\n" là dòng đang ghi dở: để lần sau đọc lại
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            self._offsets[path] = offset + len(complete)
+            for line in complete.splitlines():
+                try:
+                    self._add(json.loads(line))
+                except ValueError:
+                    continue
+    
+    def _add(self, record: Dict[str, Any]) -> None:
+        if record["item_code"] in self.products:
+            return
+        self.products.add(record["item_code"])
+        if record["error"] is not None:
+            self.failed += 1
+            self.recent_failures.append({"item_code": record["item_code"], "error": record["error"]})
+            return
+        for name in self.METRICS:
+            value = (record["metrics"] or {}).get(name)
+            # Bỏ qua NaN/inf (vd: R2 của sản phẩm chỉ có 1 tuần test) để trung bình đang chạy luôn là số hợp lệ
+            if value is not None and math.isfinite(value):
+                self.metric_sums[name] += value
+                self.metric_counts[name] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Số sản phẩm xong/tổng, tốc độ và ETA của lần chạy hiện tại, metrics trung bình, lỗi gần nhất"""
+        self.refresh()
+        info = self.checkpoint.progress_info() or {}
+        done = len(self.products)
+        total = info.get("total")
+        rate = None
+        eta_seconds = None
+        if info:
+            elapsed = time.time() - info["started_at"]
+            done_this_run = done - info["done_at_start"]
+            if elapsed > 0 and done_this_run > 0:
+                rate = done_this_run / elapsed
+                eta_seconds = round(max(total - done, 0) / rate, 1)
+        return {
+            "products_done": done,
+            "products_total": total,
+            "failed_products": self.failed,
+            "products_per_second": round(rate, 2) if rate else None,
+            "eta_seconds": eta_seconds,
+            "metrics": {
+                name: self.metric_sums[name] / self.metric_counts[name]
+                for name in self.METRICS if self.metric_counts[name]
+            },
+            "recent_failures": list(self.recent_failures)
+        }
+
+class ProgressService:
+    """
+    Snapshot tiến độ theo job (giữ JobProgress của các job đang chạy giữa các lần gọi). Đọc file nên router gọi
+    qua threadpool; lock giữ cho các JobProgress không bị refresh đồng thời từ nhiều thread.
+    """
+    
+    TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+    
+    def __init__(self):
+        self._jobs: Dict[str, JobProgress] = {}
+        self._lock = threading.Lock()
+    
+    def _progress(self, job_id: str, status: str) -> JobProgress:
+        """JobProgress của job (job đã kết thúc không được giữ lại), gọi khi đang giữ lock"""
+        progress = self._jobs.get(job_id) or JobProgress(checkpoints.get(job_id))
+        if status in self.TERMINAL_STATUSES:
+            self._jobs.pop(job_id, None)
+        else:
+            self._jobs[job_id] = progress
+        return progress
+    
+    def products_done(self, job_id: str, job_info: Dict[str, Any]) -> int:
+        """Số sản phẩm đã checkpoint của job (đọc tăng dần như snapshot, không đọc lại toàn bộ checkpoint)"""
+        with self._lock:
+            progress = self._progress(job_id, job_info["status"])
+            progress.refresh()
+            return len(progress.products)
+    
+    def snapshot(self, job_id: str, job_info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Tiến độ của một job (None nếu job không tồn tại)"""
+        job_info = job_info or catalog.get("training_jobs", job_id)
+        if job_info is None:
+            return None
+        
+        status = job_info["status"]
+        result = job_info.get("result") or {}
+        if status == "completed" and "total_products" in result:
+            # Checkpoint đã bị xóa khi job hoàn tất: lấy số liệu cuối từ kết quả
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            done = result["total_products"] + result.get("failed_products", 0)
+            progress = {
+                "products_done": done,
+                "products_total": done,
+                "failed_products": result.get("failed_products", 0),
+                "products_per_second": None,
+                "eta_seconds": 0,
+                "metrics": {name: value for name, value in result.get("metrics", {}).items()
+                            if value is not None and math.isfinite(value)},
+                "recent_failures": []
+            }
+        else:
+            with self._lock:
+                progress = self._progress(job_id, status).snapshot()
+        
+        return {
+            "job_id": job_id,
+            "model_type": job_info["model_type"],
+            "status": status,
+            **progress,
+            "error": job_info.get("error"),
+            "updated_at": get_timestamp()
+        }
+    
+    def active_snapshots(self) -> List[Dict[str, Any]]:
+        """Tiến độ của mọi job đang chờ/đang chạy"""
+        jobs = [job for status in ("pending", "running")
+                for job in catalog.list("training_jobs", where={"status": status})]
+        return [self.snapshot(job["id"], job) for job in jobs]
+    
+    @staticmethod
+    def event(name: str, data: Dict[str, Any]) -> str:
+        """Một event Server-Sent Events"""
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False, default=float)}\n\n"
+
+# Instance dùng chung cho các routers
+progress_service = ProgressService()
@@ -0,0 +1,287 @@
+"""
+Raw Cache Service - Chuyển file dữ liệu thô (xlsx/csv) sang Parquet một lần, khóa theo hash nội dung
+"""
+
+import os
+import shutil
+import time
+import hashlib
+from typing import Dict, Any, List, Optional, Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.helpers import generate_id, ensure_dir, save_json, load_json, get_file_size_mb
+from config.settings import settings
+
+class RawCacheService:
+    """Cache dạng cột cho dữ liệu thô: mỗi file chỉ phải parse một lần"""
+    
+    HASH_BLOCK_SIZE = 1024 * 1024
+    
+    # Phiên bản cách đọc/chuyển đổi file thô, nằm trong tên file cache: tăng khi đổi reader hoặc dtype
+    # để các bản cache cũ (vd: mã định danh bị đọc thành số trước v2) không còn được dùng lại
+    CACHE_VERSION = 2
+    
+    # Các cột định danh luôn đọc dạng chuỗi: không để pandas/openpyxl suy kiểu số (vd: mã "00000" thành 0),
+    # nhờ đó đọc theo khối và đọc cả file cho cùng một kết quả
+    TEXT_COLUMNS = ['ItemCode', 'CustomerCode', 'BranchCode0', 'BranchName0', 'ItemName', 'Unit']
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or settings.RAW_CACHE_PATH
+        ensure_dir(self.cache_dir)
+    
+    @classmethod
+    def file_hash(cls, file_path: str) -> str:
+        """Tính SHA-256 của nội dung file"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def excel_engine() -> str:
+        """Chọn engine đọc xlsx nhanh nhất đang có (calamine nếu đã cài, ngược lại openpyxl)"""
+        try:
+            import python_calamine  # noqa: F401
+            return "calamine"
+        except ImportError:
+            return "openpyxl"
+    
+    @classmethod
+    def text_dtypes(cls) -> Dict[str, Any]:
+        """dtype cho các cột định danh khi đọc file thô (cột không có trong file được bỏ qua)"""
+        return {col: str for col in cls.TEXT_COLUMNS}
+    
+    def cache_file(self, content_hash: str) -> str:
+        """Đường dẫn file Parquet ứng với hash (và phiên bản cache)"""
+        return os.path.join(self.cache_dir, f"{content_hash}.v{self.CACHE_VERSION}.parquet")
+    
+    def ensure_cached(self, file_path: str, chunksize: Optional[int] = None,
+                      content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Đảm bảo file đã có bản Parquet trong cache, trả về thông tin cache
+        (hash, file cache, thời gian parse, kích thước file, số dòng, có hit cache hay không)
+        """
+        content_hash = content_hash or self.file_hash(file_path)
+        cache_file = self.cache_file(content_hash)
+        meta_file = f"{cache_file}.json"
+        
+        if os.path.exists(cache_file) and os.path.exists(meta_file):
+            info = load_json(meta_file)
+            info["cache_hit"] = True
+            print(f"⚡ Raw cache hit: {cache_file}")
+            return info
+        
+        print(f"🔄 Converting raw file to columnar cache: {file_path}")
+        start = time.perf_counter()
+        # Tên file tạm riêng cho mỗi lần chuyển đổi: hai worker cache cùng một file không ghi đè lên nhau
+        tmp_file = f"{cache_file}.{generate_id()}.tmp"
+        
+        try:
+            if file_path.endswith('.xlsx'):
+                if chunksize:
+                    # Đọc streaming bằng openpyxl read-only: bộ nhớ giới hạn theo chunksize dòng
+                    reader = "openpyxl-read-only-chunked"
+                    self._convert_chunked(self._iter_excel_chunks(file_path, chunksize), tmp_file, chunksize)
+                else:
+                    reader = self.excel_engine()
+                    df = pd.read_excel(file_path, engine=reader, dtype=self.text_dtypes())
+                    self._write_frame(df, tmp_file, chunksize)
+            elif file_path.endswith('.csv'):
+                if chunksize:
+                    reader = "pandas-csv-chunked"
+                    self._convert_chunked(pd.read_csv(file_path, chunksize=chunksize, dtype=self.text_dtypes()), tmp_file, chunksize)
+                else:
+                    reader = "pandas-csv"
+                    self._write_frame(pd.read_csv(file_path, dtype=self.text_dtypes()), tmp_file, chunksize)
+            else:
+                raise ValueError("Unsupported file format")
+        
+            os.replace(tmp_file, cache_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        parse_seconds = time.perf_counter() - start
+        
+        info = {
+            "content_hash": content_hash,
+            "cache_version": self.CACHE_VERSION,
+            "cache_file": cache_file,
+            "source_file": file_path,
+            "reader": reader,
+            "parse_seconds": round(parse_seconds, 3),
+            "file_size_mb": round(get_file_size_mb(file_path), 3),
+            "cache_size_mb": round(get_file_size_mb(cache_file), 3),
+            "num_rows": pq.ParquetFile(cache_file).metadata.num_rows
+        }
+        save_json(info, meta_file)
+        
+        info["cache_hit"] = False
+        print(f"✅ Cached {info['num_rows']} rows in {info['parse_seconds']}s using {reader}")
+        return info
+    
+    def read_frame(self, file_path: str, columns: Optional[List[str]] = None,
+                   content_hash: Optional[str] = None, categories: Optional[List[str]] = None) -> pd.DataFrame:
+        """Đọc toàn bộ file thô qua cache; các cột chuỗi trong categories được đọc thành category"""
+        info = self.ensure_cached(file_path, content_hash=content_hash)
+        return pq.read_table(
+            info["cache_file"],
+            columns=self._existing_columns(info["cache_file"], columns),
+            read_dictionary=self._dictionary_columns(info["cache_file"], categories)
+        ).to_pandas()
+    
+    def iter_chunks(self, file_path: str, chunksize: int, columns: Optional[List[str]] = None,
+                    content_hash: Optional[str] = None, categories: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Đọc file thô qua cache theo từng khối chunksize dòng"""
+        info = self.ensure_cached(file_path, chunksize, content_hash)
+        parquet_file = pq.ParquetFile(info["cache_file"],
+                                      read_dictionary=self._dictionary_columns(info["cache_file"], categories))
+        for batch in parquet_file.iter_batches(batch_size=chunksize,
+                                               columns=self._existing_columns(info["cache_file"], columns)):
+            yield batch.to_pandas()
+    
+    def columns(self, file_path: str) -> List[str]:
+        """Danh sách cột của file thô (đọc từ schema Parquet)"""
+        info = self.ensure_cached(file_path)
+        return pq.read_schema(info["cache_file"]).names
+    
+    @staticmethod
+    def _existing_columns(cache_file: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        """Chỉ giữ các cột có trong file, để bước kiểm tra cột phía sau báo lỗi rõ ràng"""
+        if columns is None:
+            return None
+        names = set(pq.read_schema(cache_file).names)
+        return [col for col in columns if col in names]
+    
+    @staticmethod
+    def _dictionary_columns(cache_file: str, categories: Optional[List[str]]) -> Optional[List[str]]:
+        """Các cột chuỗi có thể đọc dạng dictionary (Arrow → pandas category)"""
+        if not categories:
+            return None
+        schema = pq.read_schema(cache_file)
+        return [
+            col for col in categories
+            if col in schema.names and (pa.types.is_string(schema.field(col).type)
+                                        or pa.types.is_large_string(schema.field(col).type))
+        ]
+    
+    @staticmethod
+    def _normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """Chuyển các cột object lẫn kiểu (vd: số và chuỗi) sang chuỗi để Arrow ghi được"""
+        for col in df.columns:
+            if df[col].dtype == object:
+                inferred = pd.api.types.infer_dtype(df[col], skipna=True)
+                if inferred.startswith('mixed') and inferred != 'mixed-integer-float':
+                    df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        df.columns = [str(col) for col in df.columns]
+        return df
+    
+    def _write_frame(self, df: pd.DataFrame, target: str, chunksize: Optional[int]) -> None:
+        """Ghi DataFrame ra Parquet với row group giới hạn để đọc streaming về sau"""
+        table = pa.Table.from_pandas(self._normalize_frame(df), preserve_index=False)
+        pq.write_table(table, target, row_group_size=chunksize or settings.INGEST_CHUNK_SIZE or None)
+    
+    @staticmethod
+    def _cell_text(value: Any) -> Any:
+        """Giá trị ô xlsx → chuỗi như pd.read_excel(dtype=str): số nguyên dạng float bỏ phần .0, ô trống giữ None"""
+        if value is None:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+    
+    @classmethod
+    def _excel_frame(cls, rows: List[tuple], header: tuple) -> pd.DataFrame:
+        """Tạo DataFrame từ các dòng openpyxl, cột định danh ép về chuỗi"""
+        df = pd.DataFrame(rows, columns=header)
+        for col in cls.TEXT_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.Series([cls._cell_text(value) for value in df[col]], index=df.index, dtype=str)
+        return df
+    
+    @classmethod
+    def _iter_excel_chunks(cls, file_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """Đọc sheet đầu của file xlsx theo từng khối chunksize dòng (openpyxl read-only, không nạp cả workbook)"""
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= chunksize:
+                    yield cls._excel_frame(buffer, header)
+                    buffer = []
+            if buffer:
+                yield cls._excel_frame(buffer, header)
+        finally:
+            workbook.close()
+    
+    def _convert_chunked(self, chunks: Iterator[pd.DataFrame], target: str, chunksize: int) -> None:
+        """
+        Chuyển dữ liệu đọc theo khối (CSV hoặc xlsx) sang Parquet: lượt 1 ghi mỗi khối ra một part và ghi nhận kiểu
+        dữ liệu, lượt 2 ép các part về kiểu chung (giống khi đọc cả file) rồi ghép thành một file Parquet
+        """
+        parts_dir = f"{target}.parts"
+        ensure_dir(parts_dir)
+        try:
+            part_files = []
+            chunk_dtypes = []
+            for i, chunk in enumerate(chunks):
+                part_file = os.path.join(parts_dir, f"part-{i:05d}.parquet")
+                chunk_dtypes.append(chunk.dtypes)
+                self._write_frame(chunk, part_file, chunksize)
+                part_files.append(part_file)
+            
+            if not part_files:
+                raise ValueError("File không có dữ liệu")
+            
+            dtypes = self._unify_dtypes(chunk_dtypes)
+            writer = None
+            try:
+                for part_file in part_files:
+                    chunk = pq.read_table(part_file).to_pandas()
+                    for col, dtype in dtypes.items():
+                        if chunk[col].dtype == dtype:
+                            continue
+                        if dtype == object:
+                            chunk[col] = chunk[col].where(chunk[col].isna(), chunk[col].astype(str)).astype(object)
+                        else:
+                            chunk[col] = chunk[col].astype(dtype)
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        # Cột hợp nhất thành object luôn ghi dưới dạng chuỗi (kể cả khi part đầu toàn null)
+                        schema = pa.schema([
+                            pa.field(field.name, pa.string()) if dtypes[field.name] == object else field
+                            for field in table.schema
+                        ])
+                        writer = pq.ParquetWriter(target, schema)
+                    writer.write_table(table.cast(schema))
+            finally:
+                if writer is not None:
+                    writer.close()
+        finally:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+    
+    @staticmethod
+    def _unify_dtypes(chunk_dtypes: List[pd.Series]) -> Dict[str, Any]:
+        """Hợp nhất kiểu dữ liệu của các khối như khi pandas đọc cả file một lần"""
+        unified = {}
+        for col in chunk_dtypes[0].index:
+            dtypes = [d[col] for d in chunk_dtypes]
+            if all(dtype == dtypes[0] for dtype in dtypes):
+                unified[col] = dtypes[0]
+            elif all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                     for dtype in dtypes):
+                unified[col] = np.result_type(*dtypes)
+            else:
+                unified[col] = np.dtype(object)
+        return unified
@@ -4,28 +4,69 @@ Training Service - Business logic cho training
 
 from typing import Dict, Any, Optional
 import traceback
+import numpy as np
 
 from ml_models.xgboost_model import XGBoostModel
 from ml_models.prophet_model import ProphetModel
+from ml_models.baseline_model import BaselineModel
+from ml_models.prophet_lite_model import ProphetLiteModel
+from services.panel_service import panel_service
+from services.tuning_service import TuningService
+from services.backtest_service import BacktestService
 from utils.helpers import generate_id, get_timestamp
 from config.settings import settings
 
 class TrainingService:
     """Service cho training models"""
     
+    # Loại job dừng được khi đang chạy (kiểm tra cờ hủy giữa các sản phẩm/vòng tuning/model backtest)
+    CANCELLABLE = ('xgboost', 'prophet', 'tuning', 'backtest')
+    
     def __init__(self):
         self.xgboost_trainer = XGBoostModel()
         self.prophet_trainer = ProphetModel()
+        self.baseline_trainer = BaselineModel()
+        self.prophet_lite_trainer = ProphetLiteModel()
+        self.tuner = TuningService({
+            'xgboost': self.xgboost_trainer,
+            'prophet': self.prophet_trainer,
+            'prophet_lite': self.prophet_lite_trainer
+        })
+        self.backtester = BacktestService({
+            'xgboost': self.xgboost_trainer,
+            'prophet': self.prophet_trainer,
+            'prophet_lite': self.prophet_lite_trainer,
+            'baseline': self.baseline_trainer
+        })
     
-    def train_model(self, model_type: str, data_file: str, test_ratio: float = 0.3) -> Dict[str, Any]:
-        """Train model theo loại"""
+    def train_model(self, model_type: str, data_file: str, test_ratio: float = 0.3,
+                    parameters: Optional[Dict[str, Any]] = None, checkpoint=None) -> Dict[str, Any]:
+        """
+        Train model theo loại (parameters: tham số của request, vd: parameters["features"] cho XGBoost)
+        checkpoint: TrainingCheckpoint của job cho các model train từng sản phẩm (xgboost, prophet) và cờ hủy của
+        tuning/backtest; các model train mọi sản phẩm trong một lần (xgboost_global, prophet_lite, baseline) không
+        dừng giữa chừng được (xem CANCELLABLE)
+        model_type "tuning": tìm tham số tốt nhất theo parameters["search_space"] (xem TuningService)
+        model_type "backtest": backtest rolling-origin các model trong parameters["models"], không dùng test_ratio
+        (xem BacktestService)
+        """
         try:
             print(f"🔄 Training {model_type} model...")
             
             if model_type == "xgboost":
-                result = self.xgboost_trainer.train_all_products(data_file, test_ratio)
+                result = self.xgboost_trainer.train_all_products(data_file, test_ratio, parameters, checkpoint)
+            elif model_type == "xgboost_global":
+                result = self.xgboost_trainer.train_global(data_file, test_ratio, parameters)
             elif model_type == "prophet":
-                result = self.prophet_trainer.train_all_products(data_file, test_ratio)
+                result = self.prophet_trainer.train_all_products(data_file, test_ratio, parameters, checkpoint)
+            elif model_type == "prophet_lite":
+                result = self.prophet_lite_trainer.train_all_products(data_file, test_ratio, parameters)
+            elif model_type == "baseline":
+                result = self.baseline_trainer.train_all_products(data_file, test_ratio, parameters)
+            elif model_type == "tuning":
+                result = self.tuner.tune(data_file, test_ratio, parameters, checkpoint)
+            elif model_type == "backtest":
+                result = self.backtester.backtest(data_file, parameters, checkpoint)
             else:
                 raise ValueError(f"Unsupported model type: {model_type}")
             
@@ -39,25 +80,28 @@ class TrainingService:
     def validate_data(self, data_file: str) -> Dict[str, Any]:
         """Validate dữ liệu trước khi train"""
         try:
-            import pandas as pd
-            
-            df = pd.read_csv(data_file)
+            panel = panel_service.load(data_file)
+            observed = panel.observed()
+            quantities = panel.values[observed].astype(np.float64)
+            active_weeks = panel.weeks[observed.any(axis=0)]
             
             validation_result = {
-                "total_products": len(df['ItemCode'].unique()),
-                "total_weeks": len(df['Week'].unique()),
-                "total_records": len(df),
-                "missing_values": df.isnull().sum().to_dict(),
+                "total_products": panel.num_products,
+                "total_weeks": len(active_weeks),
+                "total_records": len(quantities),
+                # Panel dựng từ weekly_demand nên không có ô thiếu (tuần không bán = 0)
+                "missing_values": {"ItemCode": 0, "Week": 0, "TotalQuantity": int(np.isnan(quantities).sum())},
                 "data_range": {
-                    "start": df['Week'].min(),
-                    "end": df['Week'].max()
+                    "start": str(active_weeks.min()),
+                    "end": str(active_weeks.max())
                 },
                 "quantity_stats": {
-                    "mean": float(df['TotalQuantity'].mean()),
-                    "std": float(df['TotalQuantity'].std()),
-                    "min": float(df['TotalQuantity'].min()),
-                    "max": float(df['TotalQuantity'].max())
-                }
+                    "mean": float(quantities.mean()),
+                    "std": float(quantities.std(ddof=1)),
+                    "min": float(quantities.min()),
+                    "max": float(quantities.max())
+                },
+                "panel": panel.describe()
             }
             
             # Check if data is sufficient for training
@@ -90,9 +134,13 @@ class TrainingService:
     
     def get_model_trainer(self, model_type: str):
         """Lấy model trainer theo loại"""
-        if model_type == "xgboost":
+        if model_type in ("xgboost", "xgboost_global"):
             return self.xgboost_trainer
         elif model_type == "prophet":
             return self.prophet_trainer
+        elif model_type == "prophet_lite":
+            return self.prophet_lite_trainer
+        elif model_type == "baseline":
+            return self.baseline_trainer
         else:
             raise ValueError(f"Unsupported model type: {model_type}")
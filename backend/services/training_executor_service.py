@@ -0,0 +1,153 @@
+"""
+Training Executor Service - Chạy training job trong process pool riêng (giới hạn số job đồng thời và hàng đợi),
+event loop của API không bị chặn trong lúc train
+"""
+
+import time
+import traceback
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional
+
+from services.catalog_service import catalog
+from services.checkpoint_service import checkpoints
+from utils.helpers import get_timestamp
+from utils.logger import log_training_complete, log_error
+from config.settings import settings
+
+class TrainingQueueFullError(RuntimeError):
+    """Hàng đợi training đã đầy (số job đang chạy + đang chờ đạt giới hạn)"""
+
+def run_training(job_id: str, data_file: str, model_type: str, parameters: Optional[Dict[str, Any]],
+                 test_ratio: float) -> Dict[str, Any]:
+    """
+    Hàm chạy trong worker process: đánh dấu job running trong catalog rồi train với checkpoint của job
+    (job chạy lại sau khi lỗi/hủy tiếp tục từ các sản phẩm chưa có trong checkpoint)
+    """
+    # Import trong worker: process chính không cần nạp Prophet/XGBoost chỉ để submit job
+    from services.train_service import TrainingService
+    
+    checkpoint = checkpoints.get(job_id)
+    if checkpoint.cancelled():
+        return {"cancelled": True}
+    
+    print(f"🔄 Running training job {job_id}...")
+    catalog.update("training_jobs", job_id, status="running", started_at=get_timestamp())
+    
+    print(f"📖 Loading data from: {data_file}")
+    start = time.perf_counter()
+    result = TrainingService().train_model(model_type, data_file, test_ratio, parameters, checkpoint)
+    result["job_seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+class TrainingExecutorService:
+    """
+    Quản lý training job: submit vào process pool (mỗi worker chạy một job), trạng thái job ghi về catalog
+    
+    max_jobs: số job train đồng thời (số worker process), queue_size: số job được chờ thêm; submit khi đã đủ
+    max_jobs + queue_size job chưa xong sẽ báo TrainingQueueFullError thay vì xếp hàng vô hạn.
+    """
+    
+    def __init__(self, max_jobs: Optional[int] = None, queue_size: Optional[int] = None):
+        self.max_jobs = max_jobs or settings.TRAIN_MAX_CONCURRENT_JOBS
+        self.queue_size = settings.TRAIN_QUEUE_SIZE if queue_size is None else queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._active: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Tạo process pool khi có job đầu tiên"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_jobs,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def submit(self, job_id: str, data_file: str, model_type: str, parameters: Optional[Dict[str, Any]],
+               test_ratio: float) -> None:
+        """
+        Đưa job (đã có bản ghi pending trong catalog) vào hàng đợi và trả về ngay
+        """
+        with self._lock:
+            if len(self._active) >= self.max_jobs + self.queue_size:
+                raise TrainingQueueFullError(
+                    f"Training queue is full ({self.max_jobs} running + {self.queue_size} queued jobs)"
+                )
+            try:
+                future = self._get_executor().submit(run_training, job_id, data_file, model_type, parameters,
+                                                     test_ratio)
+            except BrokenProcessPool:
+                # Một worker đã chết (job đó đã được đánh dấu failed): tạo pool mới cho các job sau
+                print(f"🔄 Training process pool is broken, starting a new one")
+                self._executor = None
+                future = self._get_executor().submit(run_training, job_id, data_file, model_type, parameters,
+                                                     test_ratio)
+            self._active[job_id] = future
+        future.add_done_callback(lambda f: self._on_done(job_id, model_type, f))
+        
+        print(f"📥 Training job {job_id} ({model_type}) queued")
+    
+    def _on_done(self, job_id: str, model_type: str, future: Future) -> None:
+        """Ghi kết quả/lỗi của job về catalog khi worker xong"""
+        with self._lock:
+            self._active.pop(job_id, None)
+        if future.cancelled():
+            catalog.update("training_jobs", job_id, status="cancelled", completed_at=get_timestamp())
+            print(f"🗑️ Training job {job_id} cancelled before start")
+            return
+        try:
+            result = future.result()
+            if result.get("cancelled"):
+                # Giữ kết quả các sản phẩm đã train (file results + checkpoint để resume)
+                catalog.update("training_jobs", job_id, status="cancelled", completed_at=get_timestamp(),
+                               result=result)
+                print(f"🗑️ Training job {job_id} cancelled ({result.get('total_products', 0)} products done)")
+                return
+            
+            catalog.update("training_jobs", job_id, status="completed", completed_at=get_timestamp(), result=result)
+            checkpoints.remove(job_id)
+            log_training_complete(model_type, job_id, result.get('metrics', {}))
+            print(f"✅ Training job {job_id} completed successfully!")
+        except Exception as e:
+            print(f"❌ Training job {job_id} failed: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            catalog.update("training_jobs", job_id, status="failed", completed_at=get_timestamp(), error=str(e))
+            log_error("training", e, f"run_training_job_{job_id}")
+    
+    def cancel(self, job_id: str) -> bool:
+        """
+        Hủy job: job còn trong hàng đợi bị bỏ ngay; job đang chạy dừng trước sản phẩm tiếp theo (cờ hủy trong
+        checkpoint). Trả về False nếu job không do executor này quản lý (vd: đã xong)
+        """
+        checkpoints.get(job_id).cancel()
+        with self._lock:
+            future = self._active.get(job_id)
+        if future is None:
+            return False
+        future.cancel()
+        print(f"🗑️ Cancelling training job {job_id}")
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Giới hạn và số job chưa xong của executor"""
+        with self._lock:
+            active = sum(1 for future in self._active.values() if future.running())
+            pending = len(self._active)
+        return {
+            "max_concurrent_jobs": self.max_jobs,
+            "queue_size": self.queue_size,
+            "running_jobs": min(active, self.max_jobs),
+            "queued_jobs": pending - min(active, self.max_jobs)
+        }
+    
+    def shutdown(self) -> None:
+        """Dừng process pool khi tắt server (job còn chờ giữ trạng thái pending, lần khởi động sau đánh dấu failed)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Instance dùng chung cho các routers
+training_executor = TrainingExecutorService()
@@ -0,0 +1,453 @@
+"""
+Tuning Service - Tìm cấu hình tham số tốt nhất cho từng loại model bằng successive halving/Hyperband: mọi
+cấu hình được đánh giá trên một nhóm nhỏ sản phẩm, chỉ các cấu hình tốt nhất được đánh giá tiếp trên nhiều
+sản phẩm hơn (cấu hình kém bị dừng sớm), các sản phẩm của mỗi vòng được train song song
+"""
+
+import json
+import math
+import time
+import itertools
+import traceback
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from ml_models.xgboost_model import XGBoostModel
+from ml_models.prophet_model import ProphetModel
+from ml_models.prophet_lite_model import ProphetLiteModel
+from services.panel_service import DemandPanel, panel_service
+from services.feature_store_service import feature_store
+from services.parallel_training_service import parallel_training
+from utils.helpers import generate_id, get_timestamp
+from config.settings import settings
+
+class ConfigEvaluator:
+    """
+    Điểm của từng cặp (cấu hình, sản phẩm) cho một loại model: metric trên đoạn validation (các tuần cuối tập
+    train, dài bằng tập test) của model fit trên phần trước đó, nên việc chọn cấu hình không nhìn thấy tập test.
+    Cặp đã đánh giá được nhớ lại nên vòng sau (nhiều sản phẩm hơn) chỉ train các sản phẩm mới, cấu hình lặp lại
+    giữa các bracket Hyperband không bị train lại. test_scores() chấm cấu hình đã chọn trên tập test.
+    checkpoint: TrainingCheckpoint của job, chỉ dùng làm cờ hủy
+    """
+    
+    def __init__(self, model_type: str, trainer, data_file: str, test_ratio: float, configs: List[Dict[str, Any]],
+                 metric: str, parameters: Dict[str, Any], checkpoint=None):
+        self.model_type = model_type
+        self.trainer = trainer
+        self.data_file = data_file
+        self.test_ratio = test_ratio
+        self.configs = configs
+        self.metric = metric
+        # Prophet-lite giải theo batch cho cả nhóm sản phẩm: một process là đủ
+        self.workers = (1 if model_type == 'prophet_lite'
+                        else parallel_training.resolve_workers(parameters.get('workers')))
+        self.feature_spec = parameters.get('features')
+        self.checkpoint = checkpoint
+        self._scores: Dict[Tuple[int, str], float] = {}
+        self.evaluations = 0
+        self.test_evaluations = 0
+        self.seconds = 0.0
+    
+    def scores(self, config_ids: List[int], item_codes: List[str]) -> np.ndarray:
+        """Ma trận điểm [cấu hình, sản phẩm] (NaN nếu sản phẩm lỗi), chỉ train các cặp chưa có"""
+        missing = [(c, item) for c in config_ids for item in item_codes if (c, item) not in self._scores]
+        if missing:
+            configs = sorted({c for c, _ in missing})
+            products = list(dict.fromkeys(item for _, item in missing))
+            self._scores.update(self._evaluate(configs, products, validation=True))
+            self.evaluations += len(configs) * len(products)
+        return np.array([[self._scores.get((c, item), np.nan) for item in item_codes] for c in config_ids])
+    
+    def test_scores(self, config_id: int, item_codes: List[str]) -> np.ndarray:
+        """Điểm trên tập test (fit trên cả tập train) của một cấu hình cho từng sản phẩm (NaN nếu sản phẩm lỗi)"""
+        scores = self._evaluate([config_id], item_codes, validation=False)
+        self.test_evaluations += len(item_codes)
+        return np.array([scores.get((config_id, item), np.nan) for item in item_codes])
+    
+    def cancelled(self) -> bool:
+        return self.checkpoint is not None and self.checkpoint.cancelled()
+    
+    def _evaluate(self, config_ids: List[int], item_codes: List[str],
+                  validation: bool) -> Dict[Tuple[int, str], float]:
+        configs = {str(c): self.configs[c] for c in config_ids}
+        if self.model_type == 'xgboost':
+            args = (self.data_file, self.test_ratio, self.feature_spec,
+                    1 if self.workers > 1 else None,  # Chạy song song thì mỗi worker chỉ dùng 1 thread XGBoost
+                    configs, self.metric, validation)
+        else:
+            args = (self.data_file, self.test_ratio, configs, self.metric, validation)
+        
+        start = time.perf_counter()
+        product_results = parallel_training.run(self.trainer.tune_products, item_codes, *args, workers=self.workers,
+                                                cancel=self.checkpoint)
+        self.seconds += time.perf_counter() - start
+        
+        results = {}
+        for item_code, scores, _ in product_results:
+            for c in config_ids:
+                value = (scores or {}).get(str(c))
+                results[(c, item_code)] = value if value is not None and math.isfinite(value) else np.nan
+        return results
+
+class TuningService:
+    """
+    Tuning theo loại model (model_type "tuning"): parameters["search_space"] = {loại model: {tham số: danh sách giá
+    trị hoặc {"low", "high", "log", "int"}}}; kết quả là cấu hình tốt nhất của từng loại model (hoặc của từng nhóm
+    sản phẩm theo kiểu nhu cầu) kèm chi phí đã dùng so với đánh giá toàn bộ lưới trên mọi sản phẩm.
+    
+    Cấu hình "default" (tham số mặc định của model) luôn là một ứng viên. Sản phẩm được xáo trộn một lần (theo
+    seed) và mỗi vòng dùng phần đầu của thứ tự đó, nên điểm các vòng trước được dùng lại. Điểm của một cấu hình
+    là trung bình metric validation trên các sản phẩm mà mọi cấu hình của vòng đều đánh giá được; cấu hình được
+    chọn được chấm lại trên tập test (test_ratio tuần cuối như job train) và metrics của job là điểm test đó.
+    """
+    
+    # Tham số được tune của từng loại model (train mỗi sản phẩm cũng nhận các tham số này)
+    TUNABLE = {
+        'xgboost': XGBoostModel.TUNABLE_PARAMS,
+        'prophet': ProphetModel.TUNABLE_PARAMS,
+        'prophet_lite': ProphetLiteModel.TUNABLE_PARAMS
+    }
+    STRATEGIES = ('successive_halving', 'hyperband')
+    METRICS = ('mae', 'rmse')
+    CLUSTER_BY = ('demand_pattern',)
+    
+    DEFAULT_ETA = 3  # Mỗi vòng giữ 1/eta cấu hình và đánh giá trên gấp eta lần số sản phẩm
+    DEFAULT_MIN_PRODUCTS = 8  # Số sản phẩm của vòng đầu
+    DEFAULT_MAX_CONFIGS = 27  # Lưới lớn hơn thì lấy mẫu ngẫu nhiên chừng này cấu hình
+    
+    # Phân loại nhu cầu Syntetos-Boylan: ADI (khoảng cách trung bình giữa các tuần có bán) và CV² của lượng bán
+    ADI_CUTOFF = 1.32
+    CV2_CUTOFF = 0.49
+    
+    def __init__(self, trainers: Dict[str, Any]):
+        self.trainers = trainers
+    
+    @classmethod
+    def validate(cls, parameters: Optional[Dict[str, Any]]) -> None:
+        """Kiểm tra parameters của job tuning (ValueError nếu không hợp lệ)"""
+        parameters = parameters or {}
+        search_space = parameters.get('search_space')
+        if not isinstance(search_space, dict) or not search_space:
+            raise ValueError("parameters.search_space must be a non-empty object keyed by model type")
+        for model_type, space in search_space.items():
+            if model_type not in cls.TUNABLE:
+                raise ValueError(f"Cannot tune model type {model_type!r} (supported: {list(cls.TUNABLE)})")
+            if not isinstance(space, dict) or not space:
+                raise ValueError(f"search_space.{model_type} must be a non-empty object")
+            for name, spec in space.items():
+                if name not in cls.TUNABLE[model_type]:
+                    raise ValueError(f"Unknown {model_type} parameter {name!r} "
+                                     f"(tunable: {list(cls.TUNABLE[model_type])})")
+                if isinstance(spec, list):
+                    if not spec:
+                        raise ValueError(f"search_space.{model_type}.{name} must not be empty")
+                elif isinstance(spec, dict):
+                    low, high = spec.get('low'), spec.get('high')
+                    numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (low, high))
+                    if not numeric or low >= high:
+                        raise ValueError(f"search_space.{model_type}.{name} needs numeric low < high")
+                    if spec.get('log') and low <= 0:
+                        raise ValueError(f"search_space.{model_type}.{name} needs low > 0 for log sampling")
+                else:
+                    raise ValueError(f"search_space.{model_type}.{name} must be a list of values or a range object")
+        
+        if parameters.get('strategy', cls.STRATEGIES[0]) not in cls.STRATEGIES:
+            raise ValueError(f"parameters.strategy must be one of {list(cls.STRATEGIES)}")
+        if parameters.get('metric', 'mae') not in cls.METRICS:
+            raise ValueError(f"parameters.metric must be one of {list(cls.METRICS)}")
+        if parameters.get('cluster_by') not in (None, *cls.CLUSTER_BY):
+            raise ValueError(f"parameters.cluster_by must be null or one of {list(cls.CLUSTER_BY)}")
+        for name, minimum in (('eta', 2), ('min_products', 1), ('max_configs', 1), ('max_products', 1)):
+            value = parameters.get(name)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < minimum):
+                raise ValueError(f"parameters.{name} must be an integer >= {minimum}")
+    
+    @staticmethod
+    def candidates(space: Dict[str, Any], max_configs: int, rng: np.random.Generator) -> List[Dict[str, Any]]:
+        """
+        Các cấu hình ứng viên: toàn bộ lưới nếu mọi tham số là danh sách và lưới không quá max_configs,
+        ngược lại lấy mẫu ngẫu nhiên max_configs cấu hình (khoảng log/int theo spec); cấu hình đầu là default
+        """
+        names = list(space)
+        if all(isinstance(space[name], list) for name in names):
+            grid = list(itertools.product(*(space[name] for name in names)))
+            if len(grid) <= max_configs:
+                return [{}] + [dict(zip(names, values)) for values in grid]
+        
+        def sample(spec):
+            if isinstance(spec, list):
+                return spec[rng.integers(len(spec))]
+            low, high = spec['low'], spec['high']
+            if spec.get('log'):
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                value = rng.uniform(low, high)
+            return int(round(value)) if spec.get('int') else float(value)
+        
+        configs, seen = [{}], set()
+        for _ in range(max_configs * 10):
+            config = {name: sample(space[name]) for name in names}
+            key = json.dumps(config, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                configs.append(config)
+            if len(configs) > max_configs:
+                break
+        return configs
+    
+    @classmethod
+    def demand_patterns(cls, panel: DemandPanel) -> np.ndarray:
+        """
+        Kiểu nhu cầu của từng sản phẩm (smooth/erratic/intermittent/lumpy) theo ADI và CV² của các tuần có bán
+        trong khoảng từ tuần bán đầu tiên tới tuần bán cuối cùng
+        """
+        observed = panel.observed()
+        counts = observed.sum(axis=1)
+        first = observed.argmax(axis=1)
+        last = panel.num_weeks - 1 - observed[:, ::-1].argmax(axis=1)
+        adi = (last - first + 1) / np.maximum(counts, 1)
+        
+        values = np.where(observed, np.asarray(panel.values, dtype=np.float64), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.nanmean(values, axis=1)
+            cv2 = np.where(counts >= 2, (np.nanstd(values, axis=1) / mean) ** 2, 0.0)
+        
+        regular = adi < cls.ADI_CUTOFF
+        stable = cv2 < cls.CV2_CUTOFF
+        return np.where(regular, np.where(stable, 'smooth', 'erratic'), np.where(stable, 'intermittent', 'lumpy'))
+    
+    def tune(self, data_file: str, test_ratio: float = 0.3, parameters: Optional[Dict[str, Any]] = None,
+             checkpoint=None) -> Dict[str, Any]:
+        """
+        Chạy tuning cho mọi loại model trong parameters["search_space"] và lưu kết quả
+        checkpoint: TrainingCheckpoint của job (cờ hủy kiểm tra trước mỗi vòng và mỗi sản phẩm); job bị hủy
+        trả về kết quả của các loại model đã tune xong với "cancelled": True
+        """
+        try:
+            print(f"🚀 Starting hyperparameter tuning...")
+            print(f"📖 Loading data from: {data_file}")
+            parameters = parameters or {}
+            self.validate(parameters)
+            
+            panel = panel_service.load(data_file)
+            print(f"✅ Data loaded. Panel shape: {panel.values.shape}")
+            
+            strategy = parameters.get('strategy', self.STRATEGIES[0])
+            metric = parameters.get('metric', 'mae')
+            eta = parameters.get('eta', self.DEFAULT_ETA)
+            min_products = parameters.get('min_products', self.DEFAULT_MIN_PRODUCTS)
+            seed = parameters.get('seed', 42)
+            patterns = self.demand_patterns(panel) if parameters.get('cluster_by') else None
+            
+            tuning = {}
+            cancelled = False
+            start = time.perf_counter()
+            for model_type, space in parameters['search_space'].items():
+                if checkpoint is not None and checkpoint.cancelled():
+                    cancelled = True
+                    break
+                rng = np.random.default_rng(seed)
+                configs = self.candidates(space, parameters.get('max_configs', self.DEFAULT_MAX_CONFIGS), rng)
+                evaluator = ConfigEvaluator(model_type, self.trainers[model_type], data_file, test_ratio, configs,
+                                            metric, parameters, checkpoint)
+                
+                # Thứ tự sản phẩm xáo trộn một lần: các vòng dùng phần đầu (tối đa max_products sản phẩm mỗi nhóm)
+                products = self._products(model_type, panel, data_file, evaluator.feature_spec)
+                order = rng.permutation(len(products))
+                groups = {'all': [products[i] for i in order]}
+                if patterns is not None:
+                    pattern_of = dict(zip((str(item) for item in panel.items), patterns))
+                    groups = {name: [item for item in groups['all'] if pattern_of[item] == name]
+                              for name in ('smooth', 'erratic', 'intermittent', 'lumpy')}
+                
+                print(f"🔄 Tuning {model_type}: {len(configs)} configs, {len(products)} products, {strategy}")
+                group_results = {}
+                for name, items in groups.items():
+                    items = items[:parameters['max_products']] if parameters.get('max_products') else items
+                    if not items:
+                        continue
+                    group = self._search(evaluator, configs, items, strategy, eta, min_products, rng)
+                    if group is None:
+                        cancelled = True
+                        break
+                    
+                    # Metric báo cáo: cấu hình đã chọn chấm trên tập test (không tham gia việc chọn)
+                    test_scores = evaluator.test_scores(group['config_id'], items)
+                    if evaluator.cancelled():
+                        cancelled = True
+                        break
+                    scored = np.isfinite(test_scores)
+                    group['test_score'] = float(test_scores[scored].mean()) if scored.any() else None
+                    group['test_products'] = int(scored.sum())
+                    group_results[name] = group
+                    print(f"📊 {model_type} [{name}]: validation {metric} {group['validation_score']:.4f}, "
+                          f"test {metric} {group['test_score']} with {group['config']}")
+                if cancelled:
+                    # Loại model đang tune dở không có kết quả
+                    print(f"🗑️ Tuning cancelled during {model_type}")
+                    break
+                
+                evaluated = sum(len(result['products']) for result in group_results.values())
+                full_evaluations = len(configs) * evaluated
+                tuning[model_type] = {
+                    'configs': len(configs),
+                    'best': group_results.get('all'),
+                    'clusters': None if patterns is None else group_results,
+                    'cost': {
+                        'evaluations': evaluator.evaluations,
+                        'full_grid_evaluations': full_evaluations,
+                        'evaluation_ratio': (round(evaluator.evaluations / full_evaluations, 4)
+                                             if full_evaluations else None),
+                        'test_evaluations': evaluator.test_evaluations,
+                        'seconds': round(evaluator.seconds, 3),
+                        'workers': evaluator.workers
+                    }
+                }
+            
+            tuning_seconds = time.perf_counter() - start
+            results_file = self._save_results(tuning, parameters)
+            
+            # metrics: điểm test của cấu hình đã chọn cho từng loại model (theo nhóm: trung bình có trọng số số
+            # sản phẩm chấm được)
+            metrics = {}
+            for model_type, result in tuning.items():
+                groups = [result['best']] if result['best'] else list(result['clusters'].values())
+                groups = [group for group in groups if group['test_score'] is not None]
+                weights = [group['test_products'] for group in groups]
+                if sum(weights):
+                    metrics[f"{model_type}_{metric}"] = float(np.average([group['test_score'] for group in groups],
+                                                                          weights=weights))
+            
+            if cancelled:
+                print(f"🗑️ Tuning cancelled after {tuning_seconds:.2f}s ({len(tuning)} model types done)")
+            else:
+                print(f"✅ Tuning completed in {tuning_seconds:.2f}s!")
+            
+            return {
+                'metrics': metrics,
+                'results_file': results_file,
+                'tuning': {
+                    model_type: {**result, 'best': self._summary(result['best']),
+                                 'clusters': result['clusters'] and {name: self._summary(group)
+                                                                     for name, group in result['clusters'].items()}}
+                    for model_type, result in tuning.items()
+                },
+                'strategy': strategy,
+                'metric': metric,
+                'eta': eta,
+                'train_seconds': round(tuning_seconds, 3),
+                'panel': panel.describe(),
+                'cancelled': cancelled
+            }
+        
+        except Exception as e:
+            print(f"❌ Error in tune: {str(e)}")
+            print(f"📋 Traceback: {traceback.format_exc()}")
+            raise
+    
+    def _products(self, model_type: str, panel: DemandPanel, data_file: str,
+                  feature_spec: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Sản phẩm được đánh giá: có bảng features (XGBoost) hoặc có ít nhất một tuần bán"""
+        if model_type == 'xgboost':
+            table, _ = feature_store.table(data_file, feature_spec)
+            return list(feature_store.product_offsets(table)) if table is not None else []
+        return [str(item) for item in panel.items[panel.observed().any(axis=1)]]
+    
+    def _search(self, evaluator: ConfigEvaluator, configs: List[Dict[str, Any]], items: List[str], strategy: str,
+                eta: int, min_products: int, rng: np.random.Generator) -> Optional[Dict[str, Any]]:
+        """
+        Cấu hình tốt nhất trên items theo điểm validation: một lần successive halving hoặc các bracket Hyperband
+        (None nếu job bị hủy)
+        """
+        total = len(items)
+        start = min(min_products, total)
+        if strategy == 'successive_halving':
+            brackets = [(list(range(len(configs))), start)]
+        else:
+            # Bracket s: n cấu hình bắt đầu với total / eta^s sản phẩm (s lớn: nhiều cấu hình, ít sản phẩm)
+            s_max = int(math.floor(math.log(max(total / start, 1), eta)))
+            brackets = []
+            for s in range(s_max, -1, -1):
+                n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+                ids = sorted(rng.permutation(len(configs))[:n].tolist())
+                brackets.append((ids, int(math.ceil(total / eta ** s))))
+        
+        rounds, best = [], None
+        for bracket, (config_ids, size) in enumerate(brackets):
+            survivors = config_ids
+            while True:
+                size = min(size, total)
+                if evaluator.cancelled():
+                    return None
+                matrix = evaluator.scores(survivors, items[:size])
+                # Hủy giữa vòng: điểm của vòng này thiếu sản phẩm nên không dùng
+                if evaluator.cancelled():
+                    return None
+                scores = self._rank(matrix)
+                ranked = [survivors[i] for i in np.argsort(scores, kind='stable')]
+                rounds.append({
+                    'bracket': bracket,
+                    'configs': len(survivors),
+                    'products': size,
+                    'best_validation_score': float(np.min(scores)),
+                    'best_config': configs[ranked[0]]
+                })
+                if size >= total:
+                    break
+                survivors = ranked[:max(1, len(ranked) // eta)]
+                # Chỉ còn một cấu hình: đánh giá luôn trên mọi sản phẩm
+                size = total if len(survivors) == 1 else size * eta
+            
+            score = float(np.min(scores))
+            if best is None or score < best[1]:
+                best = (ranked[0], score)
+        
+        return {
+            'config_id': best[0],
+            'config': configs[best[0]],
+            'is_default': best[0] == 0,
+            'validation_score': best[1],
+            'products': items,
+            'rounds': rounds
+        }
+    
+    @staticmethod
+    def _rank(scores: np.ndarray) -> np.ndarray:
+        """Điểm của từng cấu hình: trung bình trên các sản phẩm mọi cấu hình đều có điểm (inf nếu không có)"""
+        finite = np.isfinite(scores)
+        common = finite.all(axis=0)
+        if common.any():
+            return scores[:, common].mean(axis=1)
+        # Không có sản phẩm chung: trung bình trên các sản phẩm của riêng từng cấu hình
+        counts = finite.sum(axis=1)
+        return np.where(counts > 0, np.where(finite, scores, 0).sum(axis=1) / np.maximum(counts, 1), np.inf)
+    
+    @staticmethod
+    def _summary(group: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Kết quả của một nhóm trả về trong job (bỏ danh sách sản phẩm, chỉ giữ số lượng)"""
+        if group is None:
+            return None
+        return {**{key: value for key, value in group.items() if key != 'products'},
+                'products': len(group['products'])}
+    
+    def _save_results(self, tuning: Dict[str, Any], parameters: Dict[str, Any]) -> str:
+        """Lưu kết quả tuning (kèm danh sách sản phẩm của từng nhóm)"""
+        try:
+            results_data = {
+                'model_name': 'Tuning',
+                'parameters': parameters,
+                'tuning': tuning,
+                'created_at': get_timestamp()
+            }
+            
+            results_file = f"{settings.RESULTS_STORAGE_PATH}/tuning_results_{generate_id()}.json"
+            
+            with open(results_file, 'w') as f:
+                json.dump(results_data, f, indent=2, default=str)
+            
+            return results_file
+        
+        except Exception as e:
+            print(f"❌ Error in _save_results: {str(e)}")
+            raise
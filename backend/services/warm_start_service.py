@@ -0,0 +1,49 @@
+"""
+Warm Start Service - Lưu tham số đã fit của từng sản phẩm để lần retrain sau bắt đầu tối ưu từ đó
+"""
+
+import os
+import json
+import hashlib
+from urllib.parse import quote
+from typing import Dict, Any, Optional
+
+from utils.helpers import generate_id, get_timestamp, ensure_dir, save_json, load_json
+from config.settings import settings
+
+class WarmStartService:
+    """
+    Mỗi sản phẩm một file JSON trong {thư mục}/{namespace}/; namespace là hash cấu hình model (số chiều
+    tham số phụ thuộc cấu hình) nên đổi cấu hình thì tự dùng bộ tham số khác. Khóa là ItemCode (không theo
+    dataset) để dataset mới sau append vẫn dùng lại được tham số của lần train trước.
+    """
+    
+    def __init__(self, store_dir: Optional[str] = None):
+        self.store_dir = store_dir or settings.WARM_START_PATH
+        ensure_dir(self.store_dir)
+    
+    @staticmethod
+    def namespace(model_name: str, config: Dict[str, Any]) -> str:
+        """Tên namespace: tên model + hash ngắn của cấu hình"""
+        config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+        return f"{model_name}_{config_hash}"
+    
+    def _file(self, namespace: str, item_code: str) -> str:
+        return os.path.join(self.store_dir, namespace, f"{quote(str(item_code), safe='')}.json")
+    
+    def get(self, namespace: str, item_code: str) -> Optional[Dict[str, Any]]:
+        """Tham số đã lưu của sản phẩm (None nếu chưa có hoặc file hỏng)"""
+        try:
+            return load_json(self._file(namespace, item_code))
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def put(self, namespace: str, item_code: str, params: Dict[str, Any]) -> None:
+        """Lưu tham số (ghi file tạm rồi đổi tên: worker song song không đọc phải file dở dang)"""
+        state_file = self._file(namespace, item_code)
+        tmp_file = f"{state_file}.{generate_id()}.tmp"
+        save_json({**params, "updated_at": get_timestamp()}, tmp_file)
+        os.replace(tmp_file, state_file)
+
+# Instance dùng chung (ProphetModel)
+warm_start_store = WarmStartService()
@@ -1,32 +1,34 @@
 """
 Shared state management cho các routers
+Datasets được lưu trong catalog SQLite (services/catalog_service.py) nên không mất khi restart
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-# Global storage cho datasets
-datasets: Dict[str, Any] = {}
+from services.catalog_service import catalog
 
 def get_datasets() -> Dict[str, Any]:
-    """Lấy datasets"""
-    return datasets
+    """Lấy datasets (đọc toàn bộ catalog, chỉ dùng khi thật sự cần tất cả)"""
+    return {dataset["id"]: dataset for dataset in catalog.list("datasets")}
 
 def update_datasets(new_datasets: Dict[str, Any]):
     """Cập nhật datasets"""
-    global datasets
-    datasets.update(new_datasets)
+    for dataset_id, dataset_info in new_datasets.items():
+        add_dataset(dataset_id, dataset_info)
 
 def add_dataset(dataset_id: str, dataset_info: Dict[str, Any]):
     """Thêm dataset mới"""
-    global datasets
-    datasets[dataset_id] = dataset_info
+    catalog.put("datasets", {**dataset_info, "id": dataset_id})
 
 def remove_dataset(dataset_id: str):
     """Xóa dataset"""
-    global datasets
-    if dataset_id in datasets:
-        del datasets[dataset_id]
+    catalog.delete("datasets", dataset_id)
 
-def get_dataset(dataset_id: str) -> Dict[str, Any]:
+def get_dataset(dataset_id: str) -> Optional[Dict[str, Any]]:
     """Lấy dataset theo ID"""
-    return datasets.get(dataset_id)
+    return catalog.get("datasets", dataset_id)
+
+def find_datasets(where: Optional[Dict[str, Any]] = None, newest_first: bool = False,
+                  limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Danh sách dataset theo thứ tự upload, có thể lọc theo cột có index (vd: content_hash)"""
+    return catalog.list("datasets", where=where, newest_first=newest_first, limit=limit)
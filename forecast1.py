@@ -61,7 +61,7 @@ top_groups = df.groupby('GroupCode')['Quantity'].sum().nlargest(20).index
 df_top = df[df['GroupCode'].isin(top_groups)].copy()
 
 # 4. Tạo cột tuần bắt đầu (thứ Hai của tuần đó)
-df_top['week_start'] = df_top['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+df_top['week_start'] = df_top['DocDate'].dt.normalize() - pd.to_timedelta(df_top['DocDate'].dt.dayofweek, unit='D')
 
 # 5. Nhóm theo GroupCode và tuần, tính tổng quantity
 weekly_quantity = df_top.groupby(['GroupCode', 'week_start'])['Quantity'].sum().reset_index()
@@ -141,7 +141,7 @@ print(single_day_products.head())
 df_grouped['DocDate'] = pd.to_datetime(df_grouped['DocDate'])
 
 # 2. Tạo cột tuần bắt đầu (thứ Hai đầu tuần)
-df_grouped['week_start'] = df_grouped['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+df_grouped['week_start'] = df_grouped['DocDate'].dt.normalize() - pd.to_timedelta(df_grouped['DocDate'].dt.dayofweek, unit='D')
 
 # 3. Gộp dữ liệu theo GroupCode và tuần
 weekly_demand = (
@@ -178,7 +178,7 @@ df_grouped = df_grouped[~df_grouped['GroupCode'].isin(few_day_products)].copy()
 
 # Bổ sung cột tuần (lấy thứ Hai đầu tuần)
 df_grouped.loc[:, 'week_start'] = (
-    df_grouped['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+    df_grouped['DocDate'].dt.normalize() - pd.to_timedelta(df_grouped['DocDate'].dt.dayofweek, unit='D')
 )
 
 # Kết quả
@@ -201,7 +201,7 @@ single_day_products = day_counts[day_counts == 1].index
 df_grouped = df_grouped[~df_grouped['GroupCode'].isin(single_day_products)].copy()
 
 #Bổ sung cột tuần nếu cần cho các bước sau
-df_grouped.loc[:, 'week_start'] = df_grouped['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+df_grouped.loc[:, 'week_start'] = df_grouped['DocDate'].dt.normalize() - pd.to_timedelta(df_grouped['DocDate'].dt.dayofweek, unit='D')
 
 # Kết quả
 print(f"Đã loại bỏ {len(single_day_products)} sản phẩm chỉ bán 1 ngày.")
@@ -211,7 +211,7 @@ print(f"Kích thước mới của df_grouped: {df_grouped.shape}")
 df_grouped['DocDate'] = pd.to_datetime(df_grouped['DocDate'])
 
 # 2. Tạo cột tuần bắt đầu (thứ Hai đầu tuần)
-df_grouped['week_start'] = df_grouped['DocDate'].dt.to_period('W').apply(lambda r: r.start_time)
+df_grouped['week_start'] = df_grouped['DocDate'].dt.normalize() - pd.to_timedelta(df_grouped['DocDate'].dt.dayofweek, unit='D')
 
 # 3. Gộp dữ liệu theo GroupCode và tuần
 weekly_demand = (
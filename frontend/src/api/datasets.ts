@@ -7,6 +7,8 @@ import type {
   CreateDatasetRequest,
   UpdateDatasetRequest,
   FileListResponse,
+  UploadDatasetResponse,
+  IngestionJobStatus,
 } from '../types/dataset'
 
 export const datasetsApi = {
@@ -23,7 +25,7 @@ export const datasetsApi = {
   },
 
   // Create new dataset
-  create: async (data: CreateDatasetRequest): Promise<{ success: boolean; dataset_id: string; message: string; stats: any }> => {
+  create: async (data: CreateDatasetRequest): Promise<UploadDatasetResponse> => {
     const formData = new FormData()
     formData.append('file', data.file)
     formData.append('name', data.name)
@@ -42,6 +44,12 @@ export const datasetsApi = {
     return response.data
   },
 
+  // Get status and progress of an upload/append ingestion job
+  getIngestionStatus: async (jobId: string): Promise<IngestionJobStatus> => {
+    const response = await api.get(`/datasets/ingestion/${jobId}/status`)
+    return response.data
+  },
+
   // Update dataset
   update: async (id: string, data: UpdateDatasetRequest): Promise<{ success: boolean; message: string; dataset: DatasetDetail }> => {
     const formData = new FormData()
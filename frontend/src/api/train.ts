@@ -33,6 +33,12 @@ export const trainApi = {
     return response.data
   },
 
+  // Server-Sent Events stream of one job's progress ("progress" events, then "done")
+  jobEventsUrl: (jobId: string): string => `${api.defaults.baseURL}/train/job/${jobId}/events`,
+
+  // Server-Sent Events stream of all pending/running jobs ("jobs" events)
+  jobsEventsUrl: (): string => `${api.defaults.baseURL}/train/jobs/events`,
+
   // Get job result
   getJobResult: async (jobId: string): Promise<JobResult> => {
     const response = await api.get(`/train/job/${jobId}/result`)
@@ -11,6 +11,7 @@ const statusConfig = {
   running: { color: 'bg-blue-100 text-blue-800', label: 'Running' },
   completed: { color: 'bg-green-100 text-green-800', label: 'Completed' },
   failed: { color: 'bg-red-100 text-red-800', label: 'Failed' },
+  cancelled: { color: 'bg-gray-100 text-gray-800', label: 'Cancelled' },
   
   // Model statuses
   ready: { color: 'bg-gray-100 text-gray-800', label: 'Ready' },
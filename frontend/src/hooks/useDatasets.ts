@@ -33,6 +33,19 @@ export const useCreateDataset = () => {
   })
 }
 
+// Poll an ingestion job every second until it completes or fails
+export const useIngestionStatus = (jobId: string | null) => {
+  return useQuery({
+    queryKey: ['datasets', 'ingestion', jobId],
+    queryFn: () => datasetsApi.getIngestionStatus(jobId!),
+    enabled: !!jobId,
+    refetchInterval: (query) => {
+      const status = query.state.data?.status
+      return status === 'completed' || status === 'failed' ? false : 1000
+    },
+  })
+}
+
 export const useUpdateDataset = () => {
   const queryClient = useQueryClient()
 
@@ -1,9 +1,37 @@
+import { useEffect, useRef, useState } from 'react'
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 import { toast } from 'sonner'
 import { trainApi } from '../api/train'
-import type { TrainRequest, ValidateRequest } from '../types/job'
+import type { TrainRequest, ValidateRequest, JobProgress, JobListResponse } from '../types/job'
 
 export const useTrainingJobs = () => {
+  const queryClient = useQueryClient()
+
+  // Live statuses of pending/running jobs pushed by the server; refetch the list only when a job starts or finishes
+  useEffect(() => {
+    const source = new EventSource(trainApi.jobsEventsUrl())
+    let activeIds = ''
+
+    source.addEventListener('jobs', (event) => {
+      const { jobs } = JSON.parse((event as MessageEvent).data) as { jobs: JobProgress[] }
+      const ids = jobs.map((job) => job.job_id).sort().join(',')
+      if (ids !== activeIds) {
+        activeIds = ids
+        queryClient.invalidateQueries({ queryKey: ['training', 'jobs'], exact: true })
+        return
+      }
+      queryClient.setQueryData<JobListResponse>(['training', 'jobs'], (old) => old && {
+        ...old,
+        jobs: old.jobs.map((job) => {
+          const live = jobs.find((item) => item.job_id === job.id)
+          return live ? { ...job, status: live.status } : job
+        }),
+      })
+    })
+
+    return () => source.close()
+  }, [queryClient])
+
   return useQuery({
     queryKey: ['training', 'jobs'],
     queryFn: trainApi.listJobs,
@@ -11,18 +39,47 @@ export const useTrainingJobs = () => {
 }
 
 export const useJobStatus = (jobId: string) => {
+  // No polling: useJobProgress refreshes this query when the streamed status changes
   return useQuery({
     queryKey: ['training', 'jobs', jobId, 'status'],
     queryFn: () => trainApi.getJobStatus(jobId),
     enabled: !!jobId,
-    refetchInterval: (data) => {
-      // Stop polling when job is completed or failed
-      const status = data?.status
-      return status === 'completed' || status === 'failed' ? false : 2000
-    },
   })
 }
 
+export const useJobProgress = (jobId: string) => {
+  const queryClient = useQueryClient()
+  const [progress, setProgress] = useState<JobProgress | null>(null)
+  const lastStatus = useRef<string | null>(null)
+
+  useEffect(() => {
+    if (!jobId) return
+
+    const source = new EventSource(trainApi.jobEventsUrl(jobId))
+
+    const onEvent = (event: Event) => {
+      const data: JobProgress = JSON.parse((event as MessageEvent).data)
+      setProgress(data)
+      // Status changed (started, finished): refresh timestamps/error from the status endpoint
+      if (data.status !== lastStatus.current) {
+        lastStatus.current = data.status
+        queryClient.invalidateQueries({ queryKey: ['training', 'jobs', jobId, 'status'] })
+      }
+    }
+
+    source.addEventListener('progress', onEvent)
+    source.addEventListener('done', (event) => {
+      onEvent(event)
+      // Job finished: stop the browser from reconnecting
+      source.close()
+    })
+
+    return () => source.close()
+  }, [jobId, queryClient])
+
+  return progress
+}
+
 export const useJobResult = (jobId: string, enabled: boolean = false) => {
   return useQuery({
     queryKey: ['training', 'jobs', jobId, 'result'],
@@ -1,8 +1,10 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import { useNavigate, Link } from 'react-router-dom'
+import { useQueryClient } from '@tanstack/react-query'
+import { toast } from 'sonner'
 import { ArrowLeft, Upload, CheckCircle } from 'lucide-react'
 import { FileDropzone } from '../../components/FileDropzone'
-import { useCreateDataset } from '../../hooks/useDatasets'
+import { useCreateDataset, useIngestionStatus } from '../../hooks/useDatasets'
 import { z } from 'zod'
 
 const uploadSchema = z.object({
@@ -23,8 +25,22 @@ export const UploadDatasetPage = () => {
   })
   const [errors, setErrors] = useState<Record<string, string>>({})
   const [selectedFile, setSelectedFile] = useState<File | null>(null)
+  // Background ingestion job of the upload: the dataset only exists once it completes
+  const [jobId, setJobId] = useState<string | null>(null)
   
+  const queryClient = useQueryClient()
   const createDataset = useCreateDataset()
+  const { data: ingestion } = useIngestionStatus(jobId)
+  const isProcessing = createDataset.isPending || (!!jobId && ingestion?.status !== 'failed')
+
+  useEffect(() => {
+    if (ingestion?.status === 'completed') {
+      queryClient.invalidateQueries({ queryKey: ['datasets'] })
+      navigate(`/datasets/${ingestion.dataset_id}`)
+    } else if (ingestion?.status === 'failed') {
+      toast.error(ingestion.error || 'Failed to process dataset')
+    }
+  }, [ingestion, navigate, queryClient])
 
   const handleInputChange = (field: keyof UploadForm, value: string) => {
     setFormData(prev => ({ ...prev, [field]: value }))
@@ -71,7 +87,11 @@ export const UploadDatasetPage = () => {
         file: validatedData.file,
       })
       
-      navigate(`/datasets/${result.dataset_id}`)
+      if (result.job_id) {
+        setJobId(result.job_id)
+      } else {
+        navigate(`/datasets/${result.dataset_id}`)
+      }
     } catch (error) {
       if (error instanceof z.ZodError) {
         const fieldErrors: Record<string, string> = {}
@@ -164,7 +184,7 @@ export const UploadDatasetPage = () => {
             onFileSelect={handleFileSelect}
             selectedFile={selectedFile}
             onFileRemove={handleFileRemove}
-            disabled={createDataset.isPending}
+            disabled={isProcessing}
           />
           
           {errors.file && (
@@ -189,13 +209,13 @@ export const UploadDatasetPage = () => {
           </Link>
           <button
             type="submit"
-            disabled={createDataset.isPending}
+            disabled={isProcessing}
             className="btn-primary"
           >
-            {createDataset.isPending ? (
+            {isProcessing ? (
               <>
                 <div className="spinner mr-2" />
-                Uploading...
+                {createDataset.isPending ? 'Uploading...' : 'Processing...'}
               </>
             ) : (
               <>
@@ -208,12 +228,23 @@ export const UploadDatasetPage = () => {
       </form>
 
       {/* Success Message */}
-      {createDataset.isSuccess && (
+      {createDataset.isSuccess && ingestion?.status !== 'failed' && (
         <div className="card bg-green-50 border-green-200">
           <div className="flex items-center">
             <CheckCircle className="h-5 w-5 text-green-500 mr-2" />
-            <p className="text-green-800">Dataset uploaded successfully!</p>
+            <p className="text-green-800">
+              {jobId ? 'Dataset uploaded, processing...' : 'Dataset uploaded successfully!'}
+            </p>
           </div>
+          {jobId && ingestion?.progress && (
+            <p className="mt-2 text-sm text-green-700">
+              {ingestion.progress.stage}
+              {ingestion.progress.total_rows
+                ? ` · ${ingestion.progress.rows_read ?? 0} / ${ingestion.progress.total_rows} rows`
+                : ''}
+              {ingestion.progress.eta_seconds ? ` · ETA ${Math.round(ingestion.progress.eta_seconds)}s` : ''}
+            </p>
+          )}
         </div>
       )}
     </div>
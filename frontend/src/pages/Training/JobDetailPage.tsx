@@ -10,12 +10,13 @@ import {
   AlertCircle
 } from 'lucide-react'
 import { StatusBadge } from '../../components/StatusBadge'
-import { useJobStatus, useJobResult } from '../../hooks/useTraining'
+import { useJobStatus, useJobResult, useJobProgress } from '../../hooks/useTraining'
 
 export const JobDetailPage = () => {
   const { jobId } = useParams<{ jobId: string }>()
   
   const { data: statusResponse, isLoading: statusLoading } = useJobStatus(jobId!)
+  const progress = useJobProgress(jobId!)
   const { data: resultResponse, isLoading: resultLoading } = useJobResult(
     jobId!,
     statusResponse?.status === 'completed'
@@ -48,6 +49,17 @@ export const JobDetailPage = () => {
     return `${Math.round(duration / 3600)}h ${Math.round((duration % 3600) / 60)}m`
   }
 
+  const formatEta = (seconds: number | null) => {
+    if (seconds === null) return '-'
+    if (seconds < 60) return `${Math.round(seconds)}s`
+    if (seconds < 3600) return `${Math.floor(seconds / 60)}m ${Math.round(seconds % 60)}s`
+    return `${Math.floor(seconds / 3600)}h ${Math.round((seconds % 3600) / 60)}m`
+  }
+
+  const percentDone = progress?.products_total
+    ? Math.min(100, (progress.products_done / progress.products_total) * 100)
+    : 0
+
   if (statusLoading) {
     return (
       <div className="space-y-6">
@@ -104,18 +116,74 @@ export const JobDetailPage = () => {
           </div>
           
           {statusResponse.status === 'running' && (
-            <div className="text-right">
-              <p className="text-sm text-gray-500">Training in progress...</p>
+            <div className="text-right w-1/2">
+              <p className="text-sm text-gray-500">
+                {progress?.products_total
+                  ? `${progress.products_done} / ${progress.products_total} products`
+                  : 'Training in progress...'}
+              </p>
               <div className="mt-2">
-                <div className="animate-pulse-slow h-2 bg-blue-200 rounded-full">
-                  <div className="h-2 bg-blue-600 rounded-full" style={{ width: '60%' }}></div>
+                <div className="h-2 bg-blue-200 rounded-full">
+                  <div
+                    className="h-2 bg-blue-600 rounded-full transition-all"
+                    style={{ width: `${percentDone}%` }}
+                  ></div>
                 </div>
               </div>
+              {progress?.products_per_second && (
+                <p className="text-xs text-gray-500 mt-1">
+                  {progress.products_per_second} products/s · ETA {formatEta(progress.eta_seconds)}
+                </p>
+              )}
             </div>
           )}
         </div>
       </div>
 
+      {/* Live progress (running metrics and per-product failures) */}
+      {statusResponse.status === 'running' && progress && progress.products_done > 0 && (
+        <div className="card">
+          <h2 className="text-lg font-semibold text-gray-900 mb-4">Live Progress</h2>
+          <div className="grid grid-cols-2 lg:grid-cols-4 gap-4">
+            <div className="text-center p-3 bg-blue-50 rounded-lg">
+              <p className="text-sm font-medium text-blue-600">Running MAE</p>
+              <p className="text-lg font-bold text-blue-900">
+                {progress.metrics.mae?.toFixed(4) || 'N/A'}
+              </p>
+            </div>
+            <div className="text-center p-3 bg-green-50 rounded-lg">
+              <p className="text-sm font-medium text-green-600">Running RMSE</p>
+              <p className="text-lg font-bold text-green-900">
+                {progress.metrics.rmse?.toFixed(4) || 'N/A'}
+              </p>
+            </div>
+            <div className="text-center p-3 bg-yellow-50 rounded-lg">
+              <p className="text-sm font-medium text-yellow-600">Running MAPE</p>
+              <p className="text-lg font-bold text-yellow-900">
+                {progress.metrics.mape?.toFixed(2) || 'N/A'}%
+              </p>
+            </div>
+            <div className="text-center p-3 bg-red-50 rounded-lg">
+              <p className="text-sm font-medium text-red-600">Failed Products</p>
+              <p className="text-lg font-bold text-red-900">{progress.failed_products}</p>
+            </div>
+          </div>
+
+          {progress.recent_failures.length > 0 && (
+            <div className="pt-4 mt-4 border-t border-gray-200">
+              <h3 className="text-sm font-medium text-gray-700 mb-2">Recent Failures</h3>
+              <ul className="space-y-1">
+                {progress.recent_failures.map((failure) => (
+                  <li key={failure.item_code} className="text-xs text-red-800 font-mono">
+                    {failure.item_code}: {failure.error}
+                  </li>
+                ))}
+              </ul>
+            </div>
+          )}
+        </div>
+      )}
+
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
         {/* Job Information */}
         <div className="card">
@@ -241,13 +309,13 @@ export const JobDetailPage = () => {
         )}
       </div>
 
-      {/* Auto-refresh notice for running jobs */}
+      {/* Live-update notice for running jobs */}
       {statusResponse.status === 'running' && (
         <div className="card bg-blue-50 border-blue-200">
           <div className="flex items-center space-x-2">
             <div className="spinner" />
             <p className="text-blue-800 text-sm">
-              This page will automatically update every 2 seconds while training is in progress.
+              This page updates live as products finish training.
             </p>
           </div>
         </div>
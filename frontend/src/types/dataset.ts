@@ -28,6 +28,40 @@ export interface CreateDatasetRequest {
   file: File
 }
 
+export interface UploadDatasetResponse {
+  success: boolean
+  dataset_id: string
+  // null when the file duplicates an existing upload and the dataset is created right away
+  job_id: string | null
+  status: 'pending' | 'completed'
+  duplicate_of?: string
+  message: string
+}
+
+export interface IngestionProgress {
+  stage: string
+  rows_read: number | null
+  total_rows: number | null
+  rows_per_second: number | null
+  eta_seconds: number | null
+  started_at: string
+  updated_at: string
+}
+
+export interface IngestionJobStatus {
+  success: boolean
+  job_id: string
+  dataset_id: string
+  kind: 'upload' | 'append'
+  status: 'pending' | 'running' | 'completed' | 'failed'
+  progress: IngestionProgress | null
+  created_at: string
+  started_at: string | null
+  completed_at: string | null
+  result: { stats: Dataset['stats']; delta?: Record<string, any> | null } | null
+  error: string | null
+}
+
 export interface UpdateDatasetRequest {
   name?: string
   description?: string
@@ -1,14 +1,39 @@
 export interface TrainingJob {
   id: string
   dataset_id: string
-  model_type: 'xgboost' | 'prophet' | 'lightgbm' | 'lstm'
-  status: 'pending' | 'running' | 'completed' | 'failed'
+  model_type: 'xgboost' | 'xgboost_global' | 'prophet' | 'prophet_lite' | 'baseline' | 'tuning' | 'backtest' | 'lightgbm' | 'lstm'
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled'
   created_at: string
   started_at?: string
   completed_at?: string
   error?: string
 }
 
+export interface ProductFailure {
+  item_code: string
+  error: string
+}
+
+export interface JobProgress {
+  job_id: string
+  model_type: string
+  status: TrainingJob['status']
+  products_done: number
+  products_total: number | null
+  failed_products: number
+  products_per_second: number | null
+  eta_seconds: number | null
+  metrics: Partial<{
+    mae: number
+    rmse: number
+    mape: number
+    r2: number
+  }>
+  recent_failures: ProductFailure[]
+  error: string | null
+  updated_at: string
+}
+
 export interface JobListResponse {
   success: boolean
   jobs: TrainingJob[]
@@ -37,11 +62,71 @@ export interface JobResult {
   }
   results_file?: string
   plot_file?: string
+  tuning?: Record<string, TuningResult>
+  backtest?: BacktestResult
+}
+
+// Configs are ranked on a validation slice at the end of each product's train weeks;
+// test_score is the chosen config re-scored on the held-out test weeks
+export interface TuningGroupResult {
+  config_id: number
+  config: Record<string, unknown>
+  is_default: boolean
+  validation_score: number
+  test_score: number | null
+  test_products: number
+  products: number
+  rounds: {
+    bracket: number
+    configs: number
+    products: number
+    best_validation_score: number
+    best_config: Record<string, unknown>
+  }[]
+}
+
+// Result of a "tuning" job for one model type (best overall, or per demand-pattern cluster)
+export interface TuningResult {
+  configs: number
+  best: TuningGroupResult | null
+  clusters: Record<string, TuningGroupResult> | null
+  cost: {
+    evaluations: number
+    full_grid_evaluations: number
+    evaluation_ratio: number | null
+    test_evaluations: number
+    seconds: number
+    workers: number
+  }
+}
+
+export interface BacktestErrorStats {
+  mae: number | null
+  rmse: number | null
+  bias: number | null
+  cells: number
+}
+
+// Result of a "backtest" job: rolling origins and errors (on weeks with sales) per model
+export interface BacktestResult {
+  folds: number
+  horizon: number
+  step: number
+  origins: string[]
+  rows: number
+  models: Record<string, {
+    products: number
+    forecast_cells: number
+    overall: BacktestErrorStats
+    by_horizon: ({ horizon: number } & BacktestErrorStats)[]
+    by_fold: ({ fold: number } & BacktestErrorStats)[]
+    seconds: number
+  }>
 }
 
 export interface TrainRequest {
   dataset_id: string
-  model_type: 'xgboost' | 'prophet' | 'lightgbm' | 'lstm'
+  model_type: 'xgboost' | 'xgboost_global' | 'prophet' | 'prophet_lite' | 'baseline' | 'tuning' | 'backtest' | 'lightgbm' | 'lstm'
   parameters?: Record<string, unknown>
   test_ratio: number
 }